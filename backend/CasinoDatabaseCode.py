@@ -1,24 +1,43 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from anyio import from_thread
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import timedelta
 import models
 import schemas
-from database import engine, get_db
+from database import async_engine, engine, get_db
+from pagination import MachineListParams, machine_page_query, next_page
+import versioning  # registers the row_version/tombstone flush hook for machine writes
+import analytics  # keeps the downtime rollups current on machine and ticket writes
+import floor  # derives zone/bank/position and grid cells on machine writes
+import escalations  # clears a machine's escalation when its status changes
+import metrics
+import startup
 from auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
     get_current_active_user,
-    get_password_hash,
-    verify_password
+    get_password_hash_async,
+    verify_password_async
 )
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup.verify_schema(async_engine)
+    await run_in_threadpool(startup.warm_pool, engine)
+    await startup.warm_async_pool(async_engine)
+    try:
+        yield
+    finally:
+        # The auth dependency uses the async engine; close its pooled connections
+        await async_engine.dispose()
 
-app = FastAPI(title="Casino Machine Tracker")
+app = FastAPI(title="Casino Machine Tracker", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -27,20 +46,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/token")
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    user = await run_in_threadpool(
+        db.query(models.User).filter(models.User.username == form_data.username).first
+    )
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        user.hashed_password = new_hash
+        await run_in_threadpool(db.commit)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -53,7 +89,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = from_thread.run(get_password_hash_async, user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
@@ -66,19 +102,19 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 @app.get("/machines/", response_model=List[schemas.Machine])
 def get_all_machines(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    params: MachineListParams = Depends(),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
-    machines = db.query(models.Machine).offset(skip).limit(limit).all()
-    return machines
+    machines = db.execute(machine_page_query(params)).scalars().all()
+    return next_page(machines, params, response)
 
 @app.post("/machines/", response_model=schemas.Machine)
 def add_machine(
     machine: schemas.MachineCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
     db_machine = models.Machine(**machine.dict(), technician_id=current_user.id)
     db.add(db_machine)
@@ -91,7 +127,7 @@ def update_machine(
     machine_number: str,
     update_data: schemas.MachineUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
     machine = db.query(models.Machine).filter(models.Machine.machine_number == machine_number).first()
     if not machine:
@@ -108,7 +144,7 @@ def update_machine(
 def get_machine(
     machine_number: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
     machine = db.query(models.Machine).filter(models.Machine.machine_number == machine_number).first()
     if not machine:
@@ -19,6 +19,8 @@ if config.config_file_name is not None:
 
 # Import all models here
 from models import Base
+from database import settings
+from search import is_search_table
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -29,8 +31,12 @@ target_metadata = Base.metadata
 # my_important_option = config.get_main_option("my_important_option")
 # ... etc.
 
+def include_name(name, type_, parent_names):
+    # FTS5 tables and their shadow tables are managed by raw DDL, not the models
+    return not (type_ == "table" and is_search_table(name))
+
 def get_url():
-    return os.getenv("DATABASE_URL")
+    return os.getenv("DATABASE_URL", settings.url)
 
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
@@ -48,6 +54,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -73,7 +80,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_name=include_name
         )
 
         with context.begin_transaction():
@@ -0,0 +1,88 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_users_id', 'users', ['id'])
+    op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+
+    op.create_table(
+        'machines',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine_number', sa.String(), nullable=True),
+        sa.Column('serial_number', sa.String(), nullable=True),
+        sa.Column('vendor', sa.String(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('status', sa.Enum('DOWN', 'FIXED', 'IN_PROGRESS', name='machinestatus'), nullable=True),
+        sa.Column('date_down', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('location', sa.String(), nullable=True),
+        sa.Column('machine_type', sa.String(), nullable=True),
+        sa.Column('is_out_of_service', sa.Boolean(), nullable=True),
+        sa.Column('current_issue', sa.Text(), nullable=True),
+        sa.Column('last_maintenance', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('serial_number'),
+    )
+    op.create_index('ix_machines_id', 'machines', ['id'])
+    op.create_index('ix_machines_machine_number', 'machines', ['machine_number'], unique=True)
+
+    op.create_table(
+        'technicians',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('employee_id', sa.String(), nullable=True),
+        sa.Column('contact_number', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_technicians_id', 'technicians', ['id'])
+    op.create_index('ix_technicians_employee_id', 'technicians', ['employee_id'], unique=True)
+
+    op.create_table(
+        'maintenance_records',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine_id', sa.Integer(), nullable=True),
+        sa.Column('technician_id', sa.Integer(), nullable=True),
+        sa.Column('issue_description', sa.Text(), nullable=True),
+        sa.Column('repair_description', sa.Text(), nullable=True),
+        sa.Column('reported_time', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('resolved_time', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('is_resolved', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['machine_id'], ['machines.id']),
+        sa.ForeignKeyConstraint(['technician_id'], ['technicians.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_maintenance_records_id', 'maintenance_records', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_table('maintenance_records')
+    op.drop_table('technicians')
+    op.drop_table('machines')
+    op.drop_table('users')
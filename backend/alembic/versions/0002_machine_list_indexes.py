@@ -0,0 +1,36 @@
+"""composite indexes for the machine list
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_machines_date_down_id', 'machines', ['date_down', 'id'])
+    op.create_index('ix_machines_status_date_down', 'machines', ['status', 'date_down', 'id'])
+    op.create_index('ix_machines_location_status_date_down', 'machines', ['location', 'status', 'date_down', 'id'])
+    op.create_index('ix_machines_vendor_status_date_down', 'machines', ['vendor', 'status', 'date_down', 'id'])
+    op.create_index('ix_machines_type_status_date_down', 'machines', ['machine_type', 'status', 'date_down', 'id'])
+    op.create_index('ix_machines_out_of_service_date_down', 'machines', ['is_out_of_service', 'date_down', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machines_out_of_service_date_down', table_name='machines')
+    op.drop_index('ix_machines_type_status_date_down', table_name='machines')
+    op.drop_index('ix_machines_vendor_status_date_down', table_name='machines')
+    op.drop_index('ix_machines_location_status_date_down', table_name='machines')
+    op.drop_index('ix_machines_status_date_down', table_name='machines')
+    op.drop_index('ix_machines_date_down_id', table_name='machines')
@@ -0,0 +1,59 @@
+"""machine row versions, tombstones and sync counters
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('machines', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('machines', sa.Column('row_version', sa.Integer(), nullable=True))
+    # Existing rows all belong to the first version so a client syncing from 0 gets them
+    op.execute("UPDATE machines SET row_version = 1, updated_at = CURRENT_TIMESTAMP")
+    op.create_index('ix_machines_row_version', 'machines', ['row_version'])
+
+    op.create_table(
+        'machine_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('machine_number', sa.String(), nullable=True),
+        sa.Column('row_version', sa.Integer(), nullable=True),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_machine_tombstones_id', 'machine_tombstones', ['id'])
+    op.create_index('ix_machine_tombstones_machine_number', 'machine_tombstones', ['machine_number'])
+    op.create_index('ix_machine_tombstones_row_version', 'machine_tombstones', ['row_version'])
+
+    sync_versions = op.create_table(
+        'sync_versions',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.bulk_insert(sync_versions, [{'name': 'machines', 'version': 1}])
+
+
+def downgrade() -> None:
+    op.drop_table('sync_versions')
+    op.drop_index('ix_machine_tombstones_row_version', table_name='machine_tombstones')
+    op.drop_index('ix_machine_tombstones_machine_number', table_name='machine_tombstones')
+    op.drop_index('ix_machine_tombstones_id', table_name='machine_tombstones')
+    op.drop_table('machine_tombstones')
+    op.drop_index('ix_machines_row_version', table_name='machines')
+    with op.batch_alter_table('machines') as batch_op:
+        batch_op.drop_column('row_version')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,28 @@
+"""indexes for maintenance history and open/resolved queues
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_maintenance_records_machine_reported', 'maintenance_records', ['machine_id', 'reported_time', 'id'])
+    op.create_index('ix_maintenance_records_resolved_reported', 'maintenance_records', ['is_resolved', 'reported_time', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_maintenance_records_resolved_reported', table_name='maintenance_records')
+    op.drop_index('ix_maintenance_records_machine_reported', table_name='maintenance_records')
@@ -0,0 +1,50 @@
+"""downtime analytics rollup tables
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'downtime_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('vendor', sa.String(), nullable=False),
+        sa.Column('machine_type', sa.String(), nullable=False),
+        sa.Column('location', sa.String(), nullable=False),
+        sa.Column('downtime_seconds', sa.Float(), nullable=False),
+        sa.Column('downtime_events', sa.Integer(), nullable=False),
+        sa.Column('repair_seconds', sa.Float(), nullable=False),
+        sa.Column('repairs', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'vendor', 'machine_type', 'location'),
+    )
+    op.create_table(
+        'downtime_open',
+        sa.Column('vendor', sa.String(), nullable=False),
+        sa.Column('machine_type', sa.String(), nullable=False),
+        sa.Column('location', sa.String(), nullable=False),
+        sa.Column('down_machines', sa.Integer(), nullable=False),
+        sa.Column('down_since_sum', sa.Float(), nullable=False),
+        sa.Column('open_tickets', sa.Integer(), nullable=False),
+        sa.Column('reported_sum', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('vendor', 'machine_type', 'location'),
+    )
+    # Existing machines and tickets are loaded with `python analytics.py rebuild`
+
+
+def downgrade() -> None:
+    op.drop_table('downtime_open')
+    op.drop_table('downtime_daily')
@@ -0,0 +1,60 @@
+"""FTS5 full-text index over machine notes and maintenance descriptions
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_TABLES = {
+    'machines_fts': ('machines', ('notes', 'current_issue')),
+    'maintenance_fts': ('maintenance_records', ('issue_description', 'repair_description')),
+}
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name, (source, columns) in FTS_TABLES.items():
+        cols = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        op.execute(
+            f"CREATE VIRTUAL TABLE {name} USING fts5("
+            f"{cols}, content='{source}', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {name}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {name}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {name}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+            f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new}); END"
+        )
+        # Index the rows that already exist
+        op.execute(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in FTS_TABLES:
+        for suffix in ('au', 'ad', 'ai'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}_{suffix}")
+        op.execute(f"DROP TABLE IF EXISTS {name}")
@@ -0,0 +1,36 @@
+"""maintenance archive catalog
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'maintenance_archives',
+        sa.Column('month', sa.String(), nullable=False),
+        sa.Column('records', sa.Integer(), nullable=False),
+        sa.Column('min_reported', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('max_reported', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('min_id', sa.Integer(), nullable=False),
+        sa.Column('max_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('month'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('maintenance_archives')
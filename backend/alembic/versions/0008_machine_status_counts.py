@@ -0,0 +1,44 @@
+"""machine status counters for the floor summary
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'machine_status_counts',
+        sa.Column('vendor', sa.String(), nullable=False),
+        sa.Column('machine_type', sa.String(), nullable=False),
+        sa.Column('location', sa.String(), nullable=False),
+        # machines.status already created the PostgreSQL enum type
+        sa.Column('status', sa.Enum('DOWN', 'FIXED', 'IN_PROGRESS', name='machinestatus').with_variant(
+            postgresql.ENUM('DOWN', 'FIXED', 'IN_PROGRESS', name='machinestatus', create_type=False), 'postgresql'
+        ), nullable=False),
+        sa.Column('machines', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('vendor', 'machine_type', 'location', 'status'),
+    )
+    op.execute(
+        "INSERT INTO machine_status_counts (vendor, machine_type, location, status, machines) "
+        "SELECT coalesce(vendor, ''), coalesce(machine_type, ''), coalesce(location, ''), status, count(*) "
+        "FROM machines WHERE status IS NOT NULL "
+        "GROUP BY coalesce(vendor, ''), coalesce(machine_type, ''), coalesce(location, ''), status"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('machine_status_counts')
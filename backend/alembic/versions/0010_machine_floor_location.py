@@ -0,0 +1,111 @@
+"""structured floor location: zone/bank/position and floor coordinates
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+import re
+from typing import List, Optional, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = [
+    sa.Column('zone', sa.String(), nullable=True),
+    sa.Column('bank', sa.String(), nullable=True),
+    sa.Column('position', sa.String(), nullable=True),
+    sa.Column('floor_x', sa.Float(), nullable=True),
+    sa.Column('floor_y', sa.Float(), nullable=True),
+]
+
+# floor.parse_location as of this revision, frozen here so the backfill never
+# changes with later edits to the app and the migration loads no app modules
+LEVELS = ("zone", "bank", "position")
+KEYWORDS = {
+    "zone": "zone", "area": "zone", "section": "zone",
+    "bank": "bank", "row": "bank",
+    "position": "position", "pos": "position", "seat": "position", "stand": "position",
+}
+
+_keyword = "|".join(sorted(KEYWORDS, key=len, reverse=True))
+_SEPARATORS = re.compile(r"\s*(?:[,/|;>]|\s-\s)\s*")
+_KEYWORD_START = re.compile(rf"\s+(?=(?:{_keyword})\b)", re.IGNORECASE)
+_KEYWORD_PIECE = re.compile(rf"^({_keyword})\b\.?\s*[:#]?\s*(.*)$", re.IGNORECASE)
+
+
+def parse_location(location: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    pieces = []
+    for part in _SEPARATORS.split((location or "").strip()):
+        for piece in _KEYWORD_START.split(part):
+            match = _KEYWORD_PIECE.match(piece)
+            if match and match.group(2).strip():
+                pieces.append((LEVELS.index(KEYWORDS[match.group(1).lower()]), match.group(2).strip()))
+            elif piece.strip():
+                pieces.append((None, piece.strip()))
+
+    slots: List[Optional[str]] = [None, None, None]
+    level = 0
+    for index, (labelled, value) in enumerate(pieces):
+        if labelled is None:
+            claimed = {later for later, _ in pieces[index + 1:] if later is not None}
+            labelled = min(level, len(LEVELS) - 1)
+            while labelled > 0 and labelled in claimed:
+                labelled -= 1
+        slots[labelled] = value if slots[labelled] is None else f"{slots[labelled]} / {value}"
+        level = labelled + 1
+    return slots[0], slots[1], slots[2]
+
+
+def upgrade() -> None:
+    for column in NEW_COLUMNS:
+        op.add_column('machines', column)
+
+    machines = sa.table(
+        'machines',
+        sa.column('id', sa.Integer),
+        sa.column('location', sa.String),
+        sa.column('zone', sa.String),
+        sa.column('bank', sa.String),
+        sa.column('position', sa.String),
+        sa.column('row_version', sa.Integer),
+    )
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(machines.c.id, machines.c.location).where(machines.c.location.isnot(None))
+    ).all()
+    if rows:
+        # Every parsed row gets a new version so synced clients fetch the new fields.
+        # 0003 seeds the counter row; recreate it if it has gone, or every row would get a NULL version
+        connection.execute(sa.text(
+            "INSERT INTO sync_versions (name, version) SELECT 'machines', 0 "
+            "WHERE NOT EXISTS (SELECT 1 FROM sync_versions WHERE name = 'machines')"
+        ))
+        connection.execute(sa.text("UPDATE sync_versions SET version = version + 1 WHERE name = 'machines'"))
+        version = connection.execute(sa.text("SELECT version FROM sync_versions WHERE name = 'machines'")).scalar()
+        connection.execute(
+            machines.update().where(machines.c.id == sa.bindparam('machine_id')).values(
+                zone=sa.bindparam('zone'), bank=sa.bindparam('bank'), position=sa.bindparam('position'),
+                row_version=version,
+            ),
+            [
+                dict(zip(('zone', 'bank', 'position'), parse_location(row.location)), machine_id=row.id)
+                for row in rows
+            ],
+        )
+
+    op.create_index('ix_machines_zone_bank_status_date_down', 'machines', ['zone', 'bank', 'status', 'date_down', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machines_zone_bank_status_date_down', table_name='machines')
+    with op.batch_alter_table('machines') as batch_op:
+        for column in reversed(NEW_COLUMNS):
+            batch_op.drop_column(column.name)
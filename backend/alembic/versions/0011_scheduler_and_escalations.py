@@ -0,0 +1,40 @@
+"""scheduler lease and machine escalations
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'scheduler_leases',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('holder', sa.String(), nullable=False),
+        sa.Column('acquired_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    op.add_column('machines', sa.Column('escalation', sa.String(length=32), nullable=True))
+    op.add_column('machines', sa.Column('escalated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_machines_status_updated_at', 'machines', ['status', 'updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_machines_status_updated_at', table_name='machines')
+    with op.batch_alter_table('machines') as batch_op:
+        batch_op.drop_column('escalated_at')
+        batch_op.drop_column('escalation')
+    op.drop_table('scheduler_leases')
@@ -0,0 +1,488 @@
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, or_, select, update
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+import serialization
+from versioning import current_version, next_version
+
+# How long a worker serves its rendered floor summary before rechecking the machines
+# change counter; bounds staleness for other workers' writes under EVENT_BROKER=local
+SUMMARY_MAX_AGE_MS = float(os.getenv("SUMMARY_MAX_AGE_MS", "1000"))
+# Recount machine_status_counts from the machines table this often (0 = off)
+SUMMARY_RECONCILE_SECONDS = float(os.getenv("SUMMARY_RECONCILE_SECONDS", "300"))
+
+logger = logging.getLogger("casino.analytics")
+
+# A machine is down, for downtime purposes, until it is marked FIXED
+DOWN_STATUSES = (models.MachineStatus.DOWN, models.MachineStatus.IN_PROGRESS)
+GROUP_COLUMNS = ("vendor", "machine_type", "location")
+
+daily_table = models.DowntimeDaily.__table__
+open_table = models.DowntimeOpen.__table__
+status_table = models.MachineStatusCount.__table__
+
+Group = Tuple[str, str, str]
+
+
+def machine_group(vendor, machine_type, location) -> Group:
+    return (vendor or "", machine_type or "", location or "")
+
+
+def local_epoch(value: Optional[datetime]) -> float:
+    # date_down defaults to datetime.now, so naive values are local time
+    return value.timestamp() if value is not None else time.time()
+
+
+def utc_epoch(value: datetime) -> float:
+    # Maintenance timestamps are naive UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _accumulate(connection, table, rows: list):
+    """Add each row's values onto the existing rollup row, inserting it if missing."""
+    keys = [column.name for column in table.primary_key]
+    insert = sqlite.insert
+    if connection.dialect.name == "postgresql":
+        # Loaded on demand; the dialect package is a noticeable share of worker boot
+        from sqlalchemy.dialects.postgresql import insert
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={name: table.c[name] + stmt.excluded[name] for name in rows[0] if name not in keys},
+    )
+    connection.execute(stmt, rows)
+
+
+class RollupDelta:
+    """Rollup changes for one transaction, applied as a handful of upserts.
+
+    Machine states are (group, status, date_down); ticket states are
+    (is_resolved, reported_time, resolved_time). None stands for "no row".
+    """
+
+    def __init__(self):
+        self.open: Dict[Group, list] = defaultdict(lambda: [0, 0.0, 0, 0.0])
+        self.daily: Dict[Tuple[date, Group], list] = defaultdict(lambda: [0.0, 0, 0.0, 0])
+        self.status: Dict[Tuple[Group, models.MachineStatus], int] = defaultdict(int)
+
+    def machine(self, old, new, now: float):
+        if old and old[1] is not None:
+            self.status[(old[0], old[1])] -= 1
+        if new and new[1] is not None:
+            self.status[(new[0], new[1])] += 1
+        if old and old[1] in DOWN_STATUSES:
+            entry = self.open[old[0]]
+            entry[0] -= 1
+            entry[1] -= local_epoch(old[2])
+            if new and new[1] not in DOWN_STATUSES:
+                closed = self.daily[(datetime.utcfromtimestamp(now).date(), old[0])]
+                closed[0] += now - local_epoch(old[2])
+                closed[1] += 1
+        if new and new[1] in DOWN_STATUSES:
+            entry = self.open[new[0]]
+            entry[0] += 1
+            entry[1] += local_epoch(new[2])
+
+    def ticket(self, group: Group, state, sign: int):
+        is_resolved, reported_time, resolved_time = state
+        if reported_time is None:
+            return
+        if not is_resolved:
+            entry = self.open[group]
+            entry[2] += sign
+            entry[3] += sign * utc_epoch(reported_time)
+        elif resolved_time is not None:
+            entry = self.daily[(resolved_time.date(), group)]
+            entry[2] += sign * (utc_epoch(resolved_time) - utc_epoch(reported_time))
+            entry[3] += sign
+
+    def apply(self, connection):
+        open_rows = [
+            dict(zip(GROUP_COLUMNS, group), down_machines=values[0], down_since_sum=values[1],
+                 open_tickets=values[2], reported_sum=values[3])
+            for group, values in self.open.items() if any(values)
+        ]
+        daily_rows = [
+            dict(zip(GROUP_COLUMNS, group), day=day, downtime_seconds=values[0], downtime_events=values[1],
+                 repair_seconds=values[2], repairs=values[3])
+            for (day, group), values in self.daily.items() if any(values)
+        ]
+        if open_rows:
+            _accumulate(connection, open_table, open_rows)
+        if daily_rows:
+            _accumulate(connection, daily_table, daily_rows)
+        # Edits that keep a machine's group and status cancel out and write nothing
+        status_rows = [
+            dict(zip(GROUP_COLUMNS, group), status=status, machines=count)
+            for (group, status), count in self.status.items() if count
+        ]
+        if status_rows:
+            _accumulate(connection, status_table, status_rows)
+
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return state.attrs[key].value
+
+
+def _machine_state(machine, previous: bool = False):
+    if previous:
+        state = inspect(machine)
+        values = [_previous(state, key) for key in GROUP_COLUMNS + ("status", "date_down")]
+    else:
+        values = [getattr(machine, key) for key in GROUP_COLUMNS + ("status", "date_down")]
+    return machine_group(*values[:3]), values[3], values[4]
+
+
+def _ticket_state(record, previous: bool = False):
+    keys = ("machine_id", "is_resolved", "reported_time", "resolved_time")
+    if previous:
+        state = inspect(record)
+        values = [_previous(state, key) for key in keys]
+    else:
+        values = [getattr(record, key) for key in keys]
+    return values[0], tuple(values[1:])
+
+
+def _machine_groups(connection, machine_ids) -> Dict[int, Group]:
+    Machine = models.Machine
+    rows = connection.execute(
+        select(Machine.id, Machine.vendor, Machine.machine_type, Machine.location)
+        .where(Machine.id.in_(machine_ids))
+    )
+    return {row.id: machine_group(row.vendor, row.machine_type, row.location) for row in rows}
+
+
+def _move_open_tickets(connection, delta: RollupDelta, machine_id: int, old: Group, new: Group):
+    Record = models.MaintenanceRecord
+    reported = connection.execute(
+        select(Record.reported_time).where(Record.machine_id == machine_id, Record.is_resolved == False)
+    ).scalars()
+    for reported_time in reported:
+        delta.ticket(old, (False, reported_time, None), -1)
+        delta.ticket(new, (False, reported_time, None), 1)
+
+
+# Rollups change in the same transaction as the rows they summarize, so they
+# commit or roll back together. Runs after the flush so defaults are populated;
+# attribute history still holds the pre-flush values at this point.
+@event.listens_for(Session, "after_flush")
+def _update_rollups(session, flush_context):
+    now = time.time()
+    delta = RollupDelta()
+    machines = []
+    tickets = []
+    for obj in session.new:
+        if isinstance(obj, models.Machine):
+            machines.append((obj, None, _machine_state(obj)))
+        elif isinstance(obj, models.MaintenanceRecord):
+            tickets.append((None, _ticket_state(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, models.Machine) and session.is_modified(obj):
+            machines.append((obj, _machine_state(obj, previous=True), _machine_state(obj)))
+        elif isinstance(obj, models.MaintenanceRecord) and session.is_modified(obj):
+            tickets.append((_ticket_state(obj, previous=True), _ticket_state(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, models.Machine):
+            machines.append((obj, _machine_state(obj, previous=True), None))
+        elif isinstance(obj, models.MaintenanceRecord):
+            tickets.append((_ticket_state(obj, previous=True), None))
+    if not machines and not tickets:
+        return
+
+    connection = session.connection()
+    for machine, old, new in machines:
+        delta.machine(old, new, now)
+        if old and new and old[0] != new[0]:
+            _move_open_tickets(connection, delta, machine.id, old[0], new[0])
+    if tickets:
+        machine_ids = {state[0] for pair in tickets for state in pair if state}
+        groups = _machine_groups(connection, machine_ids)
+        for old, new in tickets:
+            if old:
+                delta.ticket(groups.get(old[0], machine_group(None, None, None)), old[1], -1)
+            if new:
+                delta.ticket(groups.get(new[0], machine_group(None, None, None)), new[1], 1)
+    delta.apply(connection)
+
+
+def record_bulk_insert(connection, rows: list):
+    """Rollup bookkeeping for machines inserted with Core, outside the ORM flush."""
+    now = time.time()
+    delta = RollupDelta()
+    for row in rows:
+        group = machine_group(row.get("vendor"), row.get("machine_type"), row.get("location"))
+        delta.machine(None, (group, row.get("status"), row.get("date_down")), now)
+    delta.apply(connection)
+
+
+def record_bulk_update(connection, clauses: list, values: dict):
+    """Rollup bookkeeping for a set-based machine UPDATE; call before executing it."""
+    if not {"status", "date_down", "location"} & values.keys():
+        return
+    Machine = models.Machine
+    now = time.time()
+    delta = RollupDelta()
+    rows = connection.execute(
+        select(Machine.vendor, Machine.machine_type, Machine.location, Machine.status, Machine.date_down)
+        .where(*clauses)
+    )
+    for row in rows:
+        group = machine_group(row.vendor, row.machine_type, row.location)
+        moved = machine_group(row.vendor, row.machine_type, values.get("location", row.location))
+        delta.machine(
+            (group, row.status, row.date_down),
+            (moved, values.get("status", row.status), values.get("date_down", row.date_down)),
+            now,
+        )
+    if "location" in values:
+        # Open tickets follow their machine to the new location group
+        Record = models.MaintenanceRecord
+        tickets = connection.execute(
+            select(Machine.vendor, Machine.machine_type, Machine.location, Record.reported_time)
+            .join(Record, Record.machine_id == Machine.id)
+            .where(*clauses, Record.is_resolved == False)
+        )
+        for row in tickets:
+            group = machine_group(row.vendor, row.machine_type, row.location)
+            moved = machine_group(row.vendor, row.machine_type, values["location"])
+            if group != moved:
+                delta.ticket(group, (False, row.reported_time, None), -1)
+                delta.ticket(moved, (False, row.reported_time, None), 1)
+    delta.apply(connection)
+
+
+def rebuild(connection):
+    """Recompute open state and repair rollups from the source tables.
+
+    Closed downtime intervals are kept: machine status history is not stored
+    anywhere else, so they cannot be reconstructed.
+    """
+    Machine = models.Machine
+    Record = models.MaintenanceRecord
+    now = time.time()
+    delta = RollupDelta()
+    connection.execute(delete(open_table))
+    connection.execute(update(daily_table).values(repair_seconds=0, repairs=0))
+
+    machines = connection.execute(
+        select(Machine.vendor, Machine.machine_type, Machine.location, Machine.status, Machine.date_down)
+        .where(Machine.status.in_(DOWN_STATUSES))
+        .execution_options(yield_per=10000)
+    )
+    for row in machines:
+        delta.machine(None, (machine_group(row.vendor, row.machine_type, row.location), row.status, row.date_down), now)
+
+    records = connection.execute(
+        select(Record.is_resolved, Record.reported_time, Record.resolved_time,
+               Machine.vendor, Machine.machine_type, Machine.location)
+        .join(Machine, Record.machine_id == Machine.id, isouter=True)
+        .execution_options(yield_per=10000)
+    )
+    for row in records:
+        group = machine_group(row.vendor, row.machine_type, row.location)
+        delta.ticket(group, (bool(row.is_resolved), row.reported_time, row.resolved_time), 1)
+
+    import archive
+
+    groups = None
+    for machine_id, reported_time, resolved_time in archive.iter_archived_tickets(connection):
+        if groups is None:
+            groups = {
+                row.id: machine_group(row.vendor, row.machine_type, row.location)
+                for row in connection.execute(select(Machine.id, Machine.vendor, Machine.machine_type, Machine.location))
+            }
+        delta.ticket(groups.get(machine_id, machine_group(None, None, None)), (True, reported_time, resolved_time), 1)
+    delta.apply(connection)
+    # Also replaces the status counts the loop above added for down machines only
+    reconcile_status_counts(connection)
+
+
+def reconcile_status_counts(connection) -> int:
+    """Recount machine_status_counts with a GROUP BY over machines; returns how many counters were off.
+
+    Incremental counts can drift when two PATCHes of one machine race outside the
+    write pipeline, or after hand edits to the database.
+    """
+    Machine = models.Machine
+    keys = GROUP_COLUMNS + ("status",)
+    # Deleting first takes the write lock, so no write lands between the recount and the replace
+    before = {
+        tuple(row[:4]): row.machines
+        for row in connection.execute(delete(status_table).returning(*[status_table.c[key] for key in keys],
+                                                                     status_table.c.machines))
+    }
+    group = [func.coalesce(Machine.__table__.c[key], "") for key in GROUP_COLUMNS]
+    connection.execute(
+        insert(status_table).from_select(
+            [*keys, "machines"],
+            select(*group, Machine.status, func.count()).where(Machine.status.isnot(None)).group_by(*group, Machine.status),
+        )
+    )
+    after = {tuple(row[:4]): row.machines for row in connection.execute(select(status_table))}
+    drifted = sum(1 for key in before.keys() | after.keys() if before.get(key, 0) != after.get(key, 0))
+    if drifted:
+        # New version, so every worker's cached summary is re-rendered
+        next_version(connection)
+        logger.warning("machine status counts had drifted in %d group(s); corrected", drifted)
+    return drifted
+
+
+def reconcile(engine) -> int:
+    with engine.begin() as connection:
+        return reconcile_status_counts(connection)
+
+
+def status_counts() -> dict:
+    return dict.fromkeys([status.value for status in models.MachineStatus] + ["total"], 0)
+
+
+async def status_summary(db: AsyncSession) -> dict:
+    """Machines per status, overall and per location, vendor and machine type."""
+    summary = {"total": status_counts(), "by_location": {}, "by_vendor": {}, "by_machine_type": {}}
+    result = await db.execute(select(status_table).where(status_table.c.machines != 0))
+    for row in result:
+        for entry in (
+            summary["total"],
+            summary["by_location"].setdefault(row.location, status_counts()),
+            summary["by_vendor"].setdefault(row.vendor, status_counts()),
+            summary["by_machine_type"].setdefault(row.machine_type, status_counts()),
+        ):
+            entry[row.status.value] += row.machines
+            entry["total"] += row.machines
+    return summary
+
+
+class FloorSummary:
+    """The rendered body of GET /machines/summary (or another render), reused until the machines change.
+
+    It is tagged with the machines change counter (sync_versions). Events this
+    worker's hub receives mark it for a recheck right away, which covers every
+    worker's writes under EVENT_BROKER=sqlite; otherwise the counter is read again
+    at most every SUMMARY_MAX_AGE_MS. In between, requests cost no query at all.
+    """
+
+    def __init__(self, render: Optional[Callable] = None, max_age_ms: float = SUMMARY_MAX_AGE_MS):
+        if render is not None:
+            # render(db, version) builds what get() hands out; floor.py reuses the class for its views
+            self.render = render
+        self.max_age = max_age_ms / 1000
+        self.version: Optional[int] = None
+        self.body = None
+        self.checked_at = 0.0
+        self.generation = 0
+        self.hits = 0
+        self.renders = 0
+
+    def invalidate(self, events=None):
+        self.generation += 1
+        self.checked_at = 0.0
+
+    async def render(self, db: AsyncSession, version: int) -> bytes:
+        return serialization.dumps({**await status_summary(db), "version": version})
+
+    async def get(self, db: AsyncSession):
+        now = time.monotonic()
+        if self.body is not None and now - self.checked_at < self.max_age:
+            self.hits += 1
+            return self.body
+        generation = self.generation
+        # Counter first, counts second: the body is never older than the version it is tagged with
+        version, _ = await current_version(db)
+        if self.body is None or version != self.version:
+            self.body = await self.render(db, version)
+            self.version = version
+            self.renders += 1
+        if generation == self.generation:
+            self.checked_at = now
+        return self.body
+
+    def stats(self) -> dict:
+        return {"version": self.version, "hits": self.hits, "renders": self.renders}
+
+
+floor_summary = FloorSummary()
+
+
+async def downtime_report(db: AsyncSession, group_by: str, since: date, until: date) -> list:
+    """Closed downtime and repairs per group over [since, until), read from the daily rollup."""
+    column = daily_table.c[group_by]
+    result = await db.execute(
+        select(
+            column,
+            func.sum(daily_table.c.downtime_seconds),
+            func.sum(daily_table.c.downtime_events),
+            func.sum(daily_table.c.repair_seconds),
+            func.sum(daily_table.c.repairs),
+        )
+        .where(daily_table.c.day >= since, daily_table.c.day < until)
+        .group_by(column)
+        .order_by(column)
+    )
+    return [
+        {
+            "group": group,
+            "downtime_seconds": downtime,
+            "downtime_events": events,
+            "mean_downtime_seconds": downtime / events if events else None,
+            "repairs": repairs,
+            "mttr_seconds": repair_seconds / repairs if repairs else None,
+        }
+        for group, downtime, events, repair_seconds, repairs in result
+    ]
+
+
+async def open_report(db: AsyncSession, group_by: str) -> list:
+    """Machines currently down and unresolved tickets per group, with their mean age."""
+    column = open_table.c[group_by]
+    down = func.sum(open_table.c.down_machines)
+    tickets = func.sum(open_table.c.open_tickets)
+    result = await db.execute(
+        select(column, down, func.sum(open_table.c.down_since_sum), tickets, func.sum(open_table.c.reported_sum))
+        .group_by(column)
+        .having(or_(down > 0, tickets > 0))
+        .order_by(column)
+    )
+    now = time.time()
+    report = []
+    for group, down_machines, down_since_sum, open_tickets, reported_sum in result:
+        ongoing = down_machines * now - down_since_sum
+        report.append({
+            "group": group,
+            "down_machines": down_machines,
+            "ongoing_downtime_seconds": ongoing,
+            "mean_down_age_seconds": ongoing / down_machines if down_machines else None,
+            "open_tickets": open_tickets,
+            "mean_ticket_age_seconds": (open_tickets * now - reported_sum) / open_tickets if open_tickets else None,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    if sys.argv[1:] == ["reconcile"]:
+        with engine.begin() as connection:
+            print(f"Machine status counts reconciled; {reconcile_status_counts(connection)} group(s) had drifted")
+        sys.exit(0)
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python analytics.py rebuild|reconcile")
+        sys.exit(2)
+    with engine.begin() as connection:
+        rebuild(connection)
+    print("Downtime rollups rebuilt")
@@ -0,0 +1,414 @@
+import logging
+import os
+import sys
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Index, Integer, MetaData, Table, Text, create_engine, delete, func, insert, select, text,
+    tuple_
+)
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlalchemy.types import TypeDecorator
+import models
+import schemas
+from pagination import decode_time_cursor
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+# Resolved records whose ticket closed longer ago than this move to the cold tier
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_COMPRESS = os.getenv("ARCHIVE_COMPRESS", "false").lower() in ("1", "true", "yes", "on")
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+# Neither set leaves archiving and compaction to `python archive.py run` (e.g. from cron);
+# ARCHIVE_CRON (e.g. "30 3 * * *") wins over the interval
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "0"))
+ARCHIVE_CRON = os.getenv("ARCHIVE_CRON", "")
+# VACUUM the hot file only when at least this share of its pages is free
+VACUUM_FREE_RATIO = float(os.getenv("VACUUM_FREE_RATIO", "0.2"))
+COMPRESS_MIN_BYTES = 64
+
+logger = logging.getLogger("casino.archive")
+
+hot_table = models.MaintenanceRecord.__table__
+catalog_table = models.MaintenanceArchive.__table__
+
+
+class MaybeCompressedText(TypeDecorator):
+    """Text stored zlib-compressed (as a BLOB) when ARCHIVE_COMPRESS is on.
+
+    Reads tell the two apart by type, so files written either way stay readable.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if ARCHIVE_COMPRESS and value is not None and len(value) >= COMPRESS_MIN_BYTES:
+            return zlib.compress(value.encode())
+        return value
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, bytes):
+            return zlib.decompress(value).decode()
+        return value
+
+
+# One file per month of reported_time; same columns as the hot table, minus the foreign keys
+archive_metadata = MetaData()
+archived_records = Table(
+    "maintenance_records",
+    archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("machine_id", Integer),
+    Column("technician_id", Integer),
+    Column("issue_description", MaybeCompressedText),
+    Column("repair_description", MaybeCompressedText),
+    Column("reported_time", DateTime(timezone=True)),
+    Column("resolved_time", DateTime(timezone=True)),
+    Column("is_resolved", Boolean),
+    Index("ix_archived_machine_reported", "machine_id", "reported_time", "id"),
+    Index("ix_archived_reported", "reported_time", "id"),
+)
+
+
+def month_of(value: datetime) -> str:
+    return value.strftime("%Y-%m")
+
+
+def month_path(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"maintenance-{month}.db")
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored times are naive UTC; query parameters may carry an offset
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Each file indexes its own records for /search. Contentless, because the text may
+# be stored compressed: the index is fed plain text when rows are written, and
+# snippets for archived hits are cut in Python.
+ARCHIVE_FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS maintenance_fts USING fts5("
+    "issue_description, repair_description, content='', tokenize='porter unicode61')"
+)
+SEARCHED_COLUMNS = ("issue_description", "repair_description")
+
+
+def _index_rows(connection, rows: List[dict]):
+    if rows:
+        connection.execute(
+            text("INSERT INTO maintenance_fts(rowid, issue_description, repair_description) "
+                 "VALUES (:id, :issue_description, :repair_description)"),
+            [{key: row[key] for key in ("id",) + SEARCHED_COLUMNS} for row in rows],
+        )
+
+
+def _ensure_search_index(connection):
+    """Create the file's search index, indexing the rows already in it when it is new."""
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'maintenance_fts'"
+    ).first()
+    if exists is None:
+        connection.exec_driver_sql(ARCHIVE_FTS_DDL)
+        rows = connection.execute(
+            select(archived_records.c.id, *[archived_records.c[name] for name in SEARCHED_COLUMNS])
+        ).mappings().all()
+        _index_rows(connection, [dict(row) for row in rows])
+
+
+def _write_month(month: str, rows: List[dict]) -> int:
+    """Add ``rows`` to the month's file; returns how many records the file now holds."""
+    engine = create_engine(f"sqlite:///{month_path(month)}", poolclass=NullPool)
+    try:
+        archive_metadata.create_all(engine)
+        with engine.begin() as connection:
+            _ensure_search_index(connection)
+            # A rerun after a crash between the two commits finds its rows already here;
+            # they must not be inserted or indexed a second time
+            present = set(connection.execute(
+                select(archived_records.c.id).where(archived_records.c.id.in_([row["id"] for row in rows]))
+            ).scalars())
+            new_rows = [row for row in rows if row["id"] not in present]
+            if new_rows:
+                connection.execute(insert(archived_records), new_rows)
+                _index_rows(connection, new_rows)
+            return connection.execute(select(func.count()).select_from(archived_records)).scalar()
+    finally:
+        engine.dispose()
+
+
+def _update_catalog(connection, month: str, rows: List[dict], records: int):
+    reported = [row["reported_time"] for row in rows]
+    ids = [row["id"] for row in rows]
+    entry = connection.execute(select(catalog_table).where(catalog_table.c.month == month)).first()
+    values = {
+        # Counted in the file, so rows written twice after a crash are not counted twice
+        "records": records,
+        "min_reported": min(reported),
+        "max_reported": max(reported),
+        "min_id": min(ids),
+        "max_id": max(ids),
+        "updated_at": datetime.utcnow(),
+    }
+    if entry is None:
+        connection.execute(insert(catalog_table).values(month=month, **values))
+        return
+    connection.execute(
+        catalog_table.update().where(catalog_table.c.month == month).values(
+            records=values["records"],
+            min_reported=min(entry.min_reported, values["min_reported"]),
+            max_reported=max(entry.max_reported, values["max_reported"]),
+            min_id=min(entry.min_id, values["min_id"]),
+            max_id=max(entry.max_id, values["max_id"]),
+            updated_at=values["updated_at"],
+        )
+    )
+
+
+def index_archives(engine) -> int:
+    """Give every archive file written before files were indexed its search index; returns the files checked."""
+    with engine.connect() as connection:
+        months = connection.execute(select(catalog_table.c.month)).scalars().all()
+    for month in months:
+        cold = create_engine(f"sqlite:///{month_path(month)}", poolclass=NullPool)
+        try:
+            with cold.begin() as connection:
+                _ensure_search_index(connection)
+        finally:
+            cold.dispose()
+    return len(months)
+
+
+def archive_resolved(engine, older_than_days: float = ARCHIVE_AFTER_DAYS, now: Optional[datetime] = None,
+                     proceed: Optional[Callable[[], bool]] = None) -> int:
+    """Move resolved records closed before the cutoff into the monthly files; returns how many moved.
+
+    Each batch is committed to its archive files before it is deleted from the hot
+    table (together with the catalog update), so a crash can leave a record in both
+    tiers, which readers tolerate, but never in neither. Downtime rollups are not
+    touched: they already count these repairs. The record with the highest id always
+    stays hot. ``proceed`` is asked before every batch; the scheduler uses it to
+    stop a worker that lost its lease.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    moved = 0
+    while proceed is None or proceed():
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(hot_table)
+                .where(
+                    hot_table.c.is_resolved == True,
+                    hot_table.c.resolved_time < cutoff,
+                    # SQLite numbers a new row max(id) + 1: keeping the newest record hot means
+                    # an archived id is never handed out again
+                    hot_table.c.id < select(func.max(hot_table.c.id)).scalar_subquery(),
+                )
+                .order_by(hot_table.c.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+            ).mappings().all()
+        if not rows:
+            return moved
+        by_month: Dict[str, List[dict]] = defaultdict(list)
+        for row in rows:
+            by_month[month_of(row["reported_time"])].append(dict(row))
+        counts = {month: _write_month(month, month_rows) for month, month_rows in by_month.items()}
+        with engine.begin() as connection:
+            # Also fires the hot search index's delete trigger; archived records are
+            # searched in their month's own index from then on
+            connection.execute(delete(hot_table).where(hot_table.c.id.in_([row["id"] for row in rows])))
+            for month, month_rows in by_month.items():
+                _update_catalog(connection, month, month_rows, counts[month])
+        moved += len(rows)
+    return moved
+
+
+def compact(engine) -> dict:
+    """Refresh planner statistics and give space freed by archiving back to the OS.
+
+    VACUUM rewrites the whole file under an exclusive lock, so it only runs once
+    enough of the file is free pages; ANALYZE and the WAL truncation always run.
+    """
+    if engine.dialect.name != "sqlite":
+        return {}
+    import search
+
+    with engine.begin() as connection:
+        search.maintain(connection, "optimize")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("ANALYZE")
+        pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        free = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        vacuumed = bool(pages) and free / pages >= VACUUM_FREE_RATIO
+        if vacuumed:
+            connection.exec_driver_sql("VACUUM")
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"pages": pages, "free_pages": free, "vacuumed": vacuumed}
+
+
+def run(engine, proceed: Optional[Callable[[], bool]] = None) -> dict:
+    index_archives(engine)
+    moved = archive_resolved(engine, proceed=proceed)
+    report = {"archived": moved}
+    if proceed is None or proceed():
+        report.update(compact(engine))
+    logger.info("archive run: %s", report)
+    return report
+
+
+# Reading the cold tier: one read-only engine per month, opened on first use
+_read_engines: Dict[str, AsyncEngine] = {}
+
+
+def _read_engine(month: str) -> AsyncEngine:
+    engine = _read_engines.get(month)
+    if engine is None:
+        path = os.path.abspath(month_path(month))
+        engine = _read_engines[month] = create_async_engine(
+            f"sqlite+aiosqlite:///file:{path}?mode=ro&uri=true", poolclass=NullPool
+        )
+    return engine
+
+
+async def dispose():
+    for engine in _read_engines.values():
+        await engine.dispose()
+    _read_engines.clear()
+
+
+async def catalog(db: AsyncSession) -> list:
+    return (await db.execute(select(catalog_table).order_by(catalog_table.c.month.desc()))).all()
+
+
+async def _hydrate(db: AsyncSession, rows: list) -> List[schemas.MaintenanceRecordDetail]:
+    """Attach machine and technician from the hot tier, as RECORD_LOAD_OPTIONS does for hot rows."""
+    if not rows:
+        return []
+    machine_ids = {row.machine_id for row in rows}
+    technician_ids = {row.technician_id for row in rows}
+    machines = {
+        machine.id: machine for machine in
+        (await db.execute(select(models.Machine).where(models.Machine.id.in_(machine_ids)))).scalars()
+    }
+    technicians = {
+        technician.id: technician for technician in
+        (await db.execute(select(models.Technician).where(models.Technician.id.in_(technician_ids)))).scalars()
+    }
+    return [
+        schemas.MaintenanceRecordDetail(
+            **row._asdict(),
+            machine=schemas.MachineSummary.model_validate(machines[row.machine_id]) if row.machine_id in machines else None,
+            technician=schemas.Technician.model_validate(technicians[row.technician_id])
+            if row.technician_id in technicians else None,
+        )
+        for row in rows
+    ]
+
+
+async def cold_page(db: AsyncSession, months: list, params, machine_id: Optional[int] = None) -> list:
+    """The newest params.limit + 1 matching records from each of the given months."""
+    stmt = select(archived_records).where(*params.filters(archived_records.c))
+    if machine_id is not None:
+        stmt = stmt.where(archived_records.c.machine_id == machine_id)
+    if params.cursor:
+        reported_time, record_id = decode_time_cursor(params.cursor)
+        stmt = stmt.where(
+            tuple_(archived_records.c.reported_time, archived_records.c.id) < tuple_(reported_time, record_id)
+        )
+    stmt = stmt.order_by(archived_records.c.reported_time.desc(), archived_records.c.id.desc()).limit(params.limit + 1)
+    rows = []
+    for entry in months:
+        async with _read_engine(entry.month).connect() as connection:
+            rows.extend((await connection.execute(stmt)).all())
+    return await _hydrate(db, rows)
+
+
+async def find_record(db: AsyncSession, record_id: int) -> Optional[schemas.MaintenanceRecordDetail]:
+    months = [entry for entry in await catalog(db) if entry.min_id <= record_id <= entry.max_id]
+    for entry in months:
+        async with _read_engine(entry.month).connect() as connection:
+            row = (await connection.execute(select(archived_records).where(archived_records.c.id == record_id))).first()
+        if row is not None:
+            return (await _hydrate(db, [row]))[0]
+    return None
+
+
+async def search_archived(db: AsyncSession, match: str, after: Optional[list], limit: int) -> list:
+    """Up to ``limit`` hits for an FTS5 ``match``, month by month, newest month first.
+
+    Each month's hits are ordered by that file's own bm25 ranks, which are not
+    comparable across files, so months are never merged by rank. ``after`` is a
+    (month, rank, id) cursor. Files are opened only until ``limit`` hits are found.
+    """
+    stmt = text(
+        "SELECT * FROM (SELECT 'maintenance' AS kind, r.id AS id, r.machine_id AS machine_id, "
+        "bm25(maintenance_fts) AS rank, r.issue_description AS issue_description, "
+        "r.repair_description AS repair_description FROM maintenance_fts "
+        "JOIN maintenance_records r ON r.id = maintenance_fts.rowid WHERE maintenance_fts MATCH :match) "
+        "WHERE (rank, id) > (:after_rank, :after_id) ORDER BY rank, id LIMIT :limit"
+    ).columns(issue_description=MaybeCompressedText, repair_description=MaybeCompressedText)
+    rows = []
+    for entry in await catalog(db):
+        if after and entry.month > after[0]:
+            continue
+        # Only the cursor's own month starts part way through
+        after_rank, after_id = after[1:] if after and entry.month == after[0] else (float("-inf"), 0)
+        params = {"match": match, "after_rank": after_rank, "after_id": after_id, "limit": limit - len(rows)}
+        async with _read_engine(entry.month).connect() as connection:
+            rows.extend((entry.month, row) for row in (await connection.execute(stmt, params)).all())
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+async def stream_archived(columns: List) -> AsyncIterator[list]:
+    """Batches of every archived record, month by month, with the named columns of ``columns``."""
+    from database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        months = [entry.month for entry in reversed(await catalog(db))]
+    stmt = (
+        select(*[archived_records.c[column.key] for column in columns])
+        .order_by(archived_records.c.id)
+        .execution_options(yield_per=ARCHIVE_BATCH_SIZE)
+    )
+    for month in months:
+        async with _read_engine(month).connect() as connection:
+            result = await connection.stream(stmt)
+            async for partition in result.partitions():
+                yield partition
+
+
+def iter_archived_tickets(connection) -> Iterator[tuple]:
+    """(machine_id, reported_time, resolved_time) of every archived record, for rollup rebuilds."""
+    months = connection.execute(select(catalog_table.c.month)).scalars().all()
+    for month in months:
+        engine = create_engine(f"sqlite:///{month_path(month)}", poolclass=NullPool)
+        try:
+            with engine.connect() as cold:
+                yield from cold.execute(
+                    select(archived_records.c.machine_id, archived_records.c.reported_time,
+                           archived_records.c.resolved_time)
+                    .execution_options(yield_per=10000)
+                )
+        finally:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    commands = {
+        "run": lambda: run(engine),
+        "archive": lambda: {"archived": archive_resolved(engine)},
+        "compact": lambda: compact(engine),
+        "index": lambda: {"indexed_files": index_archives(engine)},
+    }
+    if sys.argv[1:2] not in ([name] for name in commands):
+        print("usage: python archive.py run|archive|compact|index")
+        sys.exit(2)
+    print(commands[sys.argv[1]]())
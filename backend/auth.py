@@ -1,12 +1,21 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import threading
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import AsyncSessionLocal, get_async_db
+import events
+import metrics
 import models
+import schemas
 import os
 from dotenv import load_dotenv
 
@@ -16,15 +25,179 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+# Also the longest another worker can act on a stale principal when EVENT_BROKER=local
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "5"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+
+USERS_CHANGED = events.INTERNAL_PREFIX + "users_changed"
+
+# Pinning min/max rounds to the configured cost makes passlib flag any hash made
+# with a different cost as needing an update, so it is rehashed on next login.
+# passlib and bcrypt load on first use rather than on every worker boot.
+@lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
+
+# bcrypt releases the GIL, so a small dedicated pool keeps hashing off the event
+# loop without competing with FastAPI's default threadpool.
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+
+def _timed_hash(operation: str, func, *args):
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        metrics.PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, operation)
+
+async def _run_in_hash_pool(operation: str, func, *args):
+    # Shed load instead of queueing without bound when the pool is saturated
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    future = asyncio.get_running_loop().run_in_executor(_hash_executor, _timed_hash, operation, func, *args)
+    # Release on completion rather than on await so a cancelled login keeps its slot until bcrypt finishes
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return await future
+
+async def verify_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verify on the hash pool; also returns a new hash when the stored one uses outdated settings."""
+    return await _run_in_hash_pool("verify", pwd_context().verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await _run_in_hash_pool("hash", pwd_context().hash, password)
+
+class PrincipalCache:
+    """Bounded LRU of resolved principals keyed by bearer token.
+
+    Entries expire after ``ttl`` seconds or when the token itself expires,
+    whichever comes first, and are dropped as soon as a change to the user row
+    commits. Other workers hear of the change through the event broker: with
+    EVENT_BROKER=sqlite within EVENT_POLL_SECONDS, with the local broker (or a
+    change made outside the app) only when their entries expire, so a
+    deactivated user or revoked admin keeps access there for up to ``ttl``.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[schemas.User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                principal, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return principal
+                self._discard(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, principal: schemas.User, token_exp: Optional[float] = None):
+        if self.maxsize <= 0:
+            return
+        lifetime = self.ttl
+        if token_exp is not None:
+            lifetime = min(lifetime, token_exp - time.time())
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (principal, time.monotonic() + lifetime)
+            self._tokens_by_user.setdefault(principal.username, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_user(self, username: str):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(username, ())):
+                self._discard(token)
+
+    def apply_events(self, events: List[dict]):
+        """Event hub listener: evict the users other workers report as changed."""
+        for item in events:
+            if item.get("type") == USERS_CHANGED:
+                for username in item["usernames"]:
+                    self.invalidate_user(username)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _discard(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        username = entry[0].username
+        tokens = self._tokens_by_user.get(username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[username]
+
+principal_cache = PrincipalCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+events.hub.add_listener(principal_cache.apply_events)
+
+# Drop cached principals once a change to a user row is committed, whichever
+# endpoint or script made it.
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_usernames", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User):
+            changed.add(obj.username)
+            # A rename must also evict tokens issued under the old name
+            history = inspect(obj).attrs.username.history
+            changed.update(name for name in history.deleted if name)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    changed = session.info.pop("changed_usernames", None)
+    if not changed:
+        return
+    for username in changed:
+        principal_cache.invalidate_user(username)
+    # The other workers' caches, through the broker
+    events.hub.publish([{"type": USERS_CHANGED, "usernames": sorted(changed)}])
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_usernames", None)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -33,29 +206,69 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # jose pulls in the cryptography backends; import it on first use, not at boot
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def resolve_principal(token: str, db: AsyncSession) -> Optional[schemas.User]:
+    """Return the user a bearer token belongs to, or None if the token is invalid."""
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
+    from jose import JWTError, jwt
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    user = result.scalar_one_or_none()
+    if user is None:
+        return None
+    principal = schemas.User.model_validate(user)
+    principal_cache.put(token, principal, payload.get("exp"))
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if user is None:
+    principal = await resolve_principal(token, db)
+    if principal is None:
         raise credentials_exception
-    return user
+    return principal
 
-async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_active_user(current_user: schemas.User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    return current_user
+
+async def get_stream_user(
+    header_token: Optional[str] = Depends(oauth2_scheme_optional),
+    token: Optional[str] = None
+):
+    # Browsers cannot set headers on EventSource, so streams also accept ?token=.
+    # A short-lived session keeps a long-lived stream from pinning a pooled connection.
+    async with AsyncSessionLocal() as db:
+        principal = await resolve_principal(header_token or token or "", db)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_active_user(principal)
+
+async def get_current_admin_user(current_user: schemas.User = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
     return current_user 
\ No newline at end of file
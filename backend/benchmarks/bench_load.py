@@ -0,0 +1,368 @@
+"""Load and latency benchmark for the API, run in-process against a seeded SQLite copy.
+
+    python benchmarks/bench_load.py                       # full volumes, compare to baseline.json
+    python benchmarks/bench_load.py --scale 0.05          # quick run on 5% of the data
+    python benchmarks/bench_load.py --save-baseline       # record the current numbers as the baseline
+
+The seeded database (100k machines, 1M maintenance records, 500 users at
+--scale 1) is built once from a fixed random seed and cached; every run works on
+a fresh copy of it. Each scenario runs sequentially and then under concurrent
+load. Results are printed as JSON; with a baseline, regressions in p95 latency,
+throughput, queries per request or errors exit with status 1.
+"""
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND, "benchmarks", "baseline.json")
+SEED = 20261018
+PASSWORD = "Bench-pass-1"
+
+MACHINES = 100_000
+MAINTENANCE_RECORDS = 1_000_000
+USERS = 500
+TECHNICIANS = 200
+
+VENDORS = ["IGT", "Aristocrat", "Konami", "Everi", "Light & Wonder", "AGS"]
+MACHINE_TYPES = ["Slot Machine", "Video Poker", "Electronic Table", "Keno"]
+ISSUES = [
+    "bill validator jam", "ticket printer out of paper", "touchscreen not responding",
+    "door open alarm", "hopper empty", "reel tilt", "network offline", "coin acceptor jam",
+]
+REPAIRS = [
+    "cleared validator path", "replaced printer roll", "recalibrated touchscreen",
+    "reset door sensor", "refilled hopper", "replaced reel motor", "reseated network cable",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="main", choices=["main", "CasinoDatabaseCode"])
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the full data volumes")
+    parser.add_argument("--requests", type=int, default=400, help="requests per scenario and phase")
+    parser.add_argument("--login-requests", type=int, default=40, help="logins are bcrypt-bound, so fewer")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "casino-bench"))
+    parser.add_argument("--output", help="also write the JSON results here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--latency-tolerance", type=float, default=0.30, help="allowed p95 increase")
+    parser.add_argument("--throughput-tolerance", type=float, default=0.30, help="allowed throughput drop")
+    return parser.parse_args()
+
+
+def seed_database(path: str, scale: float):
+    """Build the seed database with Core inserts; deterministic for a given scale."""
+    import models
+    import search  # noqa: F401  creates the FTS index with the tables
+    import analytics
+    import startup
+    from auth import get_password_hash
+    from sqlalchemy import create_engine, insert
+
+    rng = random.Random(SEED)
+    machines = max(1, int(MACHINES * scale))
+    records = int(MAINTENANCE_RECORDS * scale)
+    users = max(1, int(USERS * scale))
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(engine)
+    epoch = datetime(2023, 1, 1)
+    span = timedelta(days=3 * 365).total_seconds()
+    statuses = list(models.MachineStatus)
+
+    with engine.begin() as connection:
+        # One hash for everyone: realistic verify cost without 500 hashes up front
+        hashed = get_password_hash(PASSWORD)
+        connection.execute(insert(models.User.__table__), [
+            {"username": f"user{i}", "email": f"user{i}@casino.com", "hashed_password": hashed,
+             "is_active": True, "is_admin": i == 0}
+            for i in range(users)
+        ])
+        connection.execute(insert(models.Technician.__table__), [
+            {"name": f"Technician {i}", "employee_id": f"T{i:04d}", "contact_number": f"555-{i:04d}"}
+            for i in range(TECHNICIANS)
+        ])
+        rows = []
+        for i in range(machines):
+            status = rng.choices(statuses, weights=[1, 8, 1])[0]
+            rows.append({
+                "machine_number": f"M{i:06d}",
+                "serial_number": f"SN{i:08d}",
+                "vendor": rng.choice(VENDORS),
+                "notes": rng.choice(ISSUES) if rng.random() < 0.3 else None,
+                "status": status,
+                "date_down": epoch + timedelta(seconds=rng.random() * span),
+                "location": f"Zone {rng.randint(1, 12)} Bank {rng.randint(1, 40)}",
+                "machine_type": rng.choice(MACHINE_TYPES),
+                "is_out_of_service": False,
+                "current_issue": rng.choice(ISSUES) if status != models.MachineStatus.FIXED else None,
+                "updated_at": epoch,
+                "row_version": 1,
+            })
+        connection.execute(insert(models.Machine.__table__), rows)
+
+        table = models.MaintenanceRecord.__table__
+        for start in range(0, records, 50_000):
+            batch = []
+            for _ in range(min(50_000, records - start)):
+                reported = epoch + timedelta(seconds=rng.random() * span)
+                resolved = rng.random() < 0.95
+                batch.append({
+                    "machine_id": rng.randint(1, machines),
+                    "technician_id": rng.randint(1, TECHNICIANS),
+                    "issue_description": rng.choice(ISSUES),
+                    "repair_description": rng.choice(REPAIRS) if resolved else None,
+                    "reported_time": reported,
+                    "resolved_time": reported + timedelta(minutes=rng.randint(5, 600)) if resolved else None,
+                    "is_resolved": resolved,
+                })
+            connection.execute(insert(table), batch)
+        analytics.rebuild(connection)
+        startup.stamp_head(connection)
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    engine.dispose()
+    return {"machines": machines, "maintenance_records": records, "users": users}
+
+
+def prepare_database(args) -> tuple:
+    os.makedirs(args.cache_dir, exist_ok=True)
+    run_path = os.path.join(args.cache_dir, f"run-{os.getpid()}.db")
+    # database.py builds its engines at import time, so point it at the run copy first
+    os.environ["DATABASE_URL"] = f"sqlite:///{run_path}"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    sys.path.insert(0, BACKEND)
+    from startup import head_revision
+
+    # Seeds are built from the models, so a new migration means a new seed
+    seed_path = os.path.join(args.cache_dir, f"seed-{args.scale:g}-{head_revision()}.db")
+
+    if not os.path.exists(seed_path):
+        print(f"seeding {seed_path} ...", file=sys.stderr)
+        started = time.perf_counter()
+        counts = seed_database(seed_path + ".tmp", args.scale)
+        os.replace(seed_path + ".tmp", seed_path)
+        print(f"seeded {counts} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    shutil.copyfile(seed_path, run_path)
+    with sqlite3.connect(run_path) as connection:
+        counts = {
+            table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("machines", "maintenance_records", "users")
+        }
+    return run_path, counts
+
+
+def percentile(ordered: list, p: float) -> float:
+    # Nearest-rank
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+class Scenarios:
+    """Request builders; each takes the request index and returns (method, url, kwargs)."""
+
+    def __init__(self, counts: dict, tokens: list, run_id: str):
+        self.rng = random.Random(SEED)
+        self.machines = counts["machines"]
+        self.users = counts["users"]
+        self.tokens = tokens
+        self.run_id = run_id
+
+    def _auth(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+
+    def _machine(self) -> str:
+        return f"M{self.rng.randrange(self.machines):06d}"
+
+    def login(self, i):
+        data = {"username": f"user{self.rng.randrange(self.users)}", "password": PASSWORD}
+        return "POST", "/token", {"data": data}
+
+    def list(self, i):
+        params = {"limit": 100}
+        if i % 2:
+            params["vendor"] = self.rng.choice(VENDORS)
+        if i % 3 == 0:
+            params["status"] = "down"
+        return "GET", "/machines/", {"params": params, "headers": self._auth()}
+
+    def get(self, i):
+        return "GET", f"/machines/{self._machine()}", {"headers": self._auth()}
+
+    def patch(self, i):
+        body = {"status": self.rng.choice(["down", "in_progress", "fixed"])}
+        if i % 4 == 0:
+            body["notes"] = self.rng.choice(ISSUES)
+        return "PATCH", f"/machines/{self._machine()}", {"json": body, "headers": self._auth()}
+
+    def create(self, i):
+        number = f"B{self.run_id}-{i:06d}-{self.rng.randrange(10**9)}"
+        body = {"machine_number": number, "serial_number": f"S{number}", "vendor": self.rng.choice(VENDORS)}
+        return "POST", "/machines/", {"json": body, "headers": self._auth()}
+
+
+async def run_phase(client, build, count: int, concurrency: int, counter: QueryCounter) -> dict:
+    latencies = []
+    errors = 0
+    indexes = itertools.count()
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            if i >= count:
+                return
+            method, url, kwargs = build(i)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    queries_before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "throughput_rps": round(count / elapsed, 1),
+        "queries_per_request": round((counter.count - queries_before) / count, 2),
+    }
+
+
+async def run(args, counts: dict) -> dict:
+    import httpx
+    from sqlalchemy import event
+    import database
+
+    app = importlib.import_module(args.app).app
+    counter = QueryCounter()
+    for engine in (database.engine, database.async_engine.sync_engine):
+        event.listen(engine, "before_cursor_execute", counter)
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            tokens = []
+            for i in range(min(20, counts["users"])):
+                response = await client.post("/token", data={"username": f"user{i}", "password": PASSWORD})
+                response.raise_for_status()
+                tokens.append(response.json()["access_token"])
+            scenarios = Scenarios(counts, tokens, str(os.getpid()))
+            plan = [
+                ("login", scenarios.login, args.login_requests),
+                ("list", scenarios.list, args.requests),
+                ("get", scenarios.get, args.requests),
+                ("patch", scenarios.patch, args.requests),
+                ("create", scenarios.create, args.requests),
+            ]
+            for name, build, count in plan:
+                # Warm caches and pools so the first phase is not penalized
+                await run_phase(client, build, min(10, count), 1, counter)
+                results[name] = {
+                    "sequential": await run_phase(client, build, count, 1, counter),
+                    "concurrent": await run_phase(client, build, count, args.concurrency, counter),
+                }
+    return results
+
+
+def compare(results: dict, baseline: dict, args) -> list:
+    failures = []
+    for name, phases in results.items():
+        for phase, current in phases.items():
+            previous = baseline.get("results", {}).get(name, {}).get(phase)
+            label = f"{name}/{phase}"
+            if current["errors"]:
+                failures.append(f"{label}: {current['errors']} failed requests")
+            if not previous:
+                continue
+            if current["p95_ms"] > previous["p95_ms"] * (1 + args.latency_tolerance):
+                failures.append(f"{label}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - args.throughput_tolerance):
+                failures.append(f"{label}: {current['throughput_rps']} req/s vs baseline {previous['throughput_rps']} req/s")
+            # Statement counts do not depend on the machine, so any real increase counts
+            if current["queries_per_request"] > previous["queries_per_request"] + 0.5:
+                failures.append(
+                    f"{label}: {current['queries_per_request']} queries/request "
+                    f"vs baseline {previous['queries_per_request']}"
+                )
+    return failures
+
+
+def main():
+    args = parse_args()
+    run_path, counts = prepare_database(args)
+    try:
+        results = asyncio.run(run(args, counts))
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(run_path + suffix):
+                os.remove(run_path + suffix)
+
+    report = {
+        "meta": {
+            "app": args.app,
+            "scale": args.scale,
+            "rows": counts,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+        return
+
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against; run with --save-baseline", file=sys.stderr)
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("scale") != args.scale or baseline["meta"].get("app") != args.app:
+        print("baseline was recorded with a different --scale/--app; not comparing", file=sys.stderr)
+        return
+    failures = compare(results, baseline, args)
+    if failures:
+        print("REGRESSIONS:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+        sys.exit(1)
+    print("no regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
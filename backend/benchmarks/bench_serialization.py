@@ -0,0 +1,103 @@
+"""Compare the response_model path with the fast serialization path for machine lists.
+
+    python benchmarks/bench_serialization.py [--sizes 1000 10000 100000] [--repeat 3]
+
+Each size gets its own throwaway SQLite file. Timings cover the query plus
+encoding to response bytes, which is where the two paths differ.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+import models
+import schemas
+import serialization
+
+RESPONSE_FIELD = create_response_field(name="Response", type_=List[schemas.Machine])
+
+
+def seed(engine, size: int):
+    models.Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    statuses = list(models.MachineStatus)
+    rows = [
+        {
+            "machine_number": f"M{i:06d}",
+            "serial_number": f"SN{i:08d}",
+            "vendor": ("IGT", "Aristocrat", "Konami", "Everi")[i % 4],
+            "notes": "Bill validator serviced" if i % 3 else None,
+            "status": statuses[i % len(statuses)],
+            "date_down": start + timedelta(minutes=i),
+            "location": f"Zone {i % 12}",
+            "machine_type": "Slot Machine",
+            "is_out_of_service": False,
+            "updated_at": start,
+            "row_version": 1,
+        }
+        for i in range(size)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(models.Machine.__table__), rows)
+
+
+def model_path(engine) -> bytes:
+    # What FastAPI does for response_model=List[schemas.Machine]
+    with Session(engine) as db:
+        machines = db.execute(select(models.Machine).order_by(models.Machine.date_down, models.Machine.id)).scalars().all()
+        content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=machines))
+    return JSONResponse(content).body
+
+
+def fast_path(engine) -> bytes:
+    with Session(engine) as db:
+        rows = db.execute(
+            select(*serialization.MACHINE_COLUMNS).order_by(models.Machine.date_down, models.Machine.id)
+        ).all()
+    return serialization.dump_rows(rows)
+
+
+def best_of(function, engine, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(engine)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    encoder = "orjson" if serialization.orjson is not None else "pydantic-core"
+    print(f"fast path encoder: {encoder}")
+    print(f"{'rows':>8}  {'response_model':>14}  {'fast':>8}  {'speedup':>7}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            engine = create_engine(f"sqlite:///{directory}/bench_{size}.db")
+            seed(engine, size)
+            # Same documents either way, or the comparison is meaningless
+            assert json.loads(model_path(engine)) == json.loads(fast_path(engine))
+            slow = best_of(model_path, engine, args.repeat)
+            fast = best_of(fast_path, engine, args.repeat)
+            print(f"{size:>8}  {slow * 1000:>12.1f}ms  {fast * 1000:>6.1f}ms  {slow / fast:>6.1f}x")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
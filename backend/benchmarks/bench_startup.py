@@ -0,0 +1,99 @@
+"""Worker boot time: a fresh interpreter importing the app and running its lifespan startup.
+
+    python benchmarks/bench_startup.py [--app main] [--runs 10] [--budget 1.0]
+
+Each run spawns a new process, as a uvicorn worker would, against a database
+created once with init_db.py. Boot is measured from spawn until startup has
+finished (schema revision verified, pools warmed). The framework floor, a
+process that only imports FastAPI, SQLAlchemy and pydantic, is reported
+alongside so the app's own share is visible. Exits with status 1 when the
+median boot exceeds --budget seconds.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FLOOR = "import fastapi, pydantic, sqlalchemy.ext.asyncio, sqlalchemy.orm"
+
+BOOT = """
+import asyncio, importlib, json, sys, time
+started = time.perf_counter()
+app = importlib.import_module(sys.argv[1]).app
+imported = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        print(json.dumps({"import": imported - started, "lifespan": ready - imported}), flush=True)
+
+asyncio.run(boot())
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="main", choices=["main", "CasinoDatabaseCode"])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=1.0, help="max median boot in seconds")
+    return parser.parse_args()
+
+
+def spawn(args: list, env: dict) -> tuple:
+    """Run a child to completion; returns (seconds until its first line of output, that line)."""
+    started = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, *args], cwd=BACKEND, env=env, stdout=subprocess.PIPE, text=True
+    )
+    line = child.stdout.readline()
+    elapsed = time.perf_counter() - started
+    child.stdout.read()
+    if child.wait() != 0:
+        raise SystemExit(f"{args} exited with {child.returncode}")
+    return elapsed, line
+
+
+def summary(values: list) -> dict:
+    return {"median": round(statistics.median(values), 4), "min": round(min(values), 4), "max": round(max(values), 4)}
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="casino-startup-") as workdir:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'casino.db')}")
+        env.pop("ASYNC_DATABASE_URL", None)
+        subprocess.run([sys.executable, "init_db.py"], cwd=BACKEND, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        # One untimed run so every run finds compiled bytecode and a warm page cache
+        spawn(["-c", BOOT, args.app], env)
+        floor, boot, phases = [], [], {"import": [], "lifespan": []}
+        for _ in range(args.runs):
+            floor.append(spawn(["-c", FLOOR + "; print()"], env)[0])
+            elapsed, line = spawn(["-c", BOOT, args.app], env)
+            boot.append(elapsed)
+            for phase, seconds in json.loads(line).items():
+                phases[phase].append(seconds)
+
+    report = {
+        "app": args.app,
+        "runs": args.runs,
+        "boot_seconds": summary(boot),
+        "framework_floor_seconds": summary(floor),
+        "app_import_seconds": summary(phases["import"]),
+        "lifespan_startup_seconds": summary(phases["lifespan"]),
+        "budget_seconds": args.budget,
+    }
+    print(json.dumps(report, indent=2))
+    if report["boot_seconds"]["median"] > args.budget:
+        print(f"median boot {report['boot_seconds']['median']}s is over the {args.budget}s budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
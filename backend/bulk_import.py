@@ -0,0 +1,250 @@
+import csv
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import models
+import schemas
+from analytics import record_bulk_insert
+from events import queue_event
+from floor import derived_columns
+from versioning import next_version_async
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+CSV_TYPES = ("text/csv", "application/csv")
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+
+NOT_UTF8 = "row is not valid UTF-8"
+
+machines_table = models.Machine.__table__
+
+
+class NotUTF8Error(ValueError):
+    """The CSV header could not be decoded, so no row of the file can be read."""
+
+
+def _decode(line: bytes) -> Optional[str]:
+    try:
+        return line.decode("utf-8-sig", errors="strict").rstrip("\r")
+    except UnicodeDecodeError:
+        return None
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Optional[str]]:
+    """Yield each line of the body, or None for a line that is not valid UTF-8."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode(line)
+    if buffer:
+        yield _decode(buffer)
+
+
+class _LineFeed:
+    """The input of the one csv.reader of an upload, handed lines as they arrive."""
+
+    def __init__(self):
+        self.line: Optional[str] = None
+        self.ran_dry = False
+
+    def push(self, line: str):
+        self.line = line + "\n"
+        self.ran_dry = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.line is None:
+            # The reader wants the next line before it has arrived: a quoted field runs on
+            self.ran_dry = True
+            raise StopIteration
+        line, self.line = self.line, None
+        return line
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (row number, dict or error message) for each CSV record after the header.
+
+    One csv.reader parses the whole upload, a line at a time, so quoting follows
+    the csv module's rules. When a quoted field runs on past a line, the reader
+    returns the fields so far; the next line is read as the rest of that field.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    # Fields of a record whose last, quoted field is still open
+    partial: Optional[List[str]] = None
+    row_number = 0
+    async for line in _iter_lines(chunks):
+        if line is None:
+            if header is None:
+                raise NotUTF8Error("file is not UTF-8")
+            # The record this line belongs to cannot be parsed; report it and move on
+            partial = None
+            row_number += 1
+            yield row_number, NOT_UTF8
+            continue
+        # Reopening the quote puts the reader back inside the open field
+        feed.push(line if partial is None else '"' + line)
+        fields = next(reader, [])
+        if partial is not None:
+            fields = partial[:-1] + [partial[-1] + fields[0]] + fields[1:]
+        if feed.ran_dry:
+            partial = fields
+            continue
+        partial = None
+        if len(fields) <= 1 and not "".join(fields).strip():
+            continue
+        if header is None:
+            header = [name.strip() for name in fields]
+            continue
+        row_number += 1
+        if len(fields) != len(header):
+            yield row_number, f"expected {len(header)} fields, got {len(fields)}"
+            continue
+        # Empty CSV cells mean "not provided" so model defaults apply
+        yield row_number, {key: value for key, value in zip(header, fields) if value != ""}
+    if partial is not None:
+        yield row_number + 1, "unterminated quoted field"
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    row_number = 0
+    async for line in _iter_lines(chunks):
+        if line is not None and not line.strip():
+            continue
+        row_number += 1
+        if line is None:
+            yield row_number, NOT_UTF8
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, f"invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, "expected a JSON object"
+            continue
+        yield row_number, row
+
+
+class MachineImporter:
+    """Validates rows incrementally and inserts them in batches, one transaction per batch."""
+
+    def __init__(self, db: AsyncSession, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self._batch: List[Tuple[int, Dict]] = []
+        self._seen_numbers = set()
+        self._seen_serials = set()
+
+    def error(self, row_number: int, message: str, machine_number=None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "machine_number": machine_number, "error": message})
+
+    async def add(self, row_number: int, row: object):
+        if isinstance(row, str):
+            self.error(row_number, row)
+            return
+        try:
+            machine = schemas.MachineCreate.model_validate(row)
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            self.error(row_number, message, row.get("machine_number"))
+            return
+        if machine.machine_number in self._seen_numbers:
+            self.error(row_number, "duplicate machine_number in file", machine.machine_number)
+            return
+        if machine.serial_number in self._seen_serials:
+            self.error(row_number, "duplicate serial_number in file", machine.machine_number)
+            return
+        self._seen_numbers.add(machine.machine_number)
+        self._seen_serials.add(machine.serial_number)
+        values = machine.model_dump()
+        values["is_out_of_service"] = False
+        values.update(derived_columns(values))
+        self._batch.append((row_number, values))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        batch = await self._drop_existing(batch)
+        if not batch:
+            return
+        version, now = await next_version_async(self.db)
+        for _, values in batch:
+            values["row_version"] = version
+            values["updated_at"] = now
+        try:
+            # One cached INSERT executed over the whole batch (executemany) beats a per-batch
+            # multi-VALUES statement, which SQLAlchemy would have to recompile every time
+            rows = [values for _, values in batch]
+            await self.db.execute(machines_table.insert(), rows)
+            await self.db.run_sync(lambda session: record_bulk_insert(session.connection(), rows))
+            queue_event(self.db, {"type": "machines.bulk_created", "row_version": version, "count": len(batch)})
+            await self.db.commit()
+            self.inserted += len(batch)
+        except IntegrityError:
+            # Lost a race with another writer; retry row by row to find the offenders
+            await self.db.rollback()
+            await self._insert_individually(batch)
+
+    async def _drop_existing(self, batch: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        Machine = models.Machine
+        numbers = [values["machine_number"] for _, values in batch]
+        serials = [values["serial_number"] for _, values in batch]
+        result = await self.db.execute(
+            select(Machine.machine_number, Machine.serial_number).where(
+                Machine.machine_number.in_(numbers) | Machine.serial_number.in_(serials)
+            )
+        )
+        existing_numbers, existing_serials = set(), set()
+        for number, serial in result:
+            existing_numbers.add(number)
+            existing_serials.add(serial)
+
+        remaining = []
+        for row_number, values in batch:
+            if values["machine_number"] in existing_numbers:
+                self.error(row_number, "machine_number already exists", values["machine_number"])
+            elif values["serial_number"] in existing_serials:
+                self.error(row_number, "serial_number already exists", values["machine_number"])
+            else:
+                remaining.append((row_number, values))
+        return remaining
+
+    async def _insert_individually(self, batch: List[Tuple[int, Dict]]):
+        for row_number, values in batch:
+            try:
+                values["row_version"], values["updated_at"] = await next_version_async(self.db)
+                await self.db.execute(machines_table.insert(), [values])
+                await self.db.run_sync(lambda session: record_bulk_insert(session.connection(), [values]))
+                queue_event(self.db, {"type": "machines.bulk_created", "row_version": values["row_version"], "count": 1})
+                await self.db.commit()
+                self.inserted += 1
+            except IntegrityError as e:
+                await self.db.rollback()
+                self.error(row_number, f"integrity error: {e.orig}", values["machine_number"])
+
+    def result(self) -> schemas.BulkImportResult:
+        return schemas.BulkImportResult(
+            inserted=self.inserted,
+            failed=self.failed,
+            errors=sorted(self.errors, key=lambda error: error["row"]),
+            errors_truncated=self.failed > len(self.errors),
+        )
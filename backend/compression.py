@@ -0,0 +1,181 @@
+import os
+import zlib
+from typing import List, Optional, Tuple
+
+import anyio
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Both defaults sit where extra levels stop buying size but keep costing CPU on
+# machine listings: brotli 11 is ~50x slower than 4 for a few percent
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# Bodies larger than this are compressed on a worker thread instead of the event loop
+OFFLOAD_BYTES = 256 * 1024
+
+# Binary formats and streams that must reach the client as they are written
+SKIPPED_TYPES = ("text/event-stream", "image/", "application/zip", "application/gzip")
+
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """The best of br and gzip the client accepts, or None."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    for name in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if weights.get(name, weights.get("*", 0)) > 0:
+            return name
+    return None
+
+
+class Encoder:
+    """Incremental compressor; every chunk is flushed so streamed bodies reach the client progressively."""
+
+    def __init__(self, name: str):
+        self.name = name
+        if name == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.name == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.name == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+    def whole(self, data: bytes) -> bytes:
+        if self.name == "br":
+            return brotli.compress(data, quality=BROTLI_QUALITY)
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def encoded_etag(etag: bytes, encoding: str) -> bytes:
+    """Tag the representation's encoding onto an ETag: '"abc"' -> '"abc-gzip"'."""
+    if not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + b"-" + encoding.encode() + b'"'
+
+
+def decoded_etag(etag: str) -> str:
+    """Undo encoded_etag so a conditional request matches whichever encoding the client stored."""
+    for encoding in ("gzip", "br"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers: List[Tuple[bytes, bytes]], name: bytes) -> List[Tuple[bytes, bytes]]:
+    return [(key, value) for key, value in headers if key.lower() != name]
+
+
+def _vary(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    vary = _header(headers, b"vary")
+    value = vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+    return _without(headers, b"vary") + [(b"vary", value)]
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip/brotli compression for responses of at least COMPRESSION_MIN_BYTES.
+
+    Complete bodies below the threshold pass through untouched; streamed bodies
+    (exports) are compressed chunk by chunk since their size is not known up front.
+    """
+
+    def __init__(self, app, min_bytes: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.min_bytes = min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding((_header(scope["headers"], b"accept-encoding") or b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder: Optional[Encoder] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                content_type = (_header(headers, b"content-type") or b"").decode("latin-1")
+                passthrough = (
+                    message["status"] in (204, 304)
+                    or _header(headers, b"content-encoding") is not None
+                    or content_type.startswith(SKIPPED_TYPES)
+                )
+                if passthrough:
+                    etag = _header(headers, b"etag")
+                    if message["status"] == 304 and etag is not None:
+                        # Echo the tag of the encoded representation the client revalidated
+                        tagged = encoded_etag(etag, encoding)
+                        if tagged in (_header(scope["headers"], b"if-none-match") or b""):
+                            message = {**message, "headers": _without(headers, b"etag") + [(b"etag", tagged)]}
+                    await send(message)
+                else:
+                    start = {**message, "headers": headers}
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if encoder is None:
+                headers = start["headers"]
+                if not more and len(body) < self.min_bytes:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = Encoder(encoding)
+                headers = _vary(_without(headers, b"content-length")) + [(b"content-encoding", encoding.encode())]
+                # A strong ETag promises byte-identical bodies, so each encoding gets its own
+                etag = _header(headers, b"etag")
+                if etag is not None:
+                    headers = _without(headers, b"etag") + [(b"etag", encoded_etag(etag, encoding))]
+                if not more:
+                    if len(body) > OFFLOAD_BYTES:
+                        compressed = await anyio.to_thread.run_sync(encoder.whole, body)
+                    else:
+                        compressed = encoder.whole(body)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send({**start, "headers": headers})
+            data = encoder.chunk(body) if body else b""
+            if not more:
+                data += encoder.finish()
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,89 @@
+import itertools
+import os
+import tempfile
+
+# Settings are read at import time, so point everything at a scratch directory first
+_scratch = tempfile.mkdtemp(prefix="casino-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch}/casino.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["ARCHIVE_DIR"] = os.path.join(_scratch, "archive")
+os.environ["EVENT_BROKER"] = "local"
+os.environ["EVENT_BROKER_PATH"] = os.path.join(_scratch, "casino_events.db")
+os.environ["SCHEDULER_ENABLED"] = "false"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+import pytest
+from fastapi.testclient import TestClient
+
+import init_db
+
+init_db.init_db()
+
+import main
+
+_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def tokens(client):
+    response = client.post("/token", data={"username": "admin", "password": "admin123"})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture(scope="session")
+def auth_headers(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+@pytest.fixture
+def vendor():
+    """A vendor no other test uses, so listings can be filtered down to one test's machines."""
+    return f"Vendor T{next(_numbers)}"
+
+
+@pytest.fixture
+def zone():
+    """A floor zone no other test uses, for machines placed with a parsed location."""
+    return f"Floor T{next(_numbers)}"
+
+
+@pytest.fixture
+def make_machine(client, auth_headers, vendor):
+    def make(**values):
+        number = next(_numbers)
+        body = {
+            "machine_number": f"T-{number}",
+            "serial_number": f"SN-{number}",
+            "vendor": vendor,
+            **values,
+        }
+        response = client.post("/machines/", json=body, headers=auth_headers)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def make_user(client):
+    """Register a user; returns (username, password, access token)."""
+    def make():
+        username, password = f"user{next(_numbers)}", "Secret123"
+        response = client.post("/users/", json={"username": username, "email": f"{username}@example.com", "password": password})
+        assert response.status_code == 200, response.text
+        return username, password, response.json()["access_token"]
+    return make
+
+
+@pytest.fixture(scope="session")
+def technician(client, auth_headers):
+    body = {"name": "Test Tech", "employee_id": "T-0", "contact_number": "555-0100"}
+    response = client.post("/technicians/", json=body, headers=auth_headers)
+    assert response.status_code == 201, response.text
+    return response.json()
@@ -1,14 +1,142 @@
-from sqlalchemy import create_engine
+import os
+from dataclasses import dataclass
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from dotenv import load_dotenv
+from metrics import METRICS_ENABLED, instrument_engine
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./casino.db"
+load_dotenv()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Async drivers used when DATABASE_URL names a plain backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    url: str
+    async_url: str
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    pool_recycle: int
+    pool_pre_ping: bool
+    echo: bool
+    # SQLite storage profile, applied to every new connection
+    sqlite_journal_mode: str
+    sqlite_synchronous: str
+    sqlite_cache_size_kib: int
+    sqlite_mmap_size: int
+    sqlite_temp_store: str
+    sqlite_busy_timeout_ms: int
+
+    @classmethod
+    def from_env(cls) -> "DatabaseSettings":
+        url = os.getenv("DATABASE_URL", "sqlite:///./casino.db")
+        return cls(
+            url=url,
+            async_url=os.getenv("ASYNC_DATABASE_URL", to_async_url(url)),
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", True),
+            echo=_env_bool("DB_ECHO", False),
+            sqlite_journal_mode=os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            sqlite_cache_size_kib=int(os.getenv("SQLITE_CACHE_SIZE_KIB", "65536")),
+            sqlite_mmap_size=int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+            sqlite_temp_store=os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+            sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        )
+
+    def is_sqlite(self, url: str) -> bool:
+        return make_url(url).get_backend_name() == "sqlite"
+
+    def is_memory_sqlite(self, url: str) -> bool:
+        database = make_url(url).database
+        return self.is_sqlite(url) and (not database or database == ":memory:")
+
+    def sqlite_pragmas(self) -> list:
+        return [
+            f"PRAGMA journal_mode={self.sqlite_journal_mode}",
+            f"PRAGMA synchronous={self.sqlite_synchronous}",
+            # Negative cache_size is in KiB rather than pages
+            f"PRAGMA cache_size=-{self.sqlite_cache_size_kib}",
+            f"PRAGMA mmap_size={self.sqlite_mmap_size}",
+            f"PRAGMA temp_store={self.sqlite_temp_store}",
+            f"PRAGMA busy_timeout={self.sqlite_busy_timeout_ms}",
+        ]
+
+    def engine_kwargs(self, url: str) -> dict:
+        kwargs = {"echo": self.echo, "pool_pre_ping": self.pool_pre_ping}
+        if self.is_memory_sqlite(url):
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+            kwargs["connect_args"] = {"check_same_thread": False}
+            return kwargs
+        kwargs.update(
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+        )
+        if self.is_sqlite(url):
+            kwargs["connect_args"] = {"check_same_thread": False}
+            if make_url(url).get_driver_name() == "aiosqlite":
+                # aiosqlite defaults to NullPool, which would redo the PRAGMAs on every checkout
+                kwargs["poolclass"] = AsyncAdaptedQueuePool
+        return kwargs
+
+    def apply_storage_profile(self, sync_engine):
+        if not self.is_sqlite(str(sync_engine.url)):
+            return
+        pragmas = self.sqlite_pragmas()
+
+        @event.listens_for(sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+            finally:
+                cursor.close()
+
+settings = DatabaseSettings.from_env()
+
+SQLALCHEMY_DATABASE_URL = settings.url
+SQLALCHEMY_ASYNC_DATABASE_URL = settings.async_url
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **settings.engine_kwargs(SQLALCHEMY_DATABASE_URL))
+settings.apply_storage_profile(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the async endpoints; same database, non-blocking driver
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL, **settings.engine_kwargs(SQLALCHEMY_ASYNC_DATABASE_URL)
+)
+settings.apply_storage_profile(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if METRICS_ENABLED:
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +144,8 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
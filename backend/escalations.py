@@ -0,0 +1,95 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import case, event, inspect, select, update
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal
+import events
+import models
+from versioning import MACHINES, next_version_async
+
+# A machine DOWN longer than this since date_down is escalated (0 = off)
+DOWN_SLA_MINUTES = float(os.getenv("DOWN_SLA_MINUTES", "240"))
+# An IN_PROGRESS machine nobody has written to for this long is flagged stale (0 = off)
+STALE_IN_PROGRESS_HOURS = float(os.getenv("STALE_IN_PROGRESS_HOURS", "8"))
+ESCALATION_INTERVAL_SECONDS = float(os.getenv("ESCALATION_INTERVAL_SECONDS", "60"))
+
+DOWN_SLA = "down_sla"
+STALE_IN_PROGRESS = "stale_in_progress"
+
+logger = logging.getLogger("casino.escalations")
+
+machines_table = models.Machine.__table__
+
+
+async def _escalate(kind: str, *clauses) -> List[str]:
+    """Mark every unescalated machine matching ``clauses`` with ``kind``; returns their numbers.
+
+    An idle tick is one indexed existence check. Otherwise the change counter is
+    bumped first, as floor.rebuild does, so the row_version written is the one
+    this transaction took and two workers can never stamp the same version.
+    """
+    pending = (machines_table.c.escalation.is_(None), *clauses)
+    async with AsyncSessionLocal() as db:
+        found = await db.execute(select(machines_table.c.id).where(*pending).limit(1))
+        if found.first() is None:
+            return []
+        version, now = await next_version_async(db)
+        result = await db.execute(
+            update(machines_table)
+            .where(*pending)
+            .values(escalation=kind, escalated_at=now, row_version=version, updated_at=now)
+            .returning(machines_table.c.machine_number)
+        )
+        machine_numbers = result.scalars().all()
+        if not machine_numbers:
+            # Another worker escalated them between the check and the update
+            await db.rollback()
+            return []
+        events.queue_event(db, {
+            "type": "machines.escalated",
+            "escalation": kind,
+            "row_version": version,
+            "machine_numbers": machine_numbers,
+        })
+        await db.commit()
+    logger.warning("escalated %d machine(s) as %s: %s", len(machine_numbers), kind, ", ".join(machine_numbers))
+    return machine_numbers
+
+
+async def escalate_overdue_down(sla_minutes: float = DOWN_SLA_MINUTES) -> List[str]:
+    Machine = models.Machine
+    # date_down defaults to datetime.now, so it is compared in local time
+    cutoff = datetime.now() - timedelta(minutes=sla_minutes)
+    return await _escalate(DOWN_SLA, Machine.status == models.MachineStatus.DOWN, Machine.date_down < cutoff)
+
+
+async def flag_stale_in_progress(stale_hours: float = STALE_IN_PROGRESS_HOURS) -> List[str]:
+    Machine = models.Machine
+    cutoff = datetime.utcnow() - timedelta(hours=stale_hours)
+    return await _escalate(
+        STALE_IN_PROGRESS, Machine.status == models.MachineStatus.IN_PROGRESS, Machine.updated_at < cutoff
+    )
+
+
+def reset_columns(values: dict) -> dict:
+    """Escalation columns for a Core UPDATE setting ``values``: cleared on rows whose status it changes."""
+    if "status" not in values:
+        return {}
+    Machine = models.Machine
+    changed = Machine.status != values["status"]
+    return {
+        "escalation": case((changed, None), else_=Machine.escalation),
+        "escalated_at": case((changed, None), else_=Machine.escalated_at),
+    }
+
+
+# An escalation is about the status it was raised for; any status change ends it
+@event.listens_for(Session, "before_flush")
+def _reset_escalations(session, flush_context, instances):
+    for machine in session.dirty:
+        if isinstance(machine, models.Machine) and inspect(machine).attrs.status.history.has_changes():
+            machine.escalation = None
+            machine.escalated_at = None
@@ -0,0 +1,332 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import models
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+EVENT_BROKER = os.getenv("EVENT_BROKER", "local")
+EVENT_BROKER_PATH = os.getenv("EVENT_BROKER_PATH", "./casino_events.db")
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "0.1"))
+EVENT_RETENTION_SECONDS = float(os.getenv("EVENT_RETENTION_SECONDS", "300"))
+SSE_HEARTBEAT_SECONDS = 15
+TAIL_MAX_BACKOFF_SECONDS = 5.0
+
+logger = logging.getLogger("casino.events")
+
+# Events of these types reach listeners (cache invalidation) but never stream clients
+INTERNAL_PREFIX = "internal."
+
+# Sent to a subscriber in place of further events once it has been dropped
+EVICTED = {"type": "evicted", "reason": "slow consumer"}
+
+
+class Subscriber:
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.evicted = False
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+
+class EventHub:
+    """In-process fan-out of change events to stream subscribers.
+
+    Every subscriber has a bounded queue. A subscriber that falls behind is
+    evicted instead of letting its backlog grow or slowing the publisher down.
+    """
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers: Set[Subscriber] = set()
+        self.broker: "Broker" = LocalBroker()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.evictions = 0
+        self._tasks = set()
+        self.listeners: List[Callable[[List[dict]], None]] = []
+
+    async def start(self, broker: "Broker"):
+        self.loop = asyncio.get_running_loop()
+        self.broker = broker
+        await broker.start(self)
+
+    async def stop(self):
+        await self.broker.stop()
+        for subscriber in list(self.subscribers):
+            self._evict(subscriber, {"type": "shutdown"})
+        self.loop = None
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def add_listener(self, listener: Callable[[List[dict]], None]):
+        """Call ``listener`` with every batch this worker receives, e.g. to drop a cache."""
+        self.listeners.append(listener)
+
+    def dispatch(self, events: List[dict]):
+        """Deliver events to this worker's subscribers. Must run on the hub's loop."""
+        for listener in self.listeners:
+            listener(events)
+        events = [item for item in events if not item.get("type", "").startswith(INTERNAL_PREFIX)]
+        if not events:
+            return
+        for subscriber in list(self.subscribers):
+            for item in events:
+                try:
+                    subscriber.queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    self.evictions += 1
+                    self._evict(subscriber, EVICTED)
+                    break
+
+    def _evict(self, subscriber: Subscriber, final_event: dict):
+        self.subscribers.discard(subscriber)
+        subscriber.evicted = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(final_event)
+
+    def publish(self, events: List[dict]):
+        """Publish from any thread; delivery happens on the hub's event loop."""
+        if not events or self.loop is None or self.loop.is_closed():
+            return
+        self.published += len(events)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            task = self.loop.create_task(self.broker.publish(events))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            asyncio.run_coroutine_threadsafe(self.broker.publish(events), self.loop)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "published": self.published,
+            "evictions": self.evictions,
+            "broker": type(self.broker).__name__,
+        }
+
+
+class Broker(ABC):
+    """Carries events between uvicorn workers; each worker's hub dispatches what it receives."""
+
+    async def start(self, hub: EventHub):
+        self.hub = hub
+
+    @abstractmethod
+    async def publish(self, events: List[dict]):
+        """Deliver ``events`` to this worker's hub and to every other worker's."""
+
+    async def stop(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """Single worker: hand events straight to the local hub."""
+
+    async def publish(self, events: List[dict]):
+        self.hub.dispatch(events)
+
+
+class SQLiteBroker(Broker):
+    """Multi-worker stand-in: workers append events to a shared SQLite file and tail it.
+
+    Events are delivered locally right away and picked up by the other workers on
+    their next poll; rows older than the retention window are pruned.
+    """
+
+    def __init__(self, path: str = EVENT_BROKER_PATH, poll_seconds: float = EVENT_POLL_SECONDS,
+                 retention_seconds: float = EVENT_RETENTION_SECONDS):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self.origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, created REAL, payload TEXT)"
+        )
+        return conn
+
+    async def start(self, hub: EventHub):
+        await super().start(hub)
+        self._conn = await asyncio.to_thread(self._connect)
+        row = await asyncio.to_thread(lambda: self._conn.execute("SELECT MAX(id) FROM events").fetchone())
+        self._last_id = row[0] or 0
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def _append(self, events: List[dict]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO events (origin, created, payload) VALUES (?, ?, ?)",
+                [(self.origin, now, json.dumps(item)) for item in events],
+            )
+
+    def _read(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, origin, payload FROM events WHERE id > ? ORDER BY id", (self._last_id,)
+            ).fetchall()
+            self._conn.execute("DELETE FROM events WHERE created < ?", (time.time() - self.retention_seconds,))
+        return rows
+
+    async def publish(self, events: List[dict]):
+        self.hub.dispatch(events)
+        await asyncio.to_thread(self._append, events)
+
+    async def _tail(self):
+        delay = self.poll_seconds
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                rows = await asyncio.to_thread(self._read)
+            except Exception:
+                # e.g. "database is locked"; back off and keep tailing, since a dead tail
+                # would silently stop cross-worker delivery
+                logger.exception("event broker poll failed; retrying")
+                delay = min(delay * 2, TAIL_MAX_BACKOFF_SECONDS)
+                continue
+            delay = self.poll_seconds
+            if not rows:
+                continue
+            self._last_id = rows[-1][0]
+            remote = [json.loads(payload) for _, origin, payload in rows if origin != self.origin]
+            if remote:
+                try:
+                    self.hub.dispatch(remote)
+                except Exception:
+                    logger.exception("dispatching broker events failed")
+
+
+async def sse_events(subscriber: Subscriber):
+    """Format a subscription as a text/event-stream body, with keep-alive comments."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(subscriber.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {item['type']}\ndata: {json.dumps(item)}\n\n"
+            if subscriber.evicted and subscriber.queue.empty():
+                return
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def websocket_events(websocket, subscriber: Subscriber):
+    """Pump a subscription into an accepted WebSocket until either side goes away."""
+    async def pump():
+        while True:
+            item = await subscriber.get()
+            await websocket.send_json(item)
+            if subscriber.evicted and subscriber.queue.empty():
+                # 1013: try again later
+                await websocket.close(code=1013)
+                return
+
+    async def drain():
+        # Clients only listen; reading lets us notice a disconnect while idle
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    tasks = {asyncio.create_task(pump()), asyncio.create_task(drain())}
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        # Send failures just mean the client left; retrieve them so they are not logged
+        for task in done:
+            task.exception()
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def create_broker(kind: str = EVENT_BROKER) -> Broker:
+    if kind == "sqlite":
+        return SQLiteBroker()
+    return LocalBroker()
+
+
+hub = EventHub()
+
+
+def machine_event(kind: str, machine) -> dict:
+    return {
+        "type": kind,
+        "machine_number": machine.machine_number,
+        "status": machine.status.value if machine.status is not None else None,
+        "row_version": machine.row_version,
+    }
+
+
+def queue_event(session, item: dict):
+    """Publish ``item`` when ``session`` commits; for writes that bypass the ORM flush."""
+    session.info.setdefault("machine_events", []).append(item)
+
+
+# Collect machine changes as they flush and publish them only once the
+# transaction commits, so subscribers never see rolled-back state.
+@event.listens_for(Session, "after_flush")
+def _collect_machine_events(session, flush_context):
+    pending = session.info.setdefault("machine_events", [])
+    for obj in session.new:
+        if isinstance(obj, models.Machine):
+            pending.append(machine_event("machine.created", obj))
+    for obj in session.dirty:
+        if isinstance(obj, models.Machine) and session.is_modified(obj):
+            pending.append(machine_event("machine.updated", obj))
+    for obj in session.deleted:
+        if isinstance(obj, models.Machine):
+            pending.append(machine_event("machine.deleted", obj))
+
+@event.listens_for(Session, "after_commit")
+def _publish_machine_events(session):
+    hub.publish(session.info.pop("machine_events", []))
+
+@event.listens_for(Session, "after_rollback")
+def _drop_machine_events(session):
+    session.info.pop("machine_events", None)
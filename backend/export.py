@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Callable, List, Optional
+
+from sqlalchemy import select
+from database import AsyncSessionLocal
+import models
+import serialization
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "columnar": serialization.COLUMNAR_JSON,
+}
+if serialization.msgpack is not None:
+    EXPORT_MEDIA_TYPES["msgpack"] = serialization.MSGPACK
+
+MACHINE_EXPORT_COLUMNS = [
+    models.Machine.id,
+    models.Machine.machine_number,
+    models.Machine.serial_number,
+    models.Machine.vendor,
+    models.Machine.status,
+    models.Machine.date_down,
+    models.Machine.location,
+    models.Machine.zone,
+    models.Machine.bank,
+    models.Machine.position,
+    models.Machine.floor_x,
+    models.Machine.floor_y,
+    models.Machine.machine_type,
+    models.Machine.is_out_of_service,
+    models.Machine.escalation,
+    models.Machine.escalated_at,
+    models.Machine.last_maintenance,
+    models.Machine.current_issue,
+    models.Machine.notes,
+]
+
+MAINTENANCE_EXPORT_COLUMNS = [
+    models.MaintenanceRecord.id,
+    models.MaintenanceRecord.machine_id,
+    models.MaintenanceRecord.technician_id,
+    models.MaintenanceRecord.reported_time,
+    models.MaintenanceRecord.resolved_time,
+    models.MaintenanceRecord.is_resolved,
+    models.MaintenanceRecord.issue_description,
+    models.MaintenanceRecord.repair_description,
+]
+
+
+_plain = serialization.plain_value
+
+
+def _encode_csv(rows, header=None) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(header)
+    writer.writerows([_plain(value) for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def _encode_ndjson(rows, names) -> bytes:
+    if serialization.FAST_SERIALIZATION:
+        return b"".join(serialization.dumps(dict(zip(names, row))) + b"\n" for row in rows)
+    lines = [json.dumps(dict(zip(names, map(_plain, row)))) for row in rows]
+    return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+def _encode_columnar(rows, first: bool) -> bytes:
+    # The rows of a {"fields": [...], "rows": [...]} document, written a batch at a time
+    body = serialization.dumps([list(row) for row in rows])[1:-1]
+    return body if first or not body else b"," + body
+
+
+def _encode_msgpack(packer, rows) -> bytes:
+    # A msgpack stream: the field names, then one array per row
+    return b"".join(packer.pack([_plain(value) for value in row]) for row in rows)
+
+
+async def stream_rows(columns: List, fmt: str,
+                      more: Optional[Callable[[List], AsyncIterator[list]]] = None) -> AsyncIterator[bytes]:
+    """Stream a table as CSV, NDJSON, columnar JSON or msgpack, one encoded chunk per fetched batch.
+
+    Rows come from a server-side cursor as plain tuples, so memory use does not
+    grow with the table. The session is owned by the generator because the
+    response body outlives the request's dependencies. ``more`` yields further
+    batches of the same columns after the table's own rows (archived records).
+    """
+    names = [column.key for column in columns]
+    stmt = (
+        select(*columns)
+        .order_by(columns[0])
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    packer = serialization.msgpack.Packer() if fmt == "msgpack" else None
+
+    def encode(partition, first: bool) -> bytes:
+        if fmt == "csv":
+            return _encode_csv(partition)
+        if fmt == "columnar":
+            return _encode_columnar(partition, first)
+        if fmt == "msgpack":
+            return _encode_msgpack(packer, partition)
+        return _encode_ndjson(partition, names)
+
+    if fmt == "csv":
+        yield _encode_csv([], names)
+    elif fmt == "columnar":
+        yield b'{"fields":' + serialization.dumps(names) + b',"rows":['
+    elif fmt == "msgpack":
+        yield packer.pack(names)
+    first = True
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for partition in result.partitions():
+            yield encode(partition, first)
+            first = False
+    if more is not None:
+        async for partition in more(columns):
+            yield encode(partition, first)
+            first = False
+    if fmt == "columnar":
+        yield b"]}"
@@ -0,0 +1,285 @@
+import heapq
+import math
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+from analytics import FloorSummary, status_counts
+from versioning import next_version
+
+# Side of a grid cell, in the unit of floor_x/floor_y (e.g. feet)
+FLOOR_GRID_CELL = float(os.getenv("FLOOR_GRID_CELL", "10"))
+
+LEVELS = ("zone", "bank", "position")
+KEYWORDS = {
+    "zone": "zone", "area": "zone", "section": "zone",
+    "bank": "bank", "row": "bank",
+    "position": "position", "pos": "position", "seat": "position", "stand": "position",
+}
+
+_keyword = "|".join(sorted(KEYWORDS, key=len, reverse=True))
+_SEPARATORS = re.compile(r"\s*(?:[,/|;>]|\s-\s)\s*")
+_KEYWORD_START = re.compile(rf"\s+(?=(?:{_keyword})\b)", re.IGNORECASE)
+_KEYWORD_PIECE = re.compile(rf"^({_keyword})\b\.?\s*[:#]?\s*(.*)$", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def parse_location(location: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Split a free-form location into (zone, bank, position).
+
+    Parts are separated by commas, slashes, "|", ";", ">" or " - ", and one part
+    may hold several keyword pieces ("Zone 3 Bank 12"). Keyword pieces (zone,
+    area, section / bank, row / position, pos, seat, stand) go to their level;
+    the others are read general to specific, so "High Limit, Bank C, 7" is
+    ("High Limit", "C", "7"). Unlabelled text ahead of a labelled level joins
+    the level above it rather than being overwritten.
+    """
+    pieces = []
+    for part in _SEPARATORS.split((location or "").strip()):
+        for piece in _KEYWORD_START.split(part):
+            match = _KEYWORD_PIECE.match(piece)
+            if match and match.group(2).strip():
+                pieces.append((LEVELS.index(KEYWORDS[match.group(1).lower()]), match.group(2).strip()))
+            elif piece.strip():
+                pieces.append((None, piece.strip()))
+
+    slots: List[Optional[str]] = [None, None, None]
+    level = 0
+    for index, (labelled, value) in enumerate(pieces):
+        if labelled is None:
+            claimed = {later for later, _ in pieces[index + 1:] if later is not None}
+            labelled = min(level, len(LEVELS) - 1)
+            while labelled > 0 and labelled in claimed:
+                labelled -= 1
+        slots[labelled] = value if slots[labelled] is None else f"{slots[labelled]} / {value}"
+        level = labelled + 1
+    return slots[0], slots[1], slots[2]
+
+
+def derived_columns(values: dict) -> dict:
+    """zone/bank/position for a write setting location, for Core INSERTs and UPDATEs that bypass the flush hook."""
+    return dict(zip(LEVELS, parse_location(values["location"]))) if "location" in values else {}
+
+
+@event.listens_for(Session, "before_flush")
+def _derive_floor_columns(session, flush_context, instances):
+    changed = [machine for machine in session.new if isinstance(machine, models.Machine)]
+    changed += [
+        machine for machine in session.dirty
+        if isinstance(machine, models.Machine) and inspect(machine).attrs.location.history.has_changes()
+    ]
+    for machine in changed:
+        machine.zone, machine.bank, machine.position = parse_location(machine.location)
+
+
+def rebuild(connection) -> int:
+    """Re-parse every machine's location; returns how many machines changed."""
+    Machine = models.Machine
+    rows = connection.execute(select(Machine.id, Machine.location, *[getattr(Machine, key) for key in LEVELS]))
+    changed = [
+        (row.id, values) for row, values in ((row, derived_columns(row._mapping)) for row in rows.all())
+        if any(row._mapping[key] != value for key, value in values.items())
+    ]
+    if changed:
+        # Synced clients pick the new values up from /machines/changes
+        version, now = next_version(connection)
+        for machine_id, values in changed:
+            connection.execute(
+                update(Machine.__table__).where(Machine.id == machine_id)
+                .values(**values, row_version=version, updated_at=now)
+            )
+    return len(changed)
+
+
+def _ring(cx: int, cy: int, radius: int) -> Iterator[Tuple[int, int]]:
+    """The cells exactly ``radius`` cells from (cx, cy) in either axis."""
+    if radius == 0:
+        yield cx, cy
+        return
+    for dx in range(-radius, radius + 1):
+        yield cx + dx, cy - radius
+        yield cx + dx, cy + radius
+    for dy in range(-radius + 1, radius):
+        yield cx - radius, cy + dy
+        yield cx + radius, cy + dy
+
+
+def _counts(counter: Counter) -> dict:
+    counts = status_counts()
+    for status, machines in counter.items():
+        counts[status.value] += machines
+        counts["total"] += machines
+    return counts
+
+
+class FloorMap:
+    """Where every machine is: status counts per zone and bank, and a grid of
+    square cells over the floor coordinates (one per status) for nearest lookups.
+    """
+
+    def __init__(self, cell: float = FLOOR_GRID_CELL):
+        self.cell = cell
+        self.machines: Dict[str, dict] = {}
+        self.counts: Dict[Optional[str], Dict[Optional[str], Counter]] = defaultdict(lambda: defaultdict(Counter))
+        self.cells: Dict[models.MachineStatus, Dict[Tuple[int, int], Dict[str, dict]]] = defaultdict(lambda: defaultdict(dict))
+        self._bounds: Dict[models.MachineStatus, tuple] = {}
+        self._zones: Optional[list] = None
+
+    def cell_of(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x / self.cell), math.floor(y / self.cell)
+
+    def _cell(self, machine: dict) -> Optional[Tuple[int, int]]:
+        if machine["status"] is None or machine["floor_x"] is None or machine["floor_y"] is None:
+            return None
+        return self.cell_of(machine["floor_x"], machine["floor_y"])
+
+    def remove(self, machine_number: str):
+        machine = self.machines.pop(machine_number, None)
+        if machine is None:
+            return
+        self._zones = None
+        status = machine["status"]
+        if status is not None:
+            banks = self.counts[machine["zone"]]
+            banks[machine["bank"]][status] -= 1
+            if not +banks[machine["bank"]]:
+                del banks[machine["bank"]]
+                if not banks:
+                    del self.counts[machine["zone"]]
+        key = self._cell(machine)
+        if key is not None:
+            occupants = self.cells[status][key]
+            del occupants[machine_number]
+            if not occupants:
+                del self.cells[status][key]
+            self._bounds.pop(status, None)
+
+    def place(self, machine: dict):
+        """Add a machine, or move it to its current zone, bank, status and cell."""
+        self.remove(machine["machine_number"])
+        self.machines[machine["machine_number"]] = machine
+        self._zones = None
+        if machine["status"] is not None:
+            self.counts[machine["zone"]][machine["bank"]][machine["status"]] += 1
+        key = self._cell(machine)
+        if key is not None:
+            self.cells[machine["status"]][key][machine["machine_number"]] = machine
+            self._bounds.pop(machine["status"], None)
+
+    def zones(self) -> list:
+        """Status counts per zone and per bank, as served by /floor/zones."""
+        if self._zones is None:
+            order = lambda name: (name is not None, name or "")
+            self._zones = [
+                {
+                    "zone": zone,
+                    "counts": _counts(sum(banks.values(), Counter())),
+                    "banks": [{"bank": bank, "counts": _counts(banks[bank])} for bank in sorted(banks, key=order)],
+                }
+                for zone, banks in sorted(self.counts.items(), key=lambda item: order(item[0]))
+            ]
+        return self._zones
+
+    def bounds(self, status: models.MachineStatus) -> tuple:
+        if status not in self._bounds:
+            keys = self.cells[status]
+            self._bounds[status] = (
+                min(x for x, _ in keys), max(x for x, _ in keys), min(y for _, y in keys), max(y for _, y in keys)
+            )
+        return self._bounds[status]
+
+    def nearest(self, x: float, y: float, status: models.MachineStatus, limit: int,
+                max_distance: Optional[float] = None) -> List[dict]:
+        """The ``limit`` machines in ``status`` closest to (x, y), nearest first.
+
+        Visits rings of cells outward from the point's cell and stops once enough
+        machines lie within the distance every unvisited cell is beyond.
+        """
+        cells = self.cells.get(status)
+        if not cells:
+            return []
+
+        def distance(machine: dict) -> float:
+            return math.hypot(machine["floor_x"] - x, machine["floor_y"] - y)
+
+        cx, cy = self.cell_of(x, y)
+        min_x, max_x, min_y, max_y = self.bounds(status)
+        reach = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+        if max_distance is not None:
+            reach = min(reach, math.ceil(max_distance / self.cell))
+
+        found = []
+        visited = 0
+        for radius in range(reach + 1):
+            ring = list(_ring(cx, cy, radius))
+            visited += len(ring)
+            if visited > len(cells):
+                # Sparse around the point: cheaper to measure every occupied cell
+                found = [machine for occupants in cells.values() for machine in occupants.values()]
+                break
+            found.extend(machine for key in ring for machine in cells.get(key, {}).values())
+            # Machines in cells not visited yet are at least radius cells away
+            if sum(1 for machine in found if distance(machine) <= radius * self.cell) >= limit:
+                break
+
+        if max_distance is not None:
+            found = [machine for machine in found if distance(machine) <= max_distance]
+        return [{**machine, "distance": distance(machine)} for machine in heapq.nsmallest(limit, found, key=distance)]
+
+
+FLOOR_COLUMNS = [
+    models.Machine.machine_number,
+    models.Machine.status,
+    models.Machine.zone,
+    models.Machine.bank,
+    models.Machine.position,
+    models.Machine.floor_x,
+    models.Machine.floor_y,
+    models.Machine.date_down,
+]
+
+
+class FloorMapView(FloorSummary):
+    """The floor map, checked for machine changes like the floor summary.
+
+    Only the first build reads every machine; afterwards the map is patched with
+    the rows and tombstones newer than the version it was built at, through the
+    same row_version indexes /machines/changes uses.
+    """
+
+    async def render(self, db: AsyncSession, version: int) -> FloorMap:
+        Machine = models.Machine
+        floor_map = self.body
+        if floor_map is None or version < self.version:
+            floor_map = FloorMap()
+            result = await db.execute(select(*FLOOR_COLUMNS))
+        else:
+            Tombstone = models.MachineTombstone
+            deleted = await db.execute(select(Tombstone.machine_number).where(Tombstone.row_version > self.version))
+            for machine_number in deleted.scalars():
+                floor_map.remove(machine_number)
+            result = await db.execute(select(*FLOOR_COLUMNS).where(Machine.row_version > self.version))
+        for row in result:
+            floor_map.place(row._asdict())
+        return floor_map
+
+
+# Zone counts and nearest lookups between machine changes cost no query
+floor_map = FloorMapView()
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python floor.py rebuild")
+        sys.exit(2)
+    with engine.begin() as connection:
+        print(f"Re-parsed the location of {rebuild(connection)} machines")
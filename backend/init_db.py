@@ -1,15 +1,69 @@
-from sqlalchemy.orm import Session
+import os
+import sys
+from sqlalchemy import inspect
 from database import SessionLocal, engine
 import models
+import analytics
+import search  # creates the full-text index with the tables
+import startup
 from auth import get_password_hash
 
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    return config
+
+def schema_differences(connection) -> list:
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    context = MigrationContext.configure(
+        connection,
+        opts={"include_name": lambda name, type_, parent_names: not (type_ == "table" and search.is_search_table(name))},
+    )
+    return compare_metadata(context, models.Base.metadata)
+
+def create_schema():
+    """Bring the database to the current schema without ever dropping data; safe to rerun."""
+    tables = [name for name in inspect(engine).get_table_names() if not search.is_search_table(name)]
+    if "alembic_version" in tables:
+        from alembic import command
+
+        command.upgrade(alembic_config(), "head")
+        print("Schema upgraded to the latest revision")
+        return
+    if not tables:
+        with engine.begin() as connection:
+            models.Base.metadata.create_all(bind=connection)
+            startup.stamp_head(connection)
+        print("Created tables")
+        return
+
+    # Tables left by the old import-time create_all carry no revision; adopt them only if they match the models
+    with engine.begin() as connection:
+        models.Base.metadata.create_all(bind=connection)
+        differences = schema_differences(connection)
+        if differences:
+            for difference in differences:
+                print(f"  {difference}")
+            sys.exit(
+                "Existing tables do not match the models; run `alembic stamp <revision>` "
+                "for the revision they were created at, then `alembic upgrade head`"
+            )
+        search.maintain(connection, "rebuild")
+        analytics.rebuild(connection)
+        startup.stamp_head(connection)
+    print("Adopted existing tables at the latest revision")
+
 def init_db():
     print("Creating initial data...")
-    
-    # Create tables
-    models.Base.metadata.drop_all(bind=engine)
-    models.Base.metadata.create_all(bind=engine)
-    
+
+    create_schema()
+
     db = SessionLocal()
     try:
         # Check if admin user exists
@@ -34,4 +88,4 @@ def init_db():
 if __name__ == "__main__":
     print("Creating initial data...")
     init_db()
-    print("Initial data created") 
\ No newline at end of file
+    print("Initial data created")
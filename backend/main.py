@@ -1,24 +1,94 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import text
-from datetime import timedelta
-from database import get_db, engine
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, update
+from datetime import date, datetime, timedelta
+from database import AsyncSessionLocal, get_async_db, async_engine, engine
 import models, schemas
+import events
+import analytics
+import floor
+import escalations
+import archive
+import search
+import serialization
+import compression
+import metrics
+import startup
+import writes
+import refresh_tokens
+import scheduler
+from pagination import MachineListParams, keyset_page, machine_filter_clauses, machine_page_query, next_page
+from maintenance import MaintenanceListParams, record_cursor, record_page, record_query
+from bulk_import import CSV_TYPES, NDJSON_TYPES, MachineImporter, NotUTF8Error, iter_csv_rows, iter_ndjson_rows
+from export import EXPORT_MEDIA_TYPES, MACHINE_EXPORT_COLUMNS, MAINTENANCE_EXPORT_COLUMNS, stream_rows
+from versioning import (
+    cache_headers,
+    current_version,
+    etag_matches,
+    list_etag,
+    machine_changes,
+    machine_etag,
+    next_version_async
+)
 from auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     create_access_token,
-    get_password_hash,
-    verify_password,
-    get_current_active_user
+    get_password_hash_async,
+    verify_password_async,
+    get_current_active_user,
+    get_current_admin_user,
+    get_stream_user,
+    principal_cache,
+    resolve_principal
 )
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import List, Optional, Tuple
+
+# The schema is owned by alembic (or init_db.py); workers only check its revision
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await startup.verify_schema(async_engine)
+    await startup.warm_async_pool(async_engine)
+    await events.hub.start(events.create_broker())
+    if writes.WRITE_PIPELINE:
+        await writes.pipeline.start()
+    if scheduler.SCHEDULER_ENABLED:
+        await scheduler.jobs.start()
+    try:
+        yield
+    finally:
+        await scheduler.jobs.stop()
+        # Drain queued writes before the engines go away
+        await writes.pipeline.stop()
+        await events.hub.stop()
+        await archive.dispose()
+        # Pooled aiosqlite connections each own a worker thread; close them so the process can exit
+        await async_engine.dispose()
 
-# Create all tables
-models.Base.metadata.create_all(bind=engine)
+app = FastAPI(title="Casino Database API", lifespan=lifespan)
+events.hub.add_listener(analytics.floor_summary.invalidate)
+events.hub.add_listener(floor.floor_map.invalidate)
 
-app = FastAPI(title="Casino Database API")
+# Housekeeping and escalation rules; each works on shared tables, so only the scheduler leader runs them
+if archive.ARCHIVE_CRON or archive.ARCHIVE_INTERVAL_HOURS > 0:
+    scheduler.jobs.add("archive", archive.run, engine, scheduler.jobs.still_leading,
+                       every=None if archive.ARCHIVE_CRON else archive.ARCHIVE_INTERVAL_HOURS * 3600,
+                       cron=archive.ARCHIVE_CRON or None)
+if analytics.SUMMARY_RECONCILE_SECONDS > 0:
+    scheduler.jobs.add("reconcile_status_counts", analytics.reconcile, engine,
+                       every=analytics.SUMMARY_RECONCILE_SECONDS)
+if refresh_tokens.REFRESH_PRUNE_INTERVAL_MINUTES > 0:
+    scheduler.jobs.add("prune_refresh_tokens", refresh_tokens.prune, engine, scheduler.jobs.still_leading,
+                       every=refresh_tokens.REFRESH_PRUNE_INTERVAL_MINUTES * 60)
+if escalations.DOWN_SLA_MINUTES > 0:
+    scheduler.jobs.add("escalate_overdue_down", escalations.escalate_overdue_down,
+                       every=escalations.ESCALATION_INTERVAL_SECONDS)
+if escalations.STALE_IN_PROGRESS_HOURS > 0:
+    scheduler.jobs.add("flag_stale_in_progress", escalations.flag_stale_in_progress,
+                       every=escalations.ESCALATION_INTERVAL_SECONDS)
 
 # Configure CORS
 app.add_middleware(
@@ -27,39 +97,73 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
 
-@app.post("/token")
+@app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Find the user
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    result = await db.execute(select(models.User).where(models.User.username == form_data.username))
+    user = result.scalar_one_or_none()
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Create access token
+
+    # Transparently upgrade hashes made with outdated cost settings
+    if new_hash:
+        user.hashed_password = new_hash
+
+    # Devices keep the refresh token and come back to /token/refresh, not here, every half hour
+    refresh_token = await refresh_tokens.issue(db, user.id)
+    await db.commit()
+    return _token_response(user.username, refresh_token)
+
+def _token_response(username: str, refresh_token: str) -> dict:
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": username}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": int(access_token_expires.total_seconds()),
+    }
+
+@app.post("/token/refresh", response_model=schemas.Token)
+async def refresh_access_token(request: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    # No password hashing: one indexed lookup by HMAC, then the token is rotated
+    principal, refresh_token = await refresh_tokens.rotate(db, request.refresh_token)
+    return _token_response(principal.username, refresh_token)
+
+@app.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_refresh_token(request: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    # Logout; unknown tokens are accepted too, so the answer reveals nothing
+    await refresh_tokens.revoke(db, request.refresh_token)
 
 @app.post("/users/", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if username already exists
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if db_user:
+    result = await db.execute(select(models.User).where(models.User.username == user.username))
+    if result.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Username already registered")
     
     # Check if email already exists
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    if result.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Validate password
@@ -69,16 +173,19 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        username=user.username,
-        email=user.email,
-        hashed_password=hashed_password,
-        is_active=True
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    hashed_password = await get_password_hash_async(user.password)
+
+    async def insert_user(session: AsyncSession):
+        db_user = models.User(
+            username=user.username,
+            email=user.email,
+            hashed_password=hashed_password,
+            is_active=True
+        )
+        session.add(db_user)
+        return db_user
+
+    db_user = await writes.commit(db, insert_user, schemas.User)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -98,68 +205,519 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     }
 
 @app.get("/users/me/", response_model=schemas.User)
-async def read_users_me(current_user: models.User = Depends(get_current_active_user)):
+async def read_users_me(current_user: schemas.User = Depends(get_current_active_user)):
     return current_user
 
+@app.patch("/users/{username}", response_model=schemas.User)
+async def update_user(
+    username: str,
+    updates: schemas.UserUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_admin_user)
+):
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    db_user = result.scalar_one_or_none()
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    for key, value in updates.dict(exclude_unset=True).items():
+        setattr(db_user, key, value)
+
+    # Committing evicts this user's cached principals (see auth.principal_cache)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+@app.delete("/users/{username}/sessions")
+async def revoke_user_sessions(
+    username: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_admin_user)
+):
+    # Access tokens already issued stay valid until they expire
+    result = await db.execute(select(models.User.id).where(models.User.username == username))
+    user_id = result.scalar_one_or_none()
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"revoked": await refresh_tokens.revoke_user(db, user_id)}
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Casino Database API"}
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     try:
         # Try to use the database connection
-        db.execute(text("SELECT 1"))
-        return {"status": "healthy", "database": "connected"}
+        await db.execute(text("SELECT 1"))
+        return {
+            "status": "healthy",
+            "database": "connected",
+            "auth_cache": principal_cache.stats(),
+            "event_hub": events.hub.stats(),
+            "write_pipeline": writes.pipeline.stats(),
+            "floor_summary": analytics.floor_summary.stats(),
+            "floor_map": floor.floor_map.stats(),
+            "scheduler": scheduler.jobs.stats(),
+        }
     except Exception as e:
         return {"status": "unhealthy", "database": str(e)}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # New Machine Endpoints
 @app.get("/machines/", response_model=List[schemas.Machine])
-def get_machines(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+async def get_machines(
+    request: Request,
+    response: Response,
+    params: MachineListParams = Depends(),
+    fields: Optional[Tuple[str, ...]] = Depends(serialization.machine_fields),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
-    machines = db.query(models.Machine).all()
-    return machines
+    media_type = serialization.negotiate(request)
+    # Answer unchanged polls from the table version alone, without running the list query
+    version, last_modified = await current_version(db)
+    headers = cache_headers(list_etag(version, request, serialization.representation(fields, media_type)), last_modified)
+    headers["Vary"] = "Accept"
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    if fields is not None or media_type != serialization.JSON:
+        # Only the requested columns (and the cursor keys) are read and encoded
+        names = fields or serialization.MACHINE_FIELDS
+        columns = serialization.fieldset_columns(names, ("id", "machine_number", "date_down"))
+        result = await db.execute(machine_page_query(params).with_only_columns(*columns))
+        rows = next_page(result.all(), params, response)
+        if media_type == serialization.JSON:
+            content = serialization.dump_fieldset(rows, fields)
+        else:
+            content = serialization.encode_columnar(names, ([row._mapping[name] for name in names] for row in rows), media_type)
+        return serialization.json_response(content, response, media_type)
+    if serialization.FAST_SERIALIZATION:
+        result = await db.execute(machine_page_query(params).with_only_columns(*serialization.MACHINE_COLUMNS))
+        rows = next_page(result.all(), params, response)
+        return serialization.json_response(serialization.dump_rows(rows), response)
+
+    result = await db.execute(machine_page_query(params).options(serialization.MACHINE_LOAD_ONLY))
+    machines = result.scalars().all()
+    return next_page(machines, params, response)
 
 @app.post("/machines/", response_model=schemas.Machine)
-def create_machine(
+async def create_machine(
     machine: schemas.MachineCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    async def insert_machine(session: AsyncSession):
+        db_machine = models.Machine(**machine.dict())
+        session.add(db_machine)
+        return db_machine
+
+    return await writes.commit(db, insert_machine, schemas.Machine)
+
+@app.post(
+    "/machines/bulk",
+    response_model=schemas.BulkImportResult,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "text/csv": {"schema": {"type": "string"}},
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def bulk_import_machines(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    # The body is parsed as it arrives so memory stays flat regardless of file size
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in CSV_TYPES:
+        rows = iter_csv_rows(request.stream())
+    elif content_type in NDJSON_TYPES:
+        rows = iter_ndjson_rows(request.stream())
+    else:
+        raise HTTPException(status_code=415, detail="Send text/csv or application/x-ndjson")
+
+    importer = MachineImporter(db)
+    try:
+        async for row_number, row in rows:
+            await importer.add(row_number, row)
+    except NotUTF8Error as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await importer.flush()
+    return importer.result()
+
+@app.get("/machines/stream")
+async def stream_machine_events(current_user: schemas.User = Depends(get_stream_user)):
+    # Server-Sent Events; each event carries the new row_version so a client that
+    # reconnects can catch up through /machines/changes
+    return StreamingResponse(
+        events.sse_events(events.hub.subscribe()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.websocket("/machines/stream")
+async def machine_events_socket(websocket: WebSocket, token: Optional[str] = None):
+    async with AsyncSessionLocal() as db:
+        principal = await resolve_principal(token or "", db)
+    if principal is None or not principal.is_active:
+        # 1008: policy violation
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    await events.websocket_events(websocket, events.hub.subscribe())
+
+@app.get("/machines/changes", response_model=schemas.MachineChanges)
+async def get_machine_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    # Poll with since=<version from the previous response> to receive only the delta
+    return await machine_changes(db, since, limit)
+
+@app.get("/machines/summary", response_model=schemas.FloorSummary)
+async def get_machine_summary(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    # Counters are kept by every machine write; the rendered body is shared until they change
+    return Response(content=await analytics.floor_summary.get(db), media_type="application/json")
+
+@app.get("/floor/zones", response_model=List[schemas.ZoneCounts])
+async def get_floor_zones(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    # Counts only; the machines themselves come from GET /machines/?zone=...&bank=...
+    return (await floor.floor_map.get(db)).zones()
+
+@app.get("/floor/zones/{zone}", response_model=schemas.ZoneCounts)
+async def get_floor_zone(
+    zone: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
-    db_machine = models.Machine(**machine.dict())
-    db.add(db_machine)
-    db.commit()
-    db.refresh(db_machine)
-    return db_machine
+    for entry in (await floor.floor_map.get(db)).zones():
+        if entry["zone"] == zone:
+            return entry
+    raise HTTPException(status_code=404, detail="Zone not found")
+
+@app.get("/floor/nearest", response_model=List[schemas.NearbyMachine])
+async def get_nearest_machines(
+    x: float,
+    y: float,
+    machine_status: models.MachineStatus = Query(models.MachineStatus.DOWN, alias="status"),
+    limit: int = Query(5, ge=1, le=100),
+    max_distance: Optional[float] = Query(None, gt=0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    # e.g. the down machines closest to a technician's position
+    return (await floor.floor_map.get(db)).nearest(x, y, machine_status, limit, max_distance)
 
 @app.get("/machines/{machine_number}", response_model=schemas.Machine)
-def get_machine(
+async def get_machine(
     machine_number: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    fields: Optional[Tuple[str, ...]] = Depends(serialization.machine_fields),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
-    machine = db.query(models.Machine).filter(models.Machine.machine_number == machine_number).first()
+    media_type = serialization.negotiate(request)
+    sparse = fields is not None or media_type != serialization.JSON
+    names = fields or serialization.MACHINE_FIELDS
+    if sparse:
+        stmt = select(*serialization.fieldset_columns(names, ("id", "row_version", "updated_at")))
+    else:
+        stmt = select(models.Machine).options(serialization.MACHINE_LOAD_ONLY)
+    result = await db.execute(stmt.where(models.Machine.machine_number == machine_number))
+    machine = result.first() if sparse else result.scalar_one_or_none()
     if not machine:
         raise HTTPException(status_code=404, detail="Machine not found")
+
+    headers = cache_headers(machine_etag(machine, serialization.representation(fields, media_type)), machine.updated_at)
+    headers["Vary"] = "Accept"
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    if media_type != serialization.JSON:
+        content = serialization.encode_columnar(names, [[machine._mapping[name] for name in names]], media_type)
+        return serialization.json_response(content, response, media_type)
+    if fields is not None:
+        return serialization.json_response(serialization.dump_fieldset(machine, fields, many=False), response)
     return machine
 
+def negotiated_records(request: Request, response: Response, records: list):
+    response.headers["Vary"] = "Accept"
+    media_type = serialization.negotiate(request)
+    if media_type == serialization.JSON:
+        return records
+    content = serialization.encode_models(records, schemas.MaintenanceRecordDetail, media_type)
+    return serialization.json_response(content, response, media_type)
+
+@app.get("/machines/{machine_number}/history", response_model=List[schemas.MaintenanceRecordDetail])
+async def get_machine_history(
+    machine_number: str,
+    request: Request,
+    response: Response,
+    params: MaintenanceListParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    result = await db.execute(select(models.Machine.id).where(models.Machine.machine_number == machine_number))
+    machine_id = result.scalar_one_or_none()
+    if machine_id is None:
+        raise HTTPException(status_code=404, detail="Machine not found")
+
+    records = keyset_page(await record_page(db, params, machine_id), params.limit, response, record_cursor)
+    return negotiated_records(request, response, records)
+
+@app.post("/machines/{machine_number}/maintenance", response_model=schemas.MaintenanceRecordDetail, status_code=status.HTTP_201_CREATED)
+async def open_maintenance_record(
+    machine_number: str,
+    record: schemas.MaintenanceRecordOpen,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    result = await db.execute(select(models.Machine.id).where(models.Machine.machine_number == machine_number))
+    machine_id = result.scalar_one_or_none()
+    if machine_id is None:
+        raise HTTPException(status_code=404, detail="Machine not found")
+    if await db.get(models.Technician, record.technician_id) is None:
+        raise HTTPException(status_code=404, detail="Technician not found")
+
+    db_record = models.MaintenanceRecord(
+        machine_id=machine_id,
+        technician_id=record.technician_id,
+        issue_description=record.issue_description,
+        is_resolved=False,
+    )
+    db.add(db_record)
+    await db.commit()
+    result = await db.execute(record_query(db_record.id))
+    return result.scalar_one()
+
+# Registered before /machines/{machine_number} so "bulk" is not taken for a machine number
+@app.patch("/machines/bulk", response_model=schemas.MachineBulkUpdateResult)
+async def bulk_update_machines(
+    bulk: schemas.MachineBulkUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    values = bulk.updates.dict(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="No updates given")
+
+    clauses = []
+    if bulk.machine_numbers is not None:
+        clauses.append(models.Machine.machine_number.in_(bulk.machine_numbers))
+    if bulk.filter is not None:
+        clauses.extend(machine_filter_clauses(**bulk.filter.dict()))
+    if not clauses:
+        raise HTTPException(status_code=400, detail="Give machine_numbers or a filter")
+
+    # One set-based UPDATE in one transaction instead of a PATCH per machine
+    await db.run_sync(lambda session: analytics.record_bulk_update(session.connection(), clauses, values))
+    values.update(floor.derived_columns(values))
+    values.update(escalations.reset_columns(values))
+    values["row_version"], values["updated_at"] = await next_version_async(db)
+    stmt = update(models.Machine.__table__).where(*clauses).values(**values)
+    if bulk.return_rows:
+        result = await db.execute(stmt.returning(*models.Machine.__table__.c))
+        machines = [schemas.Machine.model_validate(row) for row in result]
+        updated = len(machines)
+    else:
+        machines = None
+        updated = (await db.execute(stmt)).rowcount
+
+    events.queue_event(db, {"type": "machines.bulk_updated", "row_version": values["row_version"], "count": updated})
+    await db.commit()
+    return {"updated": updated, "machines": machines}
+
 @app.patch("/machines/{machine_number}", response_model=schemas.Machine)
-def update_machine(
+async def update_machine(
     machine_number: str,
     updates: schemas.MachineUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_active_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    values = updates.dict(exclude_unset=True)
+
+    async def apply_updates(session: AsyncSession):
+        result = await session.execute(select(models.Machine).where(models.Machine.machine_number == machine_number))
+        machine = result.scalar_one_or_none()
+        if not machine:
+            raise HTTPException(status_code=404, detail="Machine not found")
+        for key, value in values.items():
+            setattr(machine, key, value)
+        return machine
+
+    return await writes.commit(db, apply_updates, schemas.Machine)
+
+# Maintenance Endpoints
+@app.get("/maintenance/", response_model=List[schemas.MaintenanceRecordDetail])
+async def list_maintenance_records(
+    request: Request,
+    response: Response,
+    params: MaintenanceListParams = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    records = keyset_page(await record_page(db, params), params.limit, response, record_cursor)
+    return negotiated_records(request, response, records)
+
+@app.get("/maintenance/{record_id}", response_model=schemas.MaintenanceRecordDetail)
+async def get_maintenance_record(
+    record_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    result = await db.execute(record_query(record_id))
+    record = result.scalar_one_or_none() or await archive.find_record(db, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Maintenance record not found")
+    return record
+
+@app.post("/maintenance/{record_id}/resolve", response_model=schemas.MaintenanceRecordDetail)
+async def resolve_maintenance_record(
+    record_id: int,
+    resolution: schemas.MaintenanceRecordResolve,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
 ):
-    machine = db.query(models.Machine).filter(models.Machine.machine_number == machine_number).first()
+    result = await db.execute(record_query(record_id))
+    record = result.scalar_one_or_none()
+    if not record:
+        if await archive.find_record(db, record_id):
+            raise HTTPException(status_code=409, detail="Maintenance record is already resolved")
+        raise HTTPException(status_code=404, detail="Maintenance record not found")
+    if record.is_resolved:
+        raise HTTPException(status_code=409, detail="Maintenance record is already resolved")
+
+    record.is_resolved = True
+    record.resolved_time = datetime.utcnow()
+    record.repair_description = resolution.repair_description
+    record.machine.last_maintenance = record.resolved_time
+    await db.commit()
+    return record
+
+@app.post("/technicians/", response_model=schemas.Technician, status_code=status.HTTP_201_CREATED)
+async def create_technician(
+    technician: schemas.TechnicianCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_admin_user)
+):
+    result = await db.execute(select(models.Technician).where(models.Technician.employee_id == technician.employee_id))
+    if result.scalar_one_or_none():
+        raise HTTPException(status_code=400, detail="Employee ID already registered")
+    db_technician = models.Technician(**technician.dict())
+    db.add(db_technician)
+    await db.commit()
+    return db_technician
+
+@app.get("/technicians/", response_model=List[schemas.Technician])
+async def list_technicians(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    result = await db.execute(select(models.Technician).order_by(models.Technician.name))
+    return result.scalars().all()
+
+@app.get("/search", response_model=List[schemas.SearchHit])
+async def search_records(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(machine|maintenance)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    hits = await search.search(db, q, kind, cursor, limit)
+    return keyset_page(hits, limit, response, search.hit_cursor)
+
+# Analytics Endpoints
+# Both read only the rollup tables, so cost does not grow with machine or ticket history
+@app.get("/analytics/downtime", response_model=List[schemas.DowntimeStats])
+async def get_downtime_analytics(
+    group_by: str = Query("vendor", pattern="^(vendor|machine_type|location)$"),
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    # Defaults to the last 30 days; until is exclusive
+    until = until or date.today() + timedelta(days=1)
+    since = since or until - timedelta(days=31)
+    return await analytics.downtime_report(db, group_by, since, until)
+
+@app.get("/analytics/open", response_model=List[schemas.OpenDowntimeStats])
+async def get_open_downtime_analytics(
+    group_by: str = Query("vendor", pattern="^(vendor|machine_type|location)$"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    return await analytics.open_report(db, group_by)
+
+# Export Endpoints
+def _export_response(columns, name: str, fmt: Optional[str], request: Request, more=None) -> StreamingResponse:
+    if fmt is None:
+        # No ?format=: go by the Accept header, CSV unless another export type is named
+        media_type = serialization.negotiate(request, list(EXPORT_MEDIA_TYPES.values()), default="text/csv")
+        fmt = next(key for key, value in EXPORT_MEDIA_TYPES.items() if value == media_type)
+    elif fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_MEDIA_TYPES)}")
+    extension = "json" if fmt == "columnar" else fmt
+    return StreamingResponse(
+        stream_rows(columns, fmt, more),
+        media_type=EXPORT_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"', "Vary": "Accept"},
+    )
+
+@app.get("/export/machines")
+async def export_machines(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson|columnar|msgpack)$"),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    return _export_response(MACHINE_EXPORT_COLUMNS, "machines", fmt, request)
+
+@app.get("/export/maintenance")
+async def export_maintenance(
+    request: Request,
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson|columnar|msgpack)$"),
+    archived: bool = Query(True, description="Follow the main table with the archived records, month by month"),
+    current_user: schemas.User = Depends(get_current_active_user)
+):
+    more = archive.stream_archived if archived else None
+    return _export_response(MAINTENANCE_EXPORT_COLUMNS, "maintenance_records", fmt, request, more)
+
+@app.delete("/machines/{machine_number}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_machine(
+    machine_number: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.User = Depends(get_current_admin_user)
+):
+    result = await db.execute(select(models.Machine).where(models.Machine.machine_number == machine_number))
+    machine = result.scalar_one_or_none()
     if not machine:
         raise HTTPException(status_code=404, detail="Machine not found")
-    
-    for key, value in updates.dict(exclude_unset=True).items():
-        setattr(machine, key, value)
-    
-    db.commit()
-    db.refresh(machine)
-    return machine 
\ No newline at end of file
+
+    # The flush hook in versioning.py records a tombstone for /machines/changes
+    await db.delete(machine)
+    await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
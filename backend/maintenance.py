@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+import models
+import archive
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_time_cursor
+
+# Everything MaintenanceRecordDetail serializes. Async sessions cannot lazy-load,
+# and loading up front keeps a page at a fixed number of queries instead of 1 + N.
+RECORD_LOAD_OPTIONS = (
+    joinedload(models.MaintenanceRecord.machine),
+    selectinload(models.MaintenanceRecord.technician),
+)
+
+
+class MaintenanceListParams:
+    """Query parameters for newest-first maintenance record lists."""
+
+    def __init__(
+        self,
+        is_resolved: Optional[bool] = None,
+        technician_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.is_resolved = is_resolved
+        self.technician_id = technician_id
+        self.since = since
+        self.until = until
+        self.cursor = cursor
+        self.limit = limit
+
+    def filters(self, columns=models.MaintenanceRecord) -> list:
+        # columns: the model, or an archive table's .c, which have the same names
+        clauses = []
+        if self.is_resolved is not None:
+            clauses.append(columns.is_resolved == self.is_resolved)
+        if self.technician_id is not None:
+            clauses.append(columns.technician_id == self.technician_id)
+        if self.since is not None:
+            clauses.append(columns.reported_time >= self.since)
+        if self.until is not None:
+            clauses.append(columns.reported_time < self.until)
+        return clauses
+
+
+def record_page_query(params: MaintenanceListParams, machine_id: Optional[int] = None):
+    """Keyset query for one newest-first page of maintenance records.
+
+    With a machine_id this is a range scan of ix_maintenance_records_machine_reported;
+    filtering on is_resolved alone uses ix_maintenance_records_resolved_reported.
+    """
+    Record = models.MaintenanceRecord
+    stmt = select(Record).where(*params.filters()).options(*RECORD_LOAD_OPTIONS)
+    if machine_id is not None:
+        stmt = stmt.where(Record.machine_id == machine_id)
+    if params.cursor:
+        reported_time, record_id = decode_time_cursor(params.cursor)
+        stmt = stmt.where(tuple_(Record.reported_time, Record.id) < tuple_(reported_time, record_id))
+    return stmt.order_by(Record.reported_time.desc(), Record.id.desc()).limit(params.limit + 1)
+
+
+async def record_page(db: AsyncSession, params: MaintenanceListParams, machine_id: Optional[int] = None) -> list:
+    """One page (plus the look-ahead row) of newest-first records across the hot table and the archive.
+
+    Archive files are only opened for months the page can still reach: a full hot
+    page bounds the range from below by its oldest row, and the cursor or `until`
+    bounds it from above. Open tickets are never archived.
+    """
+    result = await db.execute(record_page_query(params, machine_id))
+    rows = list(result.scalars().all())
+    if params.is_resolved is False:
+        return rows
+    months = await archive.catalog(db)
+    if not months:
+        return rows
+
+    lower = rows[-1].reported_time if len(rows) > params.limit else archive.naive_utc(params.since)
+    upper = decode_time_cursor(params.cursor)[0] if params.cursor else archive.naive_utc(params.until)
+    months = [
+        entry for entry in months
+        if (lower is None or entry.max_reported >= lower) and (upper is None or entry.min_reported <= upper)
+    ]
+    if not months:
+        return rows
+
+    # A record caught between the archive write and the hot delete shows up once, from the hot table
+    hot_ids = {row.id for row in rows}
+    rows.extend(record for record in await archive.cold_page(db, months, params, machine_id) if record.id not in hot_ids)
+    rows.sort(key=record_cursor, reverse=True)
+    return rows[:params.limit + 1]
+
+
+def record_cursor(record) -> list:
+    return [record.reported_time, record.id]
+
+
+def record_query(record_id: int):
+    return (
+        select(models.MaintenanceRecord)
+        .where(models.MaintenanceRecord.id == record_id)
+        .options(*RECORD_LOAD_OPTIONS)
+    )
@@ -0,0 +1,269 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+# Off by default: nothing is hooked into the app or the engines unless enabled
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes", "on")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# The same statement this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger("casino.metrics")
+slow_query_logger = logging.getLogger("casino.slow_query")
+
+_lock = threading.Lock()
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY.append(self)
+
+    def _label_text(self, values, extra: str = "") -> str:
+        pairs = [f'{key}="{value}"' for key, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    @abstractmethod
+    def samples(self) -> list:
+        """The exposition lines for this metric, without HELP/TYPE."""
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self.values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> list:
+        with _lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{self._label_text(labels)} {value}" for labels, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> list:
+        with _lock:
+            items = sorted((labels, list(series)) for labels, series in self.series.items())
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {cumulative}")
+        return lines
+
+
+class Gauge(Metric):
+    """Sampled at scrape time from a callback returning {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels, collect: Callable[[], Dict[tuple, float]]):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def samples(self) -> list:
+        return [f"{self.name}{self._label_text(labels)} {value}" for labels, value in sorted(self.collect().items())]
+
+
+REGISTRY: list = []
+# engine name -> connections checked out, kept by the pool's checkout/checkin events
+_checked_out: Dict[str, int] = {}
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route and status", ("method", "route", "status")
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_db_statements", "SQL statements issued per request", ("method", "route"), COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request", ("method", "route")
+)
+N_PLUS_ONE = Counter(
+    "http_request_n_plus_one_total", "Requests that repeated one statement past the N+1 threshold", ("method", "route")
+)
+STATEMENT_SECONDS = Histogram("db_statement_duration_seconds", "SQL statement latency", ("engine", "operation"))
+SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("engine", "operation"))
+POOL_WAIT_SECONDS = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",))
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out", ("engine",),
+    lambda: {(name,): count for name, count in _checked_out.items()},
+)
+POOL_CONNECTIONS_OPENED = Counter("db_pool_connections_opened_total", "New DBAPI connections opened", ("engine",))
+PASSWORD_HASH_SECONDS = Histogram("password_hash_duration_seconds", "bcrypt hash/verify time", ("operation",))
+WRITE_BATCH_SIZE = Histogram("db_write_batch_size", "Writes committed together by the write pipeline", (), COUNT_BUCKETS)
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "repeated")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.repeated = StatementCounter()
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("metrics_request", default=None)
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Describe bound parameters by type only, so values never reach the logs."""
+    def shape(params):
+        if isinstance(params, dict):
+            return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+        if isinstance(params, (list, tuple)):
+            return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+        return type(params).__name__
+    if executemany and parameters:
+        return f"{len(parameters)} x {shape(parameters[0])}"
+    return shape(parameters)
+
+
+def instrument_engine(engine, name: str):
+    """Time every statement, attribute it to the current request and time pool checkouts."""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        operation = _operation(statement)
+        STATEMENT_SECONDS.observe(elapsed, name, operation)
+        stats = _current_request.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            if not executemany:
+                stats.repeated[statement] += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            SLOW_QUERIES.inc(name, operation)
+            slow_query_logger.warning(
+                "slow query (%.1f ms, %s): %s params=%s",
+                elapsed * 1000, name, " ".join(statement.split()), parameter_shape(parameters, executemany),
+            )
+
+    _checked_out[name] = 0
+
+    @event.listens_for(engine.pool, "connect")
+    def _opened(dbapi_connection, connection_record):
+        POOL_CONNECTIONS_OPENED.inc(name)
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        with _lock:
+            _checked_out[name] += 1
+
+    @event.listens_for(engine.pool, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        with _lock:
+            _checked_out[name] -= 1
+
+    # The pool has no "before checkout" event, so the wait is timed around
+    # engine.connect(), which sessions (sync and async) go through for a connection
+    connect = engine.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started, name)
+    engine.connect = timed_connect
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, status and SQL work per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            # Route templates, not raw paths, keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_SECONDS.observe(elapsed, method, route, str(status_code))
+            REQUEST_STATEMENTS.observe(stats.statements, method, route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, method, route)
+            if stats.repeated:
+                statement, count = stats.repeated.most_common(1)[0]
+                if count >= N_PLUS_ONE_THRESHOLD:
+                    N_PLUS_ONE.inc(method, route)
+                    logger.warning(
+                        "possible N+1 on %s %s: statement ran %d times: %s",
+                        method, route, count, " ".join(statement.split())[:300],
+                    )
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
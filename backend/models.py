@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Enum, Text
+from sqlalchemy import Boolean, Column, Date, Float, ForeignKey, Index, Integer, String, DateTime, Enum, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -20,6 +20,20 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
 
+class RefreshToken(Base):
+    """One refresh token, stored only as its keyed hash. A family is the chain of
+    tokens rotated from one login."""
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    family = Column(String(32), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    used_at = Column(DateTime)
+    revoked_at = Column(DateTime)
+
 class Machine(Base):
     __tablename__ = "machines"
 
@@ -31,12 +45,65 @@ class Machine(Base):
     status = Column(Enum(MachineStatus), default=MachineStatus.DOWN)
     date_down = Column(DateTime(timezone=True), default=datetime.now)
     location = Column(String)
+    # Parsed from location on every write (see floor.py)
+    zone = Column(String)
+    bank = Column(String)
+    position = Column(String)
+    # Floor-plan coordinates, for nearest-machine lookups
+    floor_x = Column(Float)
+    floor_y = Column(Float)
     machine_type = Column(String)  # e.g., "Slot Machine", "Video Poker", etc.
     is_out_of_service = Column(Boolean, default=False)
     current_issue = Column(Text, nullable=True)
+    # Set by the scheduled escalation rules (see escalations.py); cleared when status changes
+    escalation = Column(String(32))
+    escalated_at = Column(DateTime(timezone=True))
     last_maintenance = Column(DateTime(timezone=True), server_default=func.now())
+    # Stamped on every write (see versioning.py); row_version is monotonic across the table
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    row_version = Column(Integer, default=0, index=True)
     maintenance_records = relationship("MaintenanceRecord", back_populates="machine")
 
+    # Composite indexes backing the filtered, keyset-paginated machine list.
+    # Each ends in (date_down, id) so a filter plus cursor is a single index range scan.
+    __table_args__ = (
+        Index("ix_machines_date_down_id", "date_down", "id"),
+        Index("ix_machines_status_date_down", "status", "date_down", "id"),
+        Index("ix_machines_location_status_date_down", "location", "status", "date_down", "id"),
+        Index("ix_machines_vendor_status_date_down", "vendor", "status", "date_down", "id"),
+        Index("ix_machines_type_status_date_down", "machine_type", "status", "date_down", "id"),
+        Index("ix_machines_out_of_service_date_down", "is_out_of_service", "date_down", "id"),
+        # Zone/bank machine lists; also covers the per-bank status counts
+        Index("ix_machines_zone_bank_status_date_down", "zone", "bank", "status", "date_down", "id"),
+        # Machines sitting in one status since their last write (stale IN_PROGRESS escalation)
+        Index("ix_machines_status_updated_at", "status", "updated_at"),
+    )
+
+class MachineTombstone(Base):
+    __tablename__ = "machine_tombstones"
+
+    id = Column(Integer, primary_key=True, index=True)
+    machine_number = Column(String, index=True)
+    row_version = Column(Integer, index=True)
+    deleted_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+class SchedulerLease(Base):
+    """Which worker runs the shared background jobs, until expires_at unless it renews."""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class SyncVersion(Base):
+    """Monotonic change counter per synced table, bumped by every write to it."""
+    __tablename__ = "sync_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
 class Technician(Base):
     __tablename__ = "technicians"
 
@@ -54,9 +121,72 @@ class MaintenanceRecord(Base):
     technician_id = Column(Integer, ForeignKey("technicians.id"))
     issue_description = Column(Text)
     repair_description = Column(Text, nullable=True)
-    reported_time = Column(DateTime(timezone=True), server_default=func.now())
+    # Python-side default keeps the stored format identical to the keyset cursors compared against it
+    reported_time = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     resolved_time = Column(DateTime(timezone=True), nullable=True)
     is_resolved = Column(Boolean, default=False)
     
     machine = relationship("Machine", back_populates="maintenance_records")
-    technician = relationship("Technician", back_populates="maintenance_records") 
\ No newline at end of file
+    technician = relationship("Technician", back_populates="maintenance_records")
+
+    # A machine's history and the open/resolved queues are newest-first keyset scans
+    __table_args__ = (
+        Index("ix_maintenance_records_machine_reported", "machine_id", "reported_time", "id"),
+        Index("ix_maintenance_records_resolved_reported", "is_resolved", "reported_time", "id"),
+    )
+
+# Downtime rollups, maintained incrementally by analytics.py. Group columns use
+# "" for unknown so they can be part of the primary key.
+class DowntimeDaily(Base):
+    """Closed downtime intervals and resolved tickets, summed per UTC day and machine group."""
+    __tablename__ = "downtime_daily"
+
+    day = Column(Date, primary_key=True)
+    vendor = Column(String, primary_key=True)
+    machine_type = Column(String, primary_key=True)
+    location = Column(String, primary_key=True)
+    downtime_seconds = Column(Float, nullable=False, default=0)
+    downtime_events = Column(Integer, nullable=False, default=0)
+    repair_seconds = Column(Float, nullable=False, default=0)
+    repairs = Column(Integer, nullable=False, default=0)
+
+class DowntimeOpen(Base):
+    """Machines currently down and unresolved tickets per machine group.
+
+    Start times are kept as sums of epoch seconds so the average age is
+    ``now - sum / count`` without touching the underlying rows.
+    """
+    __tablename__ = "downtime_open"
+
+    vendor = Column(String, primary_key=True)
+    machine_type = Column(String, primary_key=True)
+    location = Column(String, primary_key=True)
+    down_machines = Column(Integer, nullable=False, default=0)
+    down_since_sum = Column(Float, nullable=False, default=0)
+    open_tickets = Column(Integer, nullable=False, default=0)
+    reported_sum = Column(Float, nullable=False, default=0)
+
+class MachineStatusCount(Base):
+    """Machines per group and status, behind GET /machines/summary."""
+    __tablename__ = "machine_status_counts"
+
+    vendor = Column(String, primary_key=True)
+    machine_type = Column(String, primary_key=True)
+    location = Column(String, primary_key=True)
+    status = Column(Enum(MachineStatus), primary_key=True)
+    machines = Column(Integer, nullable=False, default=0)
+
+class MaintenanceArchive(Base):
+    """Catalog of the monthly cold-tier files written by archive.py, one row per month.
+
+    Readers use the ranges to decide whether a query needs the cold tier at all.
+    """
+    __tablename__ = "maintenance_archives"
+
+    month = Column(String, primary_key=True)  # "YYYY-MM" of reported_time
+    records = Column(Integer, nullable=False, default=0)
+    min_reported = Column(DateTime(timezone=True), nullable=False)
+    max_reported = Column(DateTime(timezone=True), nullable=False)
+    min_id = Column(Integer, nullable=False)
+    max_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow)
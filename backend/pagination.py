@@ -0,0 +1,123 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import select, tuple_
+import models
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, default=lambda v: v.isoformat(), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def machine_filter_clauses(**filters) -> list:
+    """Equality clauses on Machine columns for every filter that is not None."""
+    return [
+        getattr(models.Machine, name) == value
+        for name, value in filters.items()
+        if value is not None
+    ]
+
+
+class MachineListParams:
+    """Query parameters shared by the machine list endpoints."""
+
+    def __init__(
+        self,
+        status: Optional[models.MachineStatus] = None,
+        vendor: Optional[str] = None,
+        location: Optional[str] = None,
+        zone: Optional[str] = None,
+        bank: Optional[str] = None,
+        machine_type: Optional[str] = None,
+        is_out_of_service: Optional[bool] = None,
+        # Both sort keys are backed by an index on machines
+        order_by: str = Query("date_down", pattern="^(date_down|machine_number)$"),
+        cursor: Optional[str] = None,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.status = status
+        self.vendor = vendor
+        self.location = location
+        self.zone = zone
+        self.bank = bank
+        self.machine_type = machine_type
+        self.is_out_of_service = is_out_of_service
+        self.order_by = order_by
+        self.cursor = cursor
+        self.limit = limit
+
+    def filters(self) -> list:
+        return machine_filter_clauses(
+            status=self.status,
+            vendor=self.vendor,
+            location=self.location,
+            zone=self.zone,
+            bank=self.bank,
+            machine_type=self.machine_type,
+            is_out_of_service=self.is_out_of_service,
+        )
+
+
+def machine_page_query(params: MachineListParams):
+    """Build the keyset query for one page of machines.
+
+    One extra row is fetched so the caller can tell whether another page exists.
+    """
+    Machine = models.Machine
+    stmt = select(Machine).where(*params.filters())
+
+    if params.order_by == "machine_number":
+        if params.cursor:
+            values = decode_cursor(params.cursor, 1)
+            stmt = stmt.where(Machine.machine_number > values[0])
+        stmt = stmt.order_by(Machine.machine_number)
+    else:
+        if params.cursor:
+            date_down, machine_id = decode_time_cursor(params.cursor)
+            stmt = stmt.where(tuple_(Machine.date_down, Machine.id) > tuple_(date_down, machine_id))
+        stmt = stmt.order_by(Machine.date_down, Machine.id)
+
+    return stmt.limit(params.limit + 1)
+
+
+def keyset_page(rows: List, limit: int, response: Response, cursor_values: Callable) -> List:
+    """Trim the look-ahead row and advertise the next cursor in the response headers."""
+    if len(rows) <= limit:
+        return rows
+    rows = rows[:limit]
+    response.headers["X-Next-Cursor"] = encode_cursor(cursor_values(rows[-1]))
+    return rows
+
+
+def next_page(rows: List, params: MachineListParams, response: Response) -> List:
+    if params.order_by == "machine_number":
+        return keyset_page(rows, params.limit, response, lambda last: [last.machine_number])
+    return keyset_page(rows, params.limit, response, lambda last: [last.date_down, last.id])
+
+
+def decode_time_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a [timestamp, id] cursor as produced for time-ordered lists."""
+    timestamp, row_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
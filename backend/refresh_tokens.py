@@ -0,0 +1,192 @@
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import metrics
+import models
+import schemas
+from auth import SECRET_KEY
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Keyed hash for stored tokens; defaults to SECRET_KEY, set it separately to rotate one without the other
+REFRESH_TOKEN_KEY = os.getenv("REFRESH_TOKEN_KEY", SECRET_KEY).encode()
+REFRESH_PRUNE_BATCH = int(os.getenv("REFRESH_PRUNE_BATCH", "1000"))
+# Delete expired tokens this often (0 = off; `python refresh_tokens.py prune` runs it once)
+REFRESH_PRUNE_INTERVAL_MINUTES = float(os.getenv("REFRESH_PRUNE_INTERVAL_MINUTES", "60"))
+
+logger = logging.getLogger("casino.refresh_tokens")
+
+tokens_table = models.RefreshToken.__table__
+
+REFRESHES = metrics.Counter("auth_refresh_total", "Refresh token exchanges by outcome", ("outcome",))
+
+
+def token_hash(token: str) -> str:
+    # Tokens carry 256 random bits, so one HMAC is as good as a slow hash and costs microseconds
+    return hmac.new(REFRESH_TOKEN_KEY, token.encode(), hashlib.sha256).hexdigest()
+
+
+def _refused(outcome: str) -> HTTPException:
+    REFRESHES.inc(outcome)
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+async def issue(db: AsyncSession, user_id: int, family: Optional[str] = None) -> str:
+    """Add a refresh token for ``user_id`` to the session's transaction; the caller commits.
+
+    A login starts a new family; every rotation continues it, so reuse of any
+    token in the chain can revoke the whole chain.
+    """
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    await db.execute(insert(tokens_table).values(
+        token_hash=token_hash(token),
+        family=family or secrets.token_hex(16),
+        user_id=user_id,
+        created_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    return token
+
+
+async def revoke_family(db: AsyncSession, family: str):
+    await db.execute(
+        update(tokens_table)
+        .where(tokens_table.c.family == family, tokens_table.c.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+
+
+async def rotate(db: AsyncSession, token: str) -> Tuple[schemas.User, str]:
+    """Spend ``token`` and return its user with the next token of the family; commits.
+
+    A token that was already spent means it was copied: the family is revoked,
+    so both the thief and the device log in again. Marking the token spent is a
+    conditional UPDATE, so two workers racing with the same token cannot both win.
+    """
+    row = (await db.execute(
+        select(tokens_table, models.User)
+        .join(models.User, models.User.id == tokens_table.c.user_id)
+        .where(tokens_table.c.token_hash == token_hash(token))
+    )).first()
+    if row is None:
+        raise _refused("unknown")
+    now = datetime.utcnow()
+    if row.revoked_at is not None:
+        raise _refused("revoked")
+    if row.used_at is not None:
+        await _reused(db, row)
+    if row.expires_at <= now:
+        raise _refused("expired")
+    if not row.User.is_active:
+        raise _refused("inactive")
+
+    spent = await db.execute(
+        update(tokens_table)
+        .where(tokens_table.c.id == row.id, tokens_table.c.used_at.is_(None), tokens_table.c.revoked_at.is_(None))
+        .values(used_at=now)
+    )
+    if spent.rowcount != 1:
+        await _reused(db, row)
+    new_token = await issue(db, row.user_id, row.family)
+    principal = schemas.User.model_validate(row.User)
+    await db.commit()
+    REFRESHES.inc("rotated")
+    return principal, new_token
+
+
+async def _reused(db: AsyncSession, row):
+    await revoke_family(db, row.family)
+    await db.commit()
+    logger.warning("refresh token reuse for user %s; revoked its session", row.User.username)
+    raise _refused("reused")
+
+
+async def revoke(db: AsyncSession, token: str) -> bool:
+    """Log out: revoke the family ``token`` belongs to. Returns False for unknown tokens."""
+    family = (await db.execute(
+        select(tokens_table.c.family).where(tokens_table.c.token_hash == token_hash(token))
+    )).scalar()
+    if family is None:
+        return False
+    await revoke_family(db, family)
+    await db.commit()
+    return True
+
+
+async def revoke_user(db: AsyncSession, user_id: int) -> int:
+    result = await db.execute(
+        update(tokens_table)
+        .where(tokens_table.c.user_id == user_id, tokens_table.c.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount
+
+
+# Deactivating a user ends their sessions in the same transaction, whichever
+# endpoint or script does it.
+@event.listens_for(Session, "after_flush")
+def _revoke_deactivated_users(session, flush_context):
+    deactivated = [
+        obj.id for obj in session.dirty
+        if isinstance(obj, models.User) and obj.is_active is False
+        and inspect(obj).attrs.is_active.history.deleted
+    ]
+    if deactivated:
+        session.connection().execute(
+            update(tokens_table)
+            .where(tokens_table.c.user_id.in_(deactivated), tokens_table.c.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        )
+
+
+def prune_expired(engine, batch_size: int = REFRESH_PRUNE_BATCH, now: Optional[datetime] = None,
+                  proceed: Optional[Callable[[], bool]] = None) -> int:
+    """Delete expired tokens, spent and revoked ones included, a batch per transaction.
+
+    Small batches keep each write lock short, so logins and refreshes are never
+    stuck behind one large DELETE. ``proceed`` is asked before every batch.
+    """
+    cutoff = now or datetime.utcnow()
+    pruned = 0
+    while proceed is None or proceed():
+        with engine.begin() as connection:
+            ids = connection.execute(
+                select(tokens_table.c.id).where(tokens_table.c.expires_at < cutoff).limit(batch_size)
+            ).scalars().all()
+            if ids:
+                connection.execute(delete(tokens_table).where(tokens_table.c.id.in_(ids)))
+        pruned += len(ids)
+        if len(ids) < batch_size:
+            break
+    return pruned
+
+
+def prune(engine, proceed: Optional[Callable[[], bool]] = None) -> int:
+    pruned = prune_expired(engine, proceed=proceed)
+    if pruned:
+        logger.info("pruned %d expired refresh tokens", pruned)
+    return pruned
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    if sys.argv[1:] != ["prune"]:
+        print("usage: python refresh_tokens.py prune")
+        sys.exit(2)
+    print(f"Pruned {prune_expired(engine)} expired refresh tokens")
@@ -0,0 +1,336 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, or_, update
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine
+from database import async_engine
+import metrics
+import models
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# Another worker takes over the shared jobs this long after the leader last renewed
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+# Share of the lease a leader gives up early, so its runs stop before anyone else can take over
+LEASE_MARGIN = 0.1
+# Job runs in progress at once per worker; each holds a thread-pool thread or a pooled connection
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "1"))
+# Upper bound on the random delay added to every tick (interval jobs add at most a tenth of their interval)
+SCHEDULER_MAX_JITTER_SECONDS = float(os.getenv("SCHEDULER_MAX_JITTER_SECONDS", "30"))
+
+LEASE = "scheduler"
+
+logger = logging.getLogger("casino.scheduler")
+
+leases_table = models.SchedulerLease.__table__
+
+JOB_SECONDS = metrics.Histogram("scheduler_job_duration_seconds", "Scheduled job run time", ("job",))
+JOB_RUNS = metrics.Counter("scheduler_job_runs_total", "Scheduled job ticks by outcome", ("job", "outcome"))
+
+
+def _field(text: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in text.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            start, end = low, high
+        elif "-" in spec:
+            start, end = (int(value) for value in spec.split("-", 1))
+        else:
+            start = int(spec)
+            end = high if step else start
+        every = int(step) if step else 1
+        if not low <= start <= end <= high or every < 1:
+            raise ValueError(f"cron field {text!r} is outside {low}-{high}")
+        values.update(range(start, end + 1, every))
+    return values
+
+
+class Cron:
+    """A five-field crontab schedule: minute, hour, day of month, month, day of week.
+
+    Fields take *, lists, ranges and steps ("*/15", "1-5", "0,30"); days of the
+    week run from 0 (Sunday) to 6, and 7 is Sunday too. As in cron, when both
+    day fields are restricted a day matching either one fires, and times are the
+    server's local time.
+    """
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron expression needs five fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _field(part, low, high) for part, (low, high) in zip(parts, self.RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.either_day = parts[2] != "*" and parts[4] != "*"
+        self.next_after(datetime(2000, 1, 1))
+
+    def _day_matches(self, moment: datetime) -> bool:
+        in_month = moment.day in self.days
+        in_week = (moment.weekday() + 1) % 7 in self.weekdays
+        return in_month or in_week if self.either_day else in_month and in_week
+
+    def next_after(self, moment: datetime) -> datetime:
+        """The first matching minute after ``moment``."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skips whole months, days and hours, so even a yearly schedule is a few hundred steps
+        limit = candidate + timedelta(days=8 * 366)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"cron expression never fires: {self.expression!r}")
+
+
+class Job:
+    """A function run every ``every`` seconds or on a cron schedule.
+
+    Coroutine functions run on the event loop; plain functions run on the
+    thread pool, so blocking database work never stalls request handling.
+    """
+
+    def __init__(self, name: str, func: Callable, args: tuple, every: Optional[float] = None,
+                 cron: Optional[str] = None, leader_only: bool = True, jitter: Optional[float] = None):
+        if (every is None) == (cron is None):
+            raise ValueError(f"job {name} needs exactly one of every and cron")
+        self.name = name
+        self.func = func
+        self.args = args
+        self.every = every
+        self.cron = Cron(cron) if cron else None
+        self.leader_only = leader_only
+        if jitter is None:
+            jitter = min(SCHEDULER_MAX_JITTER_SECONDS, every / 10) if every else SCHEDULER_MAX_JITTER_SECONDS
+        self.jitter = jitter
+        self.run: Optional[asyncio.Task] = None
+        self.next_run: Optional[datetime] = None
+        self.last_started: Optional[datetime] = None
+        self.last_seconds: Optional[float] = None
+        self.runs = 0
+        self.errors = 0
+        self.overruns = 0
+        self.overran = False
+        self.abandoned = False
+
+    def delay(self) -> float:
+        """Seconds until the next tick, jitter included."""
+        now = datetime.now()
+        wait = (self.cron.next_after(now) - now).total_seconds() if self.cron else self.every
+        wait += random.uniform(0, self.jitter)
+        self.next_run = now + timedelta(seconds=wait)
+        return wait
+
+    @property
+    def is_coroutine(self) -> bool:
+        return asyncio.iscoroutinefunction(self.func)
+
+    async def call(self):
+        if self.is_coroutine:
+            return await self.func(*self.args)
+        return await run_in_threadpool(self.func, *self.args)
+
+    def stats(self) -> dict:
+        return {
+            "schedule": self.cron.expression if self.cron else f"every {self.every:g}s",
+            "leader_only": self.leader_only,
+            "running": self.run is not None,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_started": self.last_started.isoformat() if self.last_started else None,
+            "last_seconds": self.last_seconds,
+            "runs": self.runs,
+            "errors": self.errors,
+            "overruns": self.overruns,
+        }
+
+
+class Scheduler:
+    """Periodic background jobs for one worker, started and stopped with the app.
+
+    Jobs that work on shared tables run only on the leader: the worker holding
+    the scheduler_leases row, which it renews every third of the lease. If the
+    leader dies, the first worker to find the lease expired takes it over. A
+    leader that cannot renew considers itself deposed a tenth of the lease
+    before the row expires, and then gives up its leader-only runs: coroutine
+    jobs are cancelled, and jobs on the thread pool, which cannot be
+    interrupted, are passed ``still_leading`` and check it between batches. At
+    worst one batch of a deposed leader overlaps the new leader's work.
+
+    A tick that finds the job's previous run still going is skipped and counted
+    as an overrun, and at most ``concurrency`` runs proceed at once, so a slow
+    job falls behind rather than piling onto the thread pool and the database
+    the request handlers share.
+    """
+
+    def __init__(self, engine: AsyncEngine = async_engine, lease_seconds: float = SCHEDULER_LEASE_SECONDS,
+                 concurrency: int = SCHEDULER_CONCURRENCY):
+        self.engine = engine
+        self.lease_seconds = lease_seconds
+        self.concurrency = concurrency
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, Job] = {}
+        self.tasks: List[asyncio.Task] = []
+        self.leader_until = 0.0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self.tasks)
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self.leader_until
+
+    def still_leading(self) -> bool:
+        """For batched jobs on the thread pool: False once they should stop (safe from any thread)."""
+        return self.is_leader
+
+    def add(self, name: str, func: Callable, *args, every: Optional[float] = None, cron: Optional[str] = None,
+            leader_only: bool = True, jitter: Optional[float] = None) -> Job:
+        job = self.jobs[name] = Job(name, func, args, every, cron, leader_only, jitter)
+        return job
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.concurrency)
+        if any(job.leader_only for job in self.jobs.values()):
+            self.tasks.append(asyncio.create_task(self._elect()))
+        self.tasks.extend(asyncio.create_task(self._schedule(job)) for job in self.jobs.values())
+
+    async def stop(self):
+        tasks = self.tasks + [job.run for job in self.jobs.values() if job.run is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tasks = []
+        if self.leader_until:
+            try:
+                await self._release()
+            except Exception:
+                logger.exception("could not release the scheduler lease")
+
+    async def _elect(self):
+        while True:
+            try:
+                await self._acquire()
+            except Exception:
+                # Leadership lapses with the lease if renewals keep failing
+                logger.exception("scheduler lease renewal failed")
+            if not self.is_leader:
+                self._abandon()
+            wait = self.lease_seconds / 3
+            if self.is_leader:
+                # Wake no later than the local deadline, to give the jobs up on time if renewals fail
+                wait = min(wait, self.leader_until - time.monotonic())
+            await asyncio.sleep(max(wait, 0))
+
+    def _abandon(self):
+        for job in self.jobs.values():
+            if job.leader_only and job.run is not None and not job.abandoned:
+                job.abandoned = True
+                JOB_RUNS.inc(job.name, "abandoned")
+                logger.warning("%s gave up %s on losing the scheduler lease", self.holder, job.name)
+                if job.is_coroutine:
+                    job.run.cancel()
+
+    async def _acquire(self):
+        # The local deadline and the stored one are measured from the same instant
+        started = time.monotonic()
+        now = datetime.utcnow()
+        values = {"holder": self.holder, "expires_at": now + timedelta(seconds=self.lease_seconds)}
+        async with self.engine.begin() as connection:
+            renewed = await connection.execute(
+                update(leases_table)
+                .where(leases_table.c.name == LEASE,
+                       or_(leases_table.c.holder == self.holder, leases_table.c.expires_at < now))
+                .values(**values, acquired_at=case((leases_table.c.holder == self.holder, leases_table.c.acquired_at),
+                                                   else_=now))
+            )
+            won = renewed.rowcount == 1
+            if not won:
+                insert = sqlite.insert
+                if connection.dialect.name == "postgresql":
+                    from sqlalchemy.dialects.postgresql import insert
+                created = await connection.execute(
+                    insert(leases_table).values(name=LEASE, acquired_at=now, **values).on_conflict_do_nothing()
+                )
+                won = created.rowcount == 1
+        if won and not self.is_leader:
+            logger.info("%s is now the scheduler leader", self.holder)
+        elif not won and self.leader_until:
+            logger.warning("%s lost the scheduler lease", self.holder)
+        self.leader_until = started + self.lease_seconds * (1 - LEASE_MARGIN) if won else 0.0
+
+    async def _release(self):
+        self.leader_until = 0.0
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                update(leases_table)
+                .where(leases_table.c.name == LEASE, leases_table.c.holder == self.holder)
+                .values(expires_at=datetime.utcnow())
+            )
+
+    async def _schedule(self, job: Job):
+        while True:
+            await asyncio.sleep(job.delay())
+            if job.leader_only and not self.is_leader:
+                continue
+            if job.run is not None:
+                if not job.overran:
+                    logger.warning("%s is still running at its next tick; skipping ticks until it finishes", job.name)
+                job.overran = True
+                job.overruns += 1
+                JOB_RUNS.inc(job.name, "overrun")
+                continue
+            job.run = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: Job):
+        try:
+            async with self._slots:
+                job.last_started = datetime.now()
+                started = time.perf_counter()
+                outcome = "ok"
+                try:
+                    await job.call()
+                except Exception:
+                    outcome = "error"
+                    job.errors += 1
+                    logger.exception("scheduled job %s failed", job.name)
+                job.last_seconds = time.perf_counter() - started
+                job.runs += 1
+                JOB_SECONDS.observe(job.last_seconds, job.name)
+                JOB_RUNS.inc(job.name, outcome)
+        finally:
+            job.run = None
+            job.overran = False
+            job.abandoned = False
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "leader": self.is_leader,
+            "jobs": {name: job.stats() for name, job in self.jobs.items()},
+        }
+
+
+jobs = Scheduler()
+
+LEADER = metrics.Gauge(
+    "scheduler_leader", "1 while this worker holds the scheduler lease", (), lambda: {(): float(jobs.is_leader)}
+)
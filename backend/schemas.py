@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, ConfigDict, Field
+from typing import Dict, Optional, List
 from datetime import datetime
 from models import MachineStatus
 
@@ -28,6 +28,11 @@ class User(UserBase):
     is_active: bool
     is_admin: bool = False
 
+class UserUpdate(BaseModel):
+    email: Optional[EmailStr] = None
+    is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
+
 class UserResponse(BaseModel):
     id: int
     username: str
@@ -41,6 +46,11 @@ class UserResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -51,6 +61,11 @@ class MachineBase(BaseModel):
     serial_number: str
     vendor: str
     notes: Optional[str] = None
+    # Free-form, e.g. "High Limit, Bank C, 7"; zone/bank/position are parsed from it
+    location: Optional[str] = None
+    # Floor-plan coordinates in any one unit, for /floor/nearest
+    floor_x: Optional[float] = None
+    floor_y: Optional[float] = None
     model_config = ConfigDict(from_attributes=True)
 
 class MachineCreate(MachineBase):
@@ -61,12 +76,63 @@ class MachineUpdate(BaseModel):
     status: Optional[MachineStatus] = None
     notes: Optional[str] = None
     date_down: Optional[datetime] = None
+    location: Optional[str] = None
+    floor_x: Optional[float] = None
+    floor_y: Optional[float] = None
     model_config = ConfigDict(from_attributes=True)
 
 class Machine(MachineBase):
     id: int
     status: MachineStatus
     date_down: datetime
+    zone: Optional[str] = None
+    bank: Optional[str] = None
+    position: Optional[str] = None
+    escalation: Optional[str] = None
+    escalated_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    row_version: Optional[int] = None
+
+class MachineTombstone(BaseModel):
+    machine_number: str
+    row_version: int
+    model_config = ConfigDict(from_attributes=True)
+
+class MachineChanges(BaseModel):
+    version: int
+    machines: List[Machine]
+    deleted: List[MachineTombstone]
+    has_more: bool
+
+class MachineFilter(BaseModel):
+    status: Optional[MachineStatus] = None
+    vendor: Optional[str] = None
+    location: Optional[str] = None
+    zone: Optional[str] = None
+    bank: Optional[str] = None
+    machine_type: Optional[str] = None
+    is_out_of_service: Optional[bool] = None
+
+class MachineBulkUpdate(BaseModel):
+    machine_numbers: Optional[List[str]] = Field(None, max_length=10000)
+    filter: Optional[MachineFilter] = None
+    updates: MachineUpdate
+    return_rows: bool = False
+
+class MachineBulkUpdateResult(BaseModel):
+    updated: int
+    machines: Optional[List[Machine]] = None
+
+class BulkImportError(BaseModel):
+    row: int
+    machine_number: Optional[str] = None
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkImportError]
+    errors_truncated: bool = False
 
 class TechnicianBase(BaseModel):
     name: str
@@ -98,4 +164,79 @@ class MaintenanceRecord(MaintenanceRecordBase):
     resolved_time: Optional[datetime] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class MaintenanceRecordOpen(BaseModel):
+    technician_id: int
+    issue_description: str
+
+class MaintenanceRecordResolve(BaseModel):
+    repair_description: str
+
+class MachineSummary(BaseModel):
+    id: int
+    machine_number: str
+    vendor: Optional[str] = None
+    status: MachineStatus
+    model_config = ConfigDict(from_attributes=True)
+
+class MaintenanceRecordDetail(MaintenanceRecord):
+    technician: Optional[Technician] = None
+    machine: Optional[MachineSummary] = None
+
+class DowntimeStats(BaseModel):
+    group: str
+    downtime_seconds: float
+    downtime_events: int
+    mean_downtime_seconds: Optional[float] = None
+    repairs: int
+    mttr_seconds: Optional[float] = None
+
+class OpenDowntimeStats(BaseModel):
+    group: str
+    down_machines: int
+    ongoing_downtime_seconds: float
+    mean_down_age_seconds: Optional[float] = None
+    open_tickets: int
+    mean_ticket_age_seconds: Optional[float] = None
+
+class StatusCounts(BaseModel):
+    down: int
+    in_progress: int
+    fixed: int
+    total: int
+
+class FloorSummary(BaseModel):
+    total: StatusCounts
+    by_location: Dict[str, StatusCounts]
+    by_vendor: Dict[str, StatusCounts]
+    by_machine_type: Dict[str, StatusCounts]
+    version: int
+
+class BankCounts(BaseModel):
+    bank: Optional[str] = None
+    counts: StatusCounts
+
+class ZoneCounts(BaseModel):
+    zone: Optional[str] = None
+    counts: StatusCounts
+    banks: List[BankCounts]
+
+class NearbyMachine(BaseModel):
+    machine_number: str
+    status: MachineStatus
+    zone: Optional[str] = None
+    bank: Optional[str] = None
+    position: Optional[str] = None
+    floor_x: float
+    floor_y: float
+    distance: float
+    date_down: Optional[datetime] = None
+
+class SearchHit(BaseModel):
+    kind: str
+    id: int
+    machine_number: Optional[str] = None
+    # bm25 score; lower is a better match
+    rank: float
+    highlights: Dict[str, str]
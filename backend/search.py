@@ -0,0 +1,236 @@
+import re
+import sys
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+import archive
+import models
+from pagination import decode_cursor
+
+SNIPPET_TOKENS = 16
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+# External-content FTS5 tables: the text itself stays in the source table and
+# triggers keep the index in step, so Core bulk writes are covered too.
+FTS_TABLES = {
+    "machines_fts": ("machines", ("notes", "current_issue")),
+    "maintenance_fts": ("maintenance_records", ("issue_description", "repair_description")),
+}
+
+
+def fts_ddl(name: str) -> List[str]:
+    source, columns = FTS_TABLES[name]
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        # Status-only updates do not touch the index
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {name}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def is_search_table(name: str) -> bool:
+    """True for the FTS tables and their shadow tables, which the ORM metadata does not know about."""
+    return any(name == fts or name.startswith(f"{fts}_") for fts in FTS_TABLES)
+
+
+def _create_index(name: str):
+    def create(target, connection, **kw):
+        if connection.dialect.name != "sqlite":
+            return
+        # The source table is new, so any index left over from a dropped one is stale
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+        for statement in fts_ddl(name):
+            connection.exec_driver_sql(statement)
+    return create
+
+
+# Databases built with create_all get the index alongside the tables; alembic
+# installs it in migration 0006.
+event.listen(models.Machine.__table__, "after_create", _create_index("machines_fts"))
+event.listen(models.MaintenanceRecord.__table__, "after_create", _create_index("maintenance_fts"))
+
+
+def maintain(connection, command: str):
+    """Run an FTS5 maintenance command on every index: 'rebuild' or 'optimize'."""
+    for name in FTS_TABLES:
+        if command == "rebuild":
+            for statement in fts_ddl(name):
+                connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('{command}')")
+
+
+def match_expression(q: str) -> Optional[str]:
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    # Quote every term so FTS5 operators in user input are taken literally; the
+    # last one matches as a prefix so results show up while typing
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def _search_arm(kind: str, name: str) -> str:
+    source, columns = FTS_TABLES[name]
+    snippets = ", ".join(
+        f"snippet({name}, {index}, :open, :close, '…', :tokens) AS {column}"
+        for index, column in enumerate(columns)
+    )
+    if kind == "machine":
+        machine = f"JOIN machines m ON m.id = {name}.rowid"
+    else:
+        machine = f"JOIN {source} s ON s.id = {name}.rowid LEFT JOIN machines m ON m.id = s.machine_id"
+    return (
+        f"SELECT '{kind}' AS kind, {name}.rowid AS id, m.machine_number AS machine_number, "
+        f"bm25({name}) AS rank, {snippets} FROM {name} {machine} WHERE {name} MATCH :match"
+    )
+
+
+def highlight(value: Optional[str], terms: List[str]) -> Optional[str]:
+    """A snippet of ``value`` around its first matching term, like FTS5 snippet() makes.
+
+    Terms match as word prefixes, which stands in for the porter stemming the
+    index itself does.
+    """
+    if not value:
+        return None
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    words = value.split()
+    first = next((index for index, word in enumerate(words) if pattern.search(word)), None)
+    if first is None:
+        return None
+    start = max(0, first - SNIPPET_TOKENS // 2)
+    window = words[start:start + SNIPPET_TOKENS]
+    snippet = pattern.sub(lambda match: f"{HIGHLIGHT_OPEN}{match.group(0)}{HIGHLIGHT_CLOSE}", " ".join(window))
+    return ("…" if start > 0 else "") + snippet + ("…" if start + SNIPPET_TOKENS < len(words) else "")
+
+
+async def _live_hits(db: AsyncSession, match: str, kind: Optional[str], after: Optional[list], limit: int) -> List[dict]:
+    arms = []
+    if kind in (None, "machine"):
+        arms.append(_search_arm("machine", "machines_fts"))
+    if kind in (None, "maintenance"):
+        arms.append(_search_arm("maintenance", "maintenance_fts"))
+    sql = " UNION ALL ".join(arms)
+    params = {
+        "match": match,
+        "open": HIGHLIGHT_OPEN,
+        "close": HIGHLIGHT_CLOSE,
+        "tokens": SNIPPET_TOKENS,
+        "limit": limit,
+    }
+    where = ""
+    if after:
+        params["after_rank"], params["after_kind"], params["after_id"] = after
+        where = "WHERE (rank, kind, id) > (:after_rank, :after_kind, :after_id)"
+    result = await db.execute(
+        text(f"SELECT * FROM ({sql}) {where} ORDER BY rank, kind, id LIMIT :limit"), params
+    )
+
+    hits = []
+    for row in result:
+        _, columns = FTS_TABLES["machines_fts" if row.kind == "machine" else "maintenance_fts"]
+        # UNION ALL names columns after its first arm, so snippets are read by position
+        values = row[4:]
+        hits.append({
+            "kind": row.kind,
+            "id": row.id,
+            "machine_number": row.machine_number,
+            "rank": row.rank,
+            # Only the fields that actually matched
+            "highlights": {
+                column: value for column, value in zip(columns, values)
+                if value and HIGHLIGHT_OPEN in value
+            },
+            "month": None,
+        })
+    return hits
+
+
+async def _archived_hits(db: AsyncSession, match: str, terms: List[str], after: Optional[list], limit: int) -> List[dict]:
+    _, columns = FTS_TABLES["maintenance_fts"]
+    hits = []
+    while len(hits) < limit:
+        wanted = limit - len(hits)
+        rows = await archive.search_archived(db, match, after, wanted)
+        if not rows:
+            break
+        ids = {row.id for _, row in rows}
+        # A record caught in both tiers by an interrupted archive run is reported once, with the live records
+        live = set((await db.execute(
+            select(models.MaintenanceRecord.id).where(models.MaintenanceRecord.id.in_(ids))
+        )).scalars())
+        machine_ids = {row.machine_id for _, row in rows}
+        machine_numbers = dict((await db.execute(
+            select(models.Machine.id, models.Machine.machine_number).where(models.Machine.id.in_(machine_ids))
+        )).all())
+        for month, row in rows:
+            if row.id in live:
+                continue
+            highlights = {column: highlight(getattr(row, column), terms) for column in columns}
+            hits.append({
+                "kind": row.kind,
+                "id": row.id,
+                "machine_number": machine_numbers.get(row.machine_id),
+                "rank": row.rank,
+                "highlights": {column: value for column, value in highlights.items() if value},
+                "month": month,
+            })
+        if len(rows) < wanted:
+            break
+        month, row = rows[-1]
+        after = [month, row.rank, row.id]
+    return hits
+
+
+def hit_cursor(hit: dict) -> list:
+    return [hit["month"], hit["rank"], hit["kind"], hit["id"]]
+
+
+async def search(db: AsyncSession, q: str, kind: Optional[str], cursor: Optional[str], limit: int) -> List[dict]:
+    """Ranked hits across machines and maintenance records, best (lowest bm25) first.
+
+    Archived maintenance records come after every live hit, month by month, and
+    their files are searched only once the live hits run out. Returns up to
+    limit + 1 hits so the caller can tell whether another page exists.
+    """
+    if db.bind.dialect.name != "sqlite":
+        raise HTTPException(status_code=501, detail="Search requires SQLite FTS5")
+    match = match_expression(q)
+    if match is None:
+        return []
+
+    # A cursor names an archive month once paging has moved past the live hits
+    month, after = None, None
+    if cursor:
+        month, *after = decode_cursor(cursor, 4)
+        if month is not None and not isinstance(month, str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    hits = []
+    if month is None:
+        hits = await _live_hits(db, match, kind, after, limit + 1)
+    if len(hits) <= limit and kind in (None, "maintenance"):
+        archived_after = [month, after[0], after[2]] if month is not None else None
+        hits.extend(await _archived_hits(db, match, re.findall(r"\w+", q), archived_after, limit + 1 - len(hits)))
+    return hits
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    if sys.argv[1:] not in (["rebuild"], ["optimize"]):
+        print("usage: python search.py rebuild|optimize")
+        sys.exit(2)
+    with engine.begin() as connection:
+        maintain(connection, sys.argv[1])
+    print(f"Search index {sys.argv[1]} done")
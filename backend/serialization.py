@@ -0,0 +1,194 @@
+import enum
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, Request, Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy.orm import load_only
+import models
+import schemas
+
+try:
+    import orjson
+except ImportError:  # optional; pydantic-core's encoder is nearly as fast
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional; application/msgpack is only offered when installed
+    msgpack = None
+
+JSON = "application/json"
+# Field names once, then one array of values per row: {"fields": [...], "rows": [[...], ...]}
+COLUMNAR_JSON = "application/vnd.casino.columnar+json"
+MSGPACK = "application/msgpack"
+# Server preference among equally acceptable types; msgpack carries the columnar document too
+WIRE_FORMATS = ([MSGPACK] if msgpack is not None else []) + [COLUMNAR_JSON, JSON]
+
+# Opt-in: list endpoints select plain columns and encode them straight to bytes
+# instead of building and validating a schemas.Machine per row. The JSON is the
+# same either way and the OpenAPI schema still comes from response_model.
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "false").lower() in ("1", "true", "yes", "on")
+
+# Columns in schemas.Machine field order, so both paths emit identical documents
+MACHINE_COLUMNS = [models.Machine.__table__.c[name] for name in schemas.Machine.model_fields]
+
+MACHINE_FIELDS = tuple(schemas.Machine.model_fields)
+# Full responses only read the columns the schema serializes (not current_issue, for one)
+MACHINE_LOAD_ONLY = load_only(*(getattr(models.Machine, name) for name in MACHINE_FIELDS))
+
+_any_adapter = TypeAdapter(Any)
+
+
+def dumps(value) -> bytes:
+    """Encode plain dicts/lists holding datetimes and enums as compact JSON."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _any_adapter.dump_json(value)
+
+
+def dump_rows(rows: Iterable) -> bytes:
+    return dumps([row._asdict() for row in rows])
+
+
+def plain_value(value):
+    """msgpack/CSV fallback for values JSON encoders handle natively."""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def json_response(content: bytes, response: Response, media_type: str = JSON) -> Response:
+    # Returning a Response skips FastAPI's merge of headers set on the injected one
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def _accept_weights(accept: str) -> list:
+    weights = []
+    for part in accept.split(","):
+        media_range, *params = [item.strip() for item in part.split(";")]
+        weight = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    weight = float(param[2:])
+                except ValueError:
+                    weight = 0.0
+        if media_range:
+            weights.append((media_range.lower(), weight))
+    return weights
+
+
+def negotiate(request: Request, offered: List[str] = WIRE_FORMATS, default: str = JSON) -> str:
+    """The offered media type the Accept header ranks highest; ``default`` when none is acceptable.
+
+    Exact types beat type/* which beats */*, as in RFC 9110, and ties go to the
+    earlier entry in ``offered``. Types other than ``default`` must be named
+    explicitly.
+    """
+    accept = request.headers.get("accept")
+    if not accept:
+        return default
+    best, best_weight = default, 0.0
+    for media_type in offered:
+        weight, specificity = 0.0, -1
+        for media_range, range_weight in _accept_weights(accept):
+            if media_range == media_type:
+                rank = 2
+            elif media_range == media_type.split("/")[0] + "/*":
+                rank = 1
+            elif media_range == "*/*":
+                rank = 0
+            else:
+                continue
+            if rank > specificity:
+                weight, specificity = range_weight, rank
+        if specificity < 2 and media_type != default:
+            # Wildcards should not switch a client to a compact format it never asked for
+            continue
+        if weight > best_weight:
+            best, best_weight = media_type, weight
+    return best
+
+
+def representation(fields: Optional[Tuple[str, ...]], media_type: str) -> str:
+    """ETag variant for a field set and wire format; empty for the default representation."""
+    variant = ",".join(fields) if fields else ""
+    return variant if media_type == JSON else f"{variant}|{media_type}"
+
+
+def encode_columnar(fields: Iterable[str], rows: Iterable, media_type: str) -> bytes:
+    """Encode rows (sequences of values in ``fields`` order) as the columnar document."""
+    document = {"fields": list(fields), "rows": [list(row) for row in rows]}
+    if media_type == MSGPACK:
+        return msgpack.packb(document, default=plain_value)
+    return dumps(document)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+
+def encode_models(items: Iterable, schema: Type[BaseModel], media_type: str) -> bytes:
+    """Columnar encoding of ORM objects or models through ``schema``; nested models stay objects."""
+    adapter = _list_adapter(schema)
+    documents = adapter.dump_python(adapter.validate_python(list(items), from_attributes=True), mode="json")
+    fields = list(schema.model_fields)
+    return encode_columnar(fields, ([document[name] for name in fields] for document in documents), media_type)
+
+
+def machine_fields(
+    fields: Optional[str] = Query(
+        None, description=f"Comma-separated subset of: {', '.join(MACHINE_FIELDS)}; default all"
+    ),
+) -> Optional[Tuple[str, ...]]:
+    """Parse ?fields= into schema order, so equal sets share one cached model."""
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(MACHINE_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail=f"fields must be a comma-separated subset of: {', '.join(MACHINE_FIELDS)}",
+        )
+    return tuple(name for name in MACHINE_FIELDS if name in requested)
+
+
+def fieldset_columns(fields: Tuple[str, ...], required: Iterable[str] = ()) -> list:
+    """The columns to select: the requested fields plus what the endpoint needs for cursors and ETags."""
+    names = set(fields).union(required)
+    return [models.Machine.__table__.c[name] for name in MACHINE_FIELDS if name in names]
+
+
+@lru_cache(maxsize=256)
+def fieldset_model(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A copy of schemas.Machine holding only ``fields``."""
+    return create_model(
+        "Machine_" + "_".join(fields),
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schemas.Machine.model_fields[name].annotation, schemas.Machine.model_fields[name])
+           for name in fields},
+    )
+
+
+@lru_cache(maxsize=256)
+def _fieldset_adapter(fields: Tuple[str, ...], many: bool) -> TypeAdapter:
+    model = fieldset_model(fields)
+    return TypeAdapter(List[model] if many else model)
+
+
+def dump_fieldset(rows, fields: Tuple[str, ...], many: bool = True) -> bytes:
+    """Encode rows selected with fieldset_columns, leaving out the columns that were not requested."""
+    if FAST_SERIALIZATION:
+        if many:
+            return dumps([{name: row._mapping[name] for name in fields} for row in rows])
+        return dumps({name: rows._mapping[name] for name in fields})
+    adapter = _fieldset_adapter(fields, many)
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
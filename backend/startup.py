@@ -0,0 +1,132 @@
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import Column, MetaData, PrimaryKeyConstraint, String, Table, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import QueuePool
+import models
+
+# strict: refuse to start unless the database is at the alembic head; warn: log
+# and start anyway; off: skip the check
+SCHEMA_CHECK = os.getenv("SCHEMA_CHECK", "strict").lower()
+# Connections opened per pool at startup, so the first requests skip the connect-time PRAGMAs
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", "2"))
+
+VERSIONS_DIR = Path(__file__).resolve().parent / "alembic" / "versions"
+
+logger = logging.getLogger("casino.startup")
+
+# Same shape as the table alembic creates, without importing alembic at boot
+version_table = Table(
+    "alembic_version",
+    MetaData(),
+    Column("version_num", String(32), nullable=False),
+    PrimaryKeyConstraint("version_num", name="alembic_version_pkc"),
+)
+
+_REVISION = re.compile(r"^revision\b[^=]*=\s*['\"](\w+)['\"]", re.M)
+_DOWN_REVISION = re.compile(r"^down_revision\b[^=]*=\s*['\"](\w+)['\"]", re.M)
+
+
+def head_revision(versions_dir: Path = VERSIONS_DIR) -> str:
+    """The head of the (linear) migration history, read straight from the revision files.
+
+    Loading alembic's script directory costs more than the rest of the boot put together.
+    """
+    revisions, parents = set(), set()
+    for path in versions_dir.glob("*.py"):
+        source = path.read_text()
+        revisions.update(_REVISION.findall(source))
+        parents.update(_DOWN_REVISION.findall(source))
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise RuntimeError(f"Expected one alembic head, found {sorted(heads) or 'none'}")
+    return heads.pop()
+
+
+def stamp_head(connection):
+    """Record the head revision for a database built straight from the models."""
+    version_table.create(connection, checkfirst=True)
+    connection.execute(version_table.delete())
+    connection.execute(version_table.insert().values(version_num=head_revision()))
+
+
+def hot_statements() -> list:
+    # Same statements (and so the same compiled-cache keys) as login, token
+    # resolution and machine lookups; the empty key matches nothing
+    from serialization import MACHINE_LOAD_ONLY
+
+    return [
+        select(models.User).where(models.User.username == ""),
+        select(models.Machine).options(MACHINE_LOAD_ONLY).where(models.Machine.machine_number == ""),
+    ]
+
+
+async def current_revision(async_engine) -> Optional[str]:
+    async with async_engine.connect() as connection:
+        try:
+            return (await connection.execute(select(version_table.c.version_num))).scalar()
+        except DBAPIError:
+            # No alembic_version table: created by hand or by an old create_all
+            return None
+
+
+async def verify_schema(async_engine):
+    """Check the database revision once per worker instead of DDL-checking every table."""
+    if SCHEMA_CHECK == "off":
+        return
+    expected = head_revision()
+    current = await current_revision(async_engine)
+    if current == expected:
+        return
+    message = (
+        f"Database schema is at {current or 'no alembic revision'}, expected {expected}; "
+        "run `alembic upgrade head`, or `python init_db.py` for a new database"
+    )
+    if SCHEMA_CHECK == "warn":
+        logger.warning(message)
+        return
+    raise RuntimeError(message)
+
+
+def _warm_count(pool, count: int) -> int:
+    # In-memory SQLite pools hold a single connection
+    return min(count, pool.size()) if isinstance(pool, QueuePool) else min(count, 1)
+
+
+async def warm_async_pool(async_engine, count: int = DB_POOL_WARM):
+    """Check out count connections at once so the pool keeps that many open, and
+    compile the hot statements into the engine's statement cache."""
+    connections = []
+    try:
+        for _ in range(_warm_count(async_engine.pool, count)):
+            connections.append(await async_engine.connect())
+        for connection in connections:
+            for statement in hot_statements():
+                await connection.execute(statement)
+    except DBAPIError as exc:
+        # Only reachable with SCHEMA_CHECK relaxed; requests will surface the real problem
+        logger.warning("Skipped statement warm-up: %s", exc.orig)
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+def warm_pool(engine, count: int = DB_POOL_WARM):
+    """Sync counterpart of warm_async_pool; run it in a thread from async code."""
+    connections = []
+    try:
+        for _ in range(_warm_count(engine.pool, count)):
+            connections.append(engine.connect())
+        for connection in connections:
+            for statement in hot_statements():
+                connection.execute(statement)
+    except DBAPIError as exc:
+        # Only reachable with SCHEMA_CHECK relaxed; requests will surface the real problem
+        logger.warning("Skipped statement warm-up: %s", exc.orig)
+    finally:
+        for connection in connections:
+            connection.close()
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import analytics
+from database import engine
+
+
+def _row(client, auth_headers, path, vendor):
+    rows = client.get(path, params={"group_by": "vendor"}, headers=auth_headers).json()
+    return next((row for row in rows if row["group"] == vendor), None)
+
+
+def test_rollups_follow_machine_and_ticket_changes(client, auth_headers, make_machine, vendor, technician):
+    date_down = (datetime.now() - timedelta(hours=1)).isoformat()
+    machine = make_machine(date_down=date_down)
+    record = client.post(
+        f"/machines/{machine['machine_number']}/maintenance",
+        json={"technician_id": technician["id"], "issue_description": "no power"},
+        headers=auth_headers,
+    ).json()
+
+    open_row = _row(client, auth_headers, "/analytics/open", vendor)
+    assert open_row["down_machines"] == 1 and open_row["open_tickets"] == 1
+    assert open_row["mean_down_age_seconds"] == pytest.approx(3600, abs=60)
+
+    client.post(f"/maintenance/{record['id']}/resolve", json={"repair_description": "fuse"}, headers=auth_headers)
+    client.patch(f"/machines/{machine['machine_number']}", json={"status": "fixed"}, headers=auth_headers)
+
+    assert _row(client, auth_headers, "/analytics/open", vendor) is None
+    closed = _row(client, auth_headers, "/analytics/downtime", vendor)
+    assert closed["downtime_events"] == 1
+    assert closed["downtime_seconds"] == pytest.approx(3600, abs=60)
+    assert closed["repairs"] == 1 and closed["mttr_seconds"] is not None
+
+
+def test_rebuild_matches_the_incremental_rollups(client, auth_headers, make_machine, vendor):
+    machines = [make_machine(date_down=(datetime.now() - timedelta(minutes=30)).isoformat()) for _ in range(3)]
+    client.patch("/machines/bulk", json={
+        "machine_numbers": [machine["machine_number"] for machine in machines[:2]], "updates": {"status": "fixed"},
+    }, headers=auth_headers)
+    before = _row(client, auth_headers, "/analytics/downtime", vendor)
+    assert before["downtime_events"] == 2
+
+    with engine.begin() as connection:
+        analytics.rebuild(connection)
+    after = _row(client, auth_headers, "/analytics/downtime", vendor)
+    assert after["downtime_events"] == before["downtime_events"]
+    assert after["downtime_seconds"] == pytest.approx(before["downtime_seconds"], abs=5)
+    assert _row(client, auth_headers, "/analytics/open", vendor)["down_machines"] == 1
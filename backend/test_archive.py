@@ -0,0 +1,131 @@
+import json
+import uuid
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+
+import archive
+import models
+from database import engine
+
+
+def _old_resolved_record(client, auth_headers, make_machine, technician, issue, month=1):
+    machine = make_machine()
+    record = client.post(
+        f"/machines/{machine['machine_number']}/maintenance",
+        json={"technician_id": technician["id"], "issue_description": issue},
+        headers=auth_headers,
+    ).json()
+    client.post(f"/maintenance/{record['id']}/resolve", json={"repair_description": "replaced board"}, headers=auth_headers)
+    with engine.begin() as connection:
+        connection.execute(
+            update(models.MaintenanceRecord.__table__)
+            .where(models.MaintenanceRecord.id == record["id"])
+            .values(reported_time=datetime(2024, month, 5, 9), resolved_time=datetime(2024, month, 5, 11))
+        )
+    _open_record(client, auth_headers, make_machine(), technician, "newer ticket")
+    return machine, record
+
+
+def _open_record(client, auth_headers, machine, technician, issue):
+    return client.post(
+        f"/machines/{machine['machine_number']}/maintenance",
+        json={"technician_id": technician["id"], "issue_description": issue},
+        headers=auth_headers,
+    ).json()
+
+
+def _catalogued(month):
+    with engine.connect() as connection:
+        return connection.execute(select(archive.catalog_table.c.records).where(archive.catalog_table.c.month == month)).scalar()
+
+
+def test_archived_records_stay_readable(client, auth_headers, make_machine, technician):
+    word = "zq" + uuid.uuid4().hex[:10]
+    machine, record = _old_resolved_record(client, auth_headers, make_machine, technician, f"{word} in hopper")
+    before = _catalogued("2024-01") or 0
+
+    assert archive.archive_resolved(engine) >= 1
+    with engine.connect() as connection:
+        assert connection.execute(select(models.MaintenanceRecord).where(models.MaintenanceRecord.id == record["id"])).first() is None
+    assert _catalogued("2024-01") == before + 1
+
+    fetched = client.get(f"/maintenance/{record['id']}", headers=auth_headers)
+    assert fetched.status_code == 200
+    assert fetched.json()["repair_description"] == "replaced board"
+    assert client.post(f"/maintenance/{record['id']}/resolve", json={"repair_description": "x"}, headers=auth_headers).status_code == 409
+
+    history = client.get(f"/machines/{machine['machine_number']}/history", headers=auth_headers).json()
+    assert [item["id"] for item in history] == [record["id"]]
+
+    hits = client.get("/search", params={"q": word}, headers=auth_headers).json()
+    assert [(hit["kind"], hit["id"], hit["machine_number"]) for hit in hits] == [("maintenance", record["id"], machine["machine_number"])]
+
+    def exported(archived):
+        response = client.get("/export/maintenance", params={"format": "ndjson", "archived": archived}, headers=auth_headers)
+        return {json.loads(line)["id"] for line in response.text.splitlines()}
+    assert record["id"] in exported("true")
+    assert record["id"] not in exported("false")
+
+
+def test_search_reaches_the_archive_after_the_live_hits(client, auth_headers, make_machine, technician, monkeypatch):
+    word = "zq" + uuid.uuid4().hex[:10]
+    _, january = _old_resolved_record(client, auth_headers, make_machine, technician, f"{word} in hopper")
+    _, february = _old_resolved_record(client, auth_headers, make_machine, technician, f"{word} in hopper", month=2)
+    archive.archive_resolved(engine)
+    live = [make_machine(notes=f"{word} {index}")["id"] for index in range(2)]
+
+    searched = []
+    search_archived = archive.search_archived
+    async def counting(db, match, after, limit):
+        searched.append(after)
+        return await search_archived(db, match, after, limit)
+    monkeypatch.setattr(archive, "search_archived", counting)
+
+    seen, cursor = [], None
+    while True:
+        response = client.get("/search", params={"q": word, "limit": 1, **({"cursor": cursor} if cursor else {})}, headers=auth_headers)
+        seen += [(hit["kind"], hit["id"]) for hit in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    # Newest month first, after every live hit, whatever the archived ranks
+    assert seen[2:] == [("maintenance", february["id"]), ("maintenance", january["id"])]
+    assert sorted(hit_id for _, hit_id in seen[:2]) == sorted(live)
+    # The first page filled up from the live index alone
+    assert len(searched) == 3
+
+
+def test_rerun_moves_nothing_and_keeps_the_count(client, auth_headers, make_machine, technician):
+    _old_resolved_record(client, auth_headers, make_machine, technician, "coin jam")
+    archive.archive_resolved(engine)
+    count = _catalogued("2024-01")
+    assert archive.archive_resolved(engine) == 0
+    assert _catalogued("2024-01") == count
+
+
+def test_open_and_recent_records_stay_hot(client, auth_headers, make_machine, technician):
+    record = _open_record(client, auth_headers, make_machine(), technician, "still broken")
+    archive.archive_resolved(engine)
+    with engine.connect() as connection:
+        assert connection.execute(select(models.MaintenanceRecord).where(models.MaintenanceRecord.id == record["id"])).first()
+
+
+def test_proceed_stops_before_the_next_batch(client, auth_headers, make_machine, technician):
+    _old_resolved_record(client, auth_headers, make_machine, technician, "lost lease")
+    assert archive.archive_resolved(engine, proceed=lambda: False) == 0
+    assert archive.archive_resolved(engine) == 1
+
+
+def test_archived_ids_are_never_reused(client, auth_headers, make_machine, technician):
+    _, record = _old_resolved_record(client, auth_headers, make_machine, technician, "coin jam")
+    with engine.begin() as connection:
+        # The newer ticket is gone, so the old record now has the highest id
+        connection.execute(delete(models.MaintenanceRecord.__table__).where(models.MaintenanceRecord.id > record["id"]))
+    archive.archive_resolved(engine)
+    with engine.connect() as connection:
+        assert connection.execute(select(models.MaintenanceRecord).where(models.MaintenanceRecord.id == record["id"])).first()
+    newer = _open_record(client, auth_headers, make_machine(), technician, "jammed again")
+    assert newer["id"] == record["id"] + 1
+    assert archive.archive_resolved(engine) == 1
+    assert client.get(f"/maintenance/{record['id']}", headers=auth_headers).json()["issue_description"] == "coin jam"
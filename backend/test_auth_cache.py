@@ -0,0 +1,68 @@
+import time
+
+import auth
+import schemas
+from auth import USERS_CHANGED, PrincipalCache
+
+
+def _principal(username: str) -> schemas.User:
+    return schemas.User(id=1, username=username, email=f"{username}@example.com", is_active=True)
+
+
+def test_hit_and_miss():
+    cache = PrincipalCache(maxsize=4, ttl=60)
+    cache.put("t1", _principal("ann"))
+    assert cache.get("t1").username == "ann"
+    assert cache.get("t2") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_entries_expire_after_ttl_or_token_expiry(monkeypatch):
+    cache = PrincipalCache(maxsize=4, ttl=5)
+    now = time.monotonic()
+    cache.put("long", _principal("ann"))
+    # A token that expires in one second is cached for one second, not for the TTL
+    cache.put("short", _principal("bob"), token_exp=time.time() + 1)
+    monkeypatch.setattr(auth.time, "monotonic", lambda: now + 2)
+    assert cache.get("long") is not None
+    assert cache.get("short") is None
+    monkeypatch.setattr(auth.time, "monotonic", lambda: now + 6)
+    assert cache.get("long") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PrincipalCache(maxsize=2, ttl=60)
+    cache.put("a", _principal("ann"))
+    cache.put("b", _principal("bob"))
+    cache.get("a")
+    cache.put("c", _principal("cat"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_invalidation_drops_every_token_of_the_user():
+    cache = PrincipalCache(maxsize=8, ttl=60)
+    cache.put("a1", _principal("ann"))
+    cache.put("a2", _principal("ann"))
+    cache.put("b1", _principal("bob"))
+    cache.invalidate_user("ann")
+    assert cache.get("a1") is None and cache.get("a2") is None
+    assert cache.get("b1") is not None
+
+
+def test_broker_events_evict_users_changed_elsewhere():
+    cache = PrincipalCache(maxsize=8, ttl=60)
+    cache.put("a1", _principal("ann"))
+    cache.apply_events([{"type": "machines.updated"}, {"type": USERS_CHANGED, "usernames": ["ann"]}])
+    assert cache.get("a1") is None
+
+
+def test_deactivation_takes_effect_on_the_next_request(client, auth_headers, make_user):
+    username, _, token = make_user()
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me/", headers=headers).status_code == 200
+    assert client.get("/users/me/", headers=headers).status_code == 200
+
+    response = client.patch(f"/users/{username}", json={"is_active": False}, headers=auth_headers)
+    assert response.status_code == 200
+    assert client.get("/users/me/", headers=headers).status_code == 400
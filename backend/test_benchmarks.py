@@ -0,0 +1,41 @@
+import sqlite3
+from argparse import Namespace
+
+from benchmarks import bench_load
+
+TOLERANCES = Namespace(latency_tolerance=0.3, throughput_tolerance=0.3)
+
+
+def _phase(p95_ms=10.0, throughput_rps=100.0, queries_per_request=2.0, errors=0) -> dict:
+    return {"p95_ms": p95_ms, "throughput_rps": throughput_rps, "queries_per_request": queries_per_request, "errors": errors}
+
+
+def test_percentile_is_nearest_rank():
+    ordered = list(range(1, 101))
+    assert bench_load.percentile(ordered, 50) == 50
+    assert bench_load.percentile(ordered, 95) == 95
+    assert bench_load.percentile([7], 99) == 7
+
+
+def test_compare_flags_regressions_only_past_tolerance():
+    baseline = {"results": {"list": {"sequential": _phase()}}}
+    assert bench_load.compare({"list": {"sequential": _phase(p95_ms=12.9, throughput_rps=71)}}, baseline, TOLERANCES) == []
+    failures = bench_load.compare(
+        {"list": {"sequential": _phase(p95_ms=14, throughput_rps=60, queries_per_request=3, errors=1)}},
+        baseline, TOLERANCES,
+    )
+    assert len(failures) == 4
+    # A scenario missing from the baseline is only checked for errors
+    assert bench_load.compare({"new": {"sequential": _phase(p95_ms=999)}}, baseline, TOLERANCES) == []
+
+
+def test_seed_is_deterministic(tmp_path):
+    def dump(path):
+        with sqlite3.connect(path) as connection:
+            return connection.execute("SELECT machine_number, vendor, status, date_down, location FROM machines").fetchall()
+
+    first, second = str(tmp_path / "a.db"), str(tmp_path / "b.db")
+    counts = bench_load.seed_database(first, 0.0002)
+    bench_load.seed_database(second, 0.0002)
+    assert counts == {"machines": 20, "maintenance_records": 200, "users": 1}
+    assert dump(first) == dump(second)
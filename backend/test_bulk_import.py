@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import json
+
+from bulk_import import NOT_UTF8, iter_csv_rows, iter_ndjson_rows
+
+_numbers = itertools.count(1)
+
+
+def _rows(iterator, body: bytes, chunk_size: int = 7):
+    async def chunks():
+        for start in range(0, len(body), chunk_size):
+            yield body[start:start + chunk_size]
+
+    async def collect():
+        return [row async for row in iterator(chunks())]
+    return asyncio.run(collect())
+
+
+def _machine(vendor: str, **values) -> dict:
+    number = next(_numbers)
+    return {"machine_number": f"B-{number}", "serial_number": f"BSN-{number}", "vendor": vendor, **values}
+
+
+def _import(client, auth_headers, body: bytes, content_type: str):
+    return client.post("/machines/bulk", content=body, headers={**auth_headers, "content-type": content_type})
+
+
+def test_csv_rows_across_chunk_boundaries():
+    body = '﻿machine_number,notes\r\nM1,"two\nlines"\r\nM2,\r\nM3,a,b\r\n'.encode()
+    assert _rows(iter_csv_rows, body) == [
+        (1, {"machine_number": "M1", "notes": "two\nlines"}),
+        (2, {"machine_number": "M2"}),
+        (3, "expected 2 fields, got 3"),
+    ]
+
+
+def test_quotes_follow_the_csv_rules():
+    body = (
+        'machine_number,notes\n'
+        'M1,27" screen\n'
+        'M2,"say ""hi""\n""there"", then\n\nleave"\n'
+        'M3,"a",\n'
+    ).encode()
+    assert _rows(iter_csv_rows, body, chunk_size=5) == [
+        (1, {"machine_number": "M1", "notes": '27" screen'}),
+        (2, {"machine_number": "M2", "notes": 'say "hi"\n"there", then\n\nleave'}),
+        (3, "expected 2 fields, got 3"),
+    ]
+
+
+def test_unterminated_quote():
+    assert _rows(iter_csv_rows, b'machine_number\n"M1\n') == [(1, "unterminated quoted field")]
+
+
+def test_ndjson_rows():
+    body = b'{"machine_number": "M1"}\n\n[1]\nnot json\n{"machine_number": "caf\xe9"}\n'
+    rows = _rows(iter_ndjson_rows, body)
+    assert rows[0] == (1, {"machine_number": "M1"})
+    assert rows[1] == (2, "expected a JSON object")
+    assert rows[2][1].startswith("invalid JSON")
+    assert rows[3] == (4, NOT_UTF8)
+
+
+def test_ndjson_import_reports_bad_rows(client, auth_headers, vendor):
+    existing = _machine(vendor)
+    assert _import(client, auth_headers, json.dumps(existing).encode(), "application/x-ndjson").json()["inserted"] == 1
+
+    good = _machine(vendor)
+    lines = [
+        json.dumps(good).encode(),
+        json.dumps({**_machine(vendor), "machine_number": good["machine_number"]}).encode(),
+        json.dumps({"machine_number": "B-nope"}).encode(),
+        json.dumps({**_machine(vendor), "machine_number": existing["machine_number"]}).encode(),
+        b'{"machine_number": "caf\xe9"}',
+    ]
+    result = _import(client, auth_headers, b"\n".join(lines), "application/x-ndjson").json()
+    assert result["inserted"] == 1
+    assert result["failed"] == 4
+    errors = {error["row"]: error["error"] for error in result["errors"]}
+    assert errors[2] == "duplicate machine_number in file"
+    assert "vendor" in errors[3]
+    assert errors[4] == "machine_number already exists"
+    assert errors[5] == NOT_UTF8
+
+    listed = client.get("/machines/", params={"vendor": vendor}, headers=auth_headers).json()
+    assert {machine["machine_number"] for machine in listed} == {existing["machine_number"], good["machine_number"]}
+
+
+def test_csv_import(client, auth_headers, vendor):
+    rows = [_machine(vendor) for _ in range(3)]
+    body = "machine_number,serial_number,vendor,notes\n" + "".join(
+        f'{row["machine_number"]},{row["serial_number"]},{row["vendor"]},"by CSV, quoted"\n' for row in rows
+    )
+    result = _import(client, auth_headers, body.encode(), "text/csv").json()
+    assert result == {"inserted": 3, "failed": 0, "errors": [], "errors_truncated": False}
+    listed = client.get("/machines/", params={"vendor": vendor}, headers=auth_headers).json()
+    assert [machine["notes"] for machine in listed] == ["by CSV, quoted"] * 3
+
+
+def test_imported_locations_are_parsed(client, auth_headers, vendor, zone):
+    rows = [_machine(vendor, location=f"{zone}, Bank {bank}, 1") for bank in "AAB"]
+    body = "machine_number,serial_number,vendor,location\n" + "".join(
+        f'{row["machine_number"]},{row["serial_number"]},{row["vendor"]},"{row["location"]}"\n' for row in rows
+    )
+    assert _import(client, auth_headers, body.encode(), "text/csv").json()["inserted"] == 3
+    listed = client.get("/machines/", params={"zone": zone, "bank": "A"}, headers=auth_headers).json()
+    assert len(listed) == 2
+
+
+def test_non_utf8_csv_header_is_400(client, auth_headers):
+    response = _import(client, auth_headers, b"machine_n\xfamber,vendor\nM1,Acme\n", "text/csv")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "file is not UTF-8"
+
+
+def test_unknown_content_type_is_415(client, auth_headers):
+    assert _import(client, auth_headers, b"{}", "application/json").status_code == 415
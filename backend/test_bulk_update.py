@@ -0,0 +1,41 @@
+def _bulk(client, auth_headers, body):
+    return client.patch("/machines/bulk", json=body, headers=auth_headers)
+
+
+def test_status_change_by_filter(client, auth_headers, make_machine, vendor):
+    bank = [make_machine() for _ in range(3)]
+    other = make_machine(vendor=f"{vendor} Other")
+    response = _bulk(client, auth_headers, {
+        "filter": {"vendor": vendor, "status": "down"},
+        "updates": {"status": "in_progress"},
+        "return_rows": True,
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert result["updated"] == 3
+    assert {machine["machine_number"] for machine in result["machines"]} == {m["machine_number"] for m in bank}
+    assert {machine["status"] for machine in result["machines"]} == {"in_progress"}
+
+    untouched = client.get(f"/machines/{other['machine_number']}", headers=auth_headers).json()
+    assert untouched["status"] == "down"
+
+
+def test_by_machine_numbers_without_rows(client, auth_headers, make_machine):
+    machines = [make_machine() for _ in range(2)]
+    result = _bulk(client, auth_headers, {
+        "machine_numbers": [machine["machine_number"] for machine in machines] + ["no-such-machine"],
+        "updates": {"notes": "checked"},
+    }).json()
+    assert result == {"updated": 2, "machines": None}
+
+
+def test_location_change_rederives_floor_columns(client, auth_headers, make_machine):
+    machine = make_machine()
+    _bulk(client, auth_headers, {"machine_numbers": [machine["machine_number"]], "updates": {"location": "Area 9, Row Q, 4"}})
+    moved = client.get(f"/machines/{machine['machine_number']}", headers=auth_headers).json()
+    assert (moved["zone"], moved["bank"], moved["position"]) == ("9", "Q", "4")
+
+
+def test_needs_updates_and_a_target(client, auth_headers):
+    assert _bulk(client, auth_headers, {"machine_numbers": ["x"], "updates": {}}).status_code == 400
+    assert _bulk(client, auth_headers, {"updates": {"status": "fixed"}}).status_code == 400
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+import database
+from database import to_async_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./casino.db", "sqlite+aiosqlite:///./casino.db"),
+    ("postgresql://u:p@db/casino", "postgresql+asyncpg://u:p@db/casino"),
+    ("postgres://u:p@db/casino", "postgresql+asyncpg://u:p@db/casino"),
+    ("mysql+aiomysql://u:p@db/casino", "mysql+aiomysql://u:p@db/casino"),
+])
+def test_async_url(url, expected):
+    assert to_async_url(url) == expected
+
+
+def test_async_session_shares_the_sync_database():
+    async def read():
+        async for db in database.get_async_db():
+            return (await db.execute(text("SELECT username FROM users WHERE username = 'admin'"))).scalar()
+
+    assert asyncio.run(read()) == "admin"
+
+
+def test_sqlite_profile_is_applied_to_new_connections():
+    with database.engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.settings.sqlite_busy_timeout_ms
+
+
+def test_engine_kwargs(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    monkeypatch.setenv("SQLITE_CACHE_SIZE_KIB", "1024")
+    settings = database.DatabaseSettings.from_env()
+    file_kwargs = settings.engine_kwargs("sqlite:///./casino.db")
+    assert file_kwargs["pool_size"] == 7
+    assert file_kwargs["connect_args"] == {"check_same_thread": False}
+    assert "pool_size" not in settings.engine_kwargs("sqlite://")
+    assert "PRAGMA cache_size=-1024" in settings.sqlite_pragmas()
+    assert "connect_args" not in settings.engine_kwargs("postgresql://u:p@db/casino")
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+import events
+from events import EVICTED, Broker, EventHub, LocalBroker, SQLiteBroker
+
+
+async def _next(subscriber, timeout=2):
+    return await asyncio.wait_for(subscriber.get(), timeout)
+
+
+def test_local_broker_fans_out_to_every_subscriber():
+    async def scenario():
+        hub = EventHub()
+        await hub.start(LocalBroker())
+        first, second = hub.subscribe(), hub.subscribe()
+        hub.publish([{"type": "machine.updated"}])
+        received = await _next(first), await _next(second)
+        hub.unsubscribe(second)
+        subscribers = hub.stats()["subscribers"]
+        await hub.stop()
+        return received, subscribers
+
+    received, subscribers = asyncio.run(scenario())
+    assert received == ({"type": "machine.updated"}, {"type": "machine.updated"})
+    assert subscribers == 1
+
+
+def test_internal_events_reach_listeners_only():
+    async def scenario():
+        hub = EventHub()
+        heard = []
+        hub.add_listener(heard.extend)
+        await hub.start(LocalBroker())
+        subscriber = hub.subscribe()
+        hub.publish([{"type": events.INTERNAL_PREFIX + "x"}, {"type": "machine.updated"}])
+        received = await _next(subscriber)
+        await hub.stop()
+        return heard, received
+
+    heard, received = asyncio.run(scenario())
+    assert [item["type"] for item in heard] == [events.INTERNAL_PREFIX + "x", "machine.updated"]
+    assert received == {"type": "machine.updated"}
+
+
+def test_slow_subscriber_is_evicted():
+    hub = EventHub(queue_size=2)
+    slow = hub.subscribe()
+    hub.dispatch([{"type": "a"}, {"type": "b"}, {"type": "c"}])
+    assert slow.evicted and slow not in hub.subscribers
+    assert slow.queue.get_nowait() == EVICTED
+    assert hub.stats()["evictions"] == 1
+
+
+def test_sqlite_broker_carries_events_between_workers(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "events.db")
+        first, second = EventHub(), EventHub()
+        await first.start(SQLiteBroker(path, poll_seconds=0.01))
+        await second.start(SQLiteBroker(path, poll_seconds=0.01))
+        mine, theirs = first.subscribe(), second.subscribe()
+        first.publish([{"type": "machine.updated", "machine_number": "M1"}])
+        received = await _next(theirs), await _next(mine)
+        await asyncio.sleep(0.05)
+        # The publisher skips its own rows when tailing
+        duplicate = mine.queue.qsize()
+        await first.stop()
+        await second.stop()
+        return received, duplicate
+
+    received, duplicate = asyncio.run(scenario())
+    assert [item["machine_number"] for item in received] == ["M1", "M1"]
+    assert duplicate == 0
+
+
+def test_tail_keeps_polling_after_errors(tmp_path):
+    async def scenario():
+        hub = EventHub()
+        broker = SQLiteBroker(str(tmp_path / "events.db"), poll_seconds=0.01)
+        await hub.start(broker)
+        other = SQLiteBroker(str(tmp_path / "events.db"))
+        await other.start(EventHub())
+        read, failures = broker._read, []
+
+        def flaky_read():
+            if len(failures) < 2:
+                failures.append(1)
+                raise RuntimeError("database is locked")
+            return read()
+        broker._read = flaky_read
+        subscriber = hub.subscribe()
+        await other.publish([{"type": "machine.created"}])
+        received = await _next(subscriber)
+        await other.stop()
+        await hub.stop()
+        return received, len(failures)
+
+    assert asyncio.run(scenario()) == ({"type": "machine.created"}, 2)
+
+
+def test_broker_is_abstract():
+    with pytest.raises(TypeError):
+        Broker()
+
+
+def test_websocket_receives_committed_changes(client, tokens, make_machine):
+    with client.websocket_connect(f"/machines/stream?token={tokens['access_token']}") as websocket:
+        machine = make_machine()
+        item = websocket.receive_json()
+    assert item["type"] == "machine.created"
+    assert item["machine_number"] == machine["machine_number"]
@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+import export
+
+
+def test_csv_export(client, auth_headers, make_machine):
+    machine = make_machine(notes='says "hi", twice')
+    response = client.get("/export/machines", params={"format": "csv"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="machines.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert list(rows[0]) == [column.key for column in export.MACHINE_EXPORT_COLUMNS]
+    exported = next(row for row in rows if row["machine_number"] == machine["machine_number"])
+    assert exported["notes"] == 'says "hi", twice'
+    assert exported["status"] == "down"
+
+
+def test_ndjson_export_spans_batches(client, auth_headers, make_machine, vendor, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    numbers = {make_machine()["machine_number"] for _ in range(5)}
+    response = client.get("/export/machines", params={"format": "ndjson"}, headers=auth_headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert {row["machine_number"] for row in rows if row["vendor"] == vendor} == numbers
+    assert len({row["id"] for row in rows}) == len(rows)
+
+
+def test_ndjson_export_by_accept_header(client, auth_headers, make_machine):
+    machine = make_machine()
+    response = client.get("/export/machines", headers={**auth_headers, "Accept": "application/x-ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert machine["machine_number"] in {row["machine_number"] for row in rows}
+
+
+def test_columnar_export_spans_batches(client, auth_headers, make_machine, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    for _ in range(5):
+        make_machine()
+    document = client.get("/export/machines", params={"format": "columnar"}, headers=auth_headers).json()
+    assert document["fields"] == [column.key for column in export.MACHINE_EXPORT_COLUMNS]
+    assert len(document["rows"]) >= 5
+    assert all(len(row) == len(document["fields"]) for row in document["rows"])
+
+
+def test_unknown_format_is_rejected(client, auth_headers):
+    assert client.get("/export/machines", params={"format": "xml"}, headers=auth_headers).status_code == 422
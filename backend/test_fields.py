@@ -0,0 +1,32 @@
+def test_list_returns_only_the_requested_fields(client, auth_headers, make_machine, vendor):
+    for _ in range(3):
+        make_machine()
+    params = {"vendor": vendor, "fields": "status, machine_number", "limit": 2}
+    response = client.get("/machines/", params=params, headers=auth_headers)
+    assert response.status_code == 200
+    assert all(set(machine) == {"machine_number", "status"} for machine in response.json())
+
+    # The cursor is built from columns the client did not ask for
+    rest = client.get("/machines/", params={**params, "cursor": response.headers["x-next-cursor"]}, headers=auth_headers)
+    numbers = [machine["machine_number"] for machine in response.json() + rest.json()]
+    assert len(set(numbers)) == 3
+
+
+def test_detail_fields(client, auth_headers, make_machine):
+    machine = make_machine(notes="hello")
+    response = client.get(f"/machines/{machine['machine_number']}", params={"fields": "notes"}, headers=auth_headers)
+    assert response.json() == {"notes": "hello"}
+    full = client.get(f"/machines/{machine['machine_number']}", headers=auth_headers)
+    assert full.headers["etag"] != response.headers["etag"]
+
+
+def test_unknown_field_is_400(client, auth_headers):
+    response = client.get("/machines/", params={"fields": "machine_number,password"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert client.get("/machines/", params={"fields": ","}, headers=auth_headers).status_code == 400
+
+
+def test_each_fieldset_has_its_own_etag(client, auth_headers):
+    full = client.get("/machines/", headers=auth_headers).headers["etag"]
+    sparse = client.get("/machines/", params={"fields": "machine_number"}, headers=auth_headers).headers["etag"]
+    assert full != sparse
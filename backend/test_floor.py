@@ -0,0 +1,94 @@
+import math
+import random
+
+import pytest
+
+import floor
+import models
+from floor import FloorMap, parse_location
+
+DOWN = models.MachineStatus.DOWN
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("High Limit, Bank C, 7", ("High Limit", "C", "7")),
+    ("Zone 3 Bank 12", ("3", "12", None)),
+    ("Zone 3 Bank 12 Seat 4", ("3", "12", "4")),
+    ("Area 2 / Row B / 15", ("2", "B", "15")),
+    ("Main Floor - Bank 4", ("Main Floor", "4", None)),
+    ("North Wing, Smoking, Bank 9", ("North Wing / Smoking", "9", None)),
+    ("Pos: 5", (None, None, "5")),
+    ("", (None, None, None)),
+    (None, (None, None, None)),
+])
+def test_parse_location(location, expected):
+    assert parse_location(location) == expected
+
+
+def _machine(number, x, y, status=DOWN, zone="Z", bank="B"):
+    return {"machine_number": number, "status": status, "zone": zone, "bank": bank, "position": None,
+            "floor_x": x, "floor_y": y}
+
+
+def test_nearest_matches_a_full_scan():
+    rng = random.Random(7)
+    floor_map = FloorMap(cell=10)
+    machines = [_machine(f"M{i}", rng.uniform(0, 500), rng.uniform(0, 300)) for i in range(400)]
+    for machine in machines:
+        floor_map.place(machine)
+    for _ in range(25):
+        x, y = rng.uniform(-50, 550), rng.uniform(-50, 350)
+        expected = sorted(machines, key=lambda m: math.hypot(m["floor_x"] - x, m["floor_y"] - y))[:5]
+        assert [m["machine_number"] for m in floor_map.nearest(x, y, DOWN, 5)] == [m["machine_number"] for m in expected]
+
+
+def test_moves_update_counts_and_cells():
+    floor_map = FloorMap(cell=10)
+    floor_map.place(_machine("M1", 5, 5))
+    floor_map.place(_machine("M1", 95, 95, status=models.MachineStatus.FIXED, zone="Y"))
+    assert [zone["zone"] for zone in floor_map.zones()] == ["Y"]
+    assert floor_map.nearest(0, 0, DOWN, 5) == []
+    floor_map.remove("M1")
+    assert floor_map.zones() == []
+
+
+def test_zone_endpoints(client, auth_headers, make_machine, zone):
+    make_machine(location=f"{zone}, Bank A, 1")
+    make_machine(location=f"{zone}, Bank A, 2", status="fixed")
+    make_machine(location=f"{zone}, Bank B, 1")
+    entry = client.get(f"/floor/zones/{zone}", headers=auth_headers).json()
+    assert entry["counts"] == {"down": 2, "in_progress": 0, "fixed": 1, "total": 3}
+    assert [(bank["bank"], bank["counts"]["total"]) for bank in entry["banks"]] == [("A", 2), ("B", 1)]
+    assert zone in {item["zone"] for item in client.get("/floor/zones", headers=auth_headers).json()}
+    assert client.get("/floor/zones/no-such-zone", headers=auth_headers).status_code == 404
+
+    listed = client.get("/machines/", params={"zone": zone, "bank": "A"}, headers=auth_headers).json()
+    assert len(listed) == 2
+
+
+def test_nearest_endpoint(client, auth_headers, make_machine):
+    # Far from every other test's machines
+    near = make_machine(floor_x=100_000, floor_y=100_000)
+    far = make_machine(floor_x=100_030, floor_y=100_040)
+    make_machine(floor_x=100_001, floor_y=100_000, status="fixed")
+    params = {"x": 100_002, "y": 100_000, "max_distance": 100}
+    found = client.get("/floor/nearest", params=params, headers=auth_headers).json()
+    assert [(m["machine_number"], round(m["distance"], 3)) for m in found] == [
+        (near["machine_number"], 2.0), (far["machine_number"], round(math.hypot(28, 40), 3)),
+    ]
+
+    client.patch(f"/machines/{near['machine_number']}", json={"floor_x": 200_000}, headers=auth_headers)
+    found = client.get("/floor/nearest", params=params, headers=auth_headers).json()
+    assert [m["machine_number"] for m in found] == [far["machine_number"]]
+
+
+def test_rebuild_reparses_locations(make_machine, zone):
+    from sqlalchemy import select, update
+    from database import engine
+
+    machine = make_machine(location=f"{zone}, Bank A, 1")
+    with engine.begin() as connection:
+        connection.execute(update(models.Machine.__table__).where(models.Machine.id == machine["id"]).values(zone=None))
+        assert floor.rebuild(connection) >= 1
+        zone = connection.execute(select(models.Machine.zone).where(models.Machine.id == machine["id"])).scalar()
+    assert zone == machine["zone"]
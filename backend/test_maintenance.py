@@ -0,0 +1,53 @@
+def _open(client, auth_headers, machine, technician, issue):
+    response = client.post(
+        f"/machines/{machine['machine_number']}/maintenance",
+        json={"technician_id": technician["id"], "issue_description": issue},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_history_pages_newest_first(client, auth_headers, make_machine, technician):
+    machine = make_machine()
+    opened = [_open(client, auth_headers, machine, technician, f"issue {index}") for index in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/machines/{machine['machine_number']}/history", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert all(record["technician"]["id"] == technician["id"] for record in page)
+        assert all(record["machine"]["machine_number"] == machine["machine_number"] for record in page)
+        seen += [record["id"] for record in page]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert seen == [record["id"] for record in reversed(opened)]
+
+
+def test_resolve_and_filter(client, auth_headers, make_machine, technician):
+    machine = make_machine()
+    record = _open(client, auth_headers, machine, technician, "reel stuck")
+    response = client.post(f"/maintenance/{record['id']}/resolve", json={"repair_description": "freed reel"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["is_resolved"] is True
+    again = client.post(f"/maintenance/{record['id']}/resolve", json={"repair_description": "x"}, headers=auth_headers)
+    assert again.status_code == 409
+
+    history = f"/machines/{machine['machine_number']}/history"
+    assert [r["id"] for r in client.get(history, params={"is_resolved": True}, headers=auth_headers).json()] == [record["id"]]
+    assert client.get(history, params={"is_resolved": False}, headers=auth_headers).json() == []
+    assert client.get(f"/maintenance/{record['id']}", headers=auth_headers).json()["repair_description"] == "freed reel"
+
+
+def test_unknown_machine_or_technician(client, auth_headers, make_machine):
+    assert client.get("/machines/no-such-machine/history", headers=auth_headers).status_code == 404
+    machine = make_machine()
+    response = client.post(
+        f"/machines/{machine['machine_number']}/maintenance",
+        json={"technician_id": 999999, "issue_description": "x"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 404
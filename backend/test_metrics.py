@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def _samples(metric, prefix):
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in metric.samples() if line.startswith(prefix)}
+
+
+def test_metric_needs_samples():
+    with pytest.raises(TypeError):
+        metrics.Metric("m", "help")
+
+
+def test_counter_and_histogram_text(registry):
+    counter = metrics.Counter("jobs_total", "Jobs", ("outcome",))
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    histogram = metrics.Histogram("wait_seconds", "Wait", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    text_lines = metrics.render().splitlines()
+    assert "# TYPE jobs_total counter" in text_lines
+    assert 'jobs_total{outcome="ok"} 3' in text_lines
+    assert _samples(histogram, "wait_seconds") == {
+        'wait_seconds_bucket{le="0.1"}': 1, 'wait_seconds_bucket{le="1.0"}': 2, 'wait_seconds_bucket{le="+Inf"}': 3,
+        "wait_seconds_sum": 5.55, "wait_seconds_count": 3,
+    }
+
+
+def test_parameter_shape_hides_values():
+    assert metrics.parameter_shape({"password": "hunter2", "id": 3}, False) == "{password: str, id: int}"
+    assert metrics.parameter_shape([("a", 1), ("b", 2)], True) == "2 x (str, int)"
+
+
+def test_engine_statements_and_pool_are_recorded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'm.db'}")
+    metrics.instrument_engine(engine, "test")
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        assert metrics.POOL_CHECKED_OUT.collect()[("test",)] == 1
+    assert metrics.POOL_CHECKED_OUT.collect()[("test",)] == 0
+    assert _samples(metrics.STATEMENT_SECONDS, "db_statement_duration_seconds_count")[
+        'db_statement_duration_seconds_count{engine="test",operation="SELECT"}'] >= 1
+    assert metrics.POOL_CONNECTIONS_OPENED.values[("test",)] == 1
+    # One engine.connect(), one timed acquire
+    assert sum(metrics.POOL_WAIT_SECONDS.series[("test",)][:-1]) == 1
+    engine.dispose()
+
+
+def test_middleware_reports_repeated_statements(tmp_path, monkeypatch, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'n.db'}")
+    metrics.instrument_engine(engine, "n1")
+    monkeypatch.setattr(metrics, "N_PLUS_ONE_THRESHOLD", 3)
+
+    async def app(scope, receive, send):
+        with engine.connect() as connection:
+            for _ in range(4):
+                connection.execute(text("SELECT 1"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "route": type("Route", (), {"path": "/loop"})()}
+    before = metrics.N_PLUS_ONE.values.get(("GET", "/loop"), 0)
+    asyncio.run(metrics.MetricsMiddleware(app)(scope, None, send))
+    assert metrics.N_PLUS_ONE.values[("GET", "/loop")] == before + 1
+    assert "possible N+1 on GET /loop" in caplog.text
+    engine.dispose()
+
+
+def test_metrics_endpoint_is_off_by_default(client):
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+from passlib.hash import bcrypt
+
+import auth
+
+
+def test_verify_runs_on_the_hash_pool():
+    hashed = auth.get_password_hash("Secret123")
+    assert asyncio.run(auth.verify_password_async("Secret123", hashed)) == (True, None)
+    assert asyncio.run(auth.verify_password_async("wrong", hashed)) == (False, None)
+
+
+def test_hash_with_other_cost_is_replaced_on_verify():
+    old = bcrypt.using(rounds=auth.BCRYPT_ROUNDS + 1).hash("Secret123")
+    valid, new_hash = asyncio.run(auth.verify_password_async("Secret123", old))
+    assert valid
+    assert new_hash is not None and auth.pwd_context().verify("Secret123", new_hash)
+    assert not auth.pwd_context().needs_update(new_hash)
+
+
+def test_login_is_shed_when_the_hash_pool_is_full(client, monkeypatch):
+    monkeypatch.setattr(auth, "_hash_slots", threading.BoundedSemaphore(1))
+    auth._hash_slots.acquire()
+    response = client.post("/token", data={"username": "admin", "password": "admin123"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
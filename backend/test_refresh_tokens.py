@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+import refresh_tokens
+from database import engine
+from refresh_tokens import token_hash, tokens_table
+
+
+def _login(client, username, password):
+    response = client.post("/token", data={"username": username, "password": password})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _refresh(client, token):
+    return client.post("/token/refresh", json={"refresh_token": token})
+
+
+def test_rotation_issues_a_new_pair(client, make_user):
+    username, password, _ = make_user()
+    first = _login(client, username, password)
+    response = _refresh(client, first["refresh_token"])
+    assert response.status_code == 200
+    second = response.json()
+    assert second["refresh_token"] != first["refresh_token"]
+    me = client.get("/users/me/", headers={"Authorization": f"Bearer {second['access_token']}"})
+    assert me.json()["username"] == username
+
+
+def test_reuse_revokes_the_whole_family(client, make_user):
+    username, password, _ = make_user()
+    stolen = _login(client, username, password)["refresh_token"]
+    current = _refresh(client, stolen).json()["refresh_token"]
+
+    assert _refresh(client, stolen).status_code == 401
+    # The legitimate device is logged out too
+    assert _refresh(client, current).status_code == 401
+    # Other logins are separate families
+    assert _refresh(client, _login(client, username, password)["refresh_token"]).status_code == 200
+
+
+def test_logout_and_session_revocation(client, auth_headers, make_user):
+    username, password, _ = make_user()
+    token = _login(client, username, password)["refresh_token"]
+    assert client.post("/token/revoke", json={"refresh_token": token}).status_code == 204
+    assert _refresh(client, token).status_code == 401
+    assert client.post("/token/revoke", json={"refresh_token": "unknown"}).status_code == 204
+
+    tokens = [_login(client, username, password)["refresh_token"] for _ in range(2)]
+    assert client.delete(f"/users/{username}/sessions", headers=auth_headers).json() == {"revoked": 2}
+    assert all(_refresh(client, token).status_code == 401 for token in tokens)
+
+
+def test_deactivation_revokes_refresh_tokens(client, auth_headers, make_user):
+    username, password, _ = make_user()
+    token = _login(client, username, password)["refresh_token"]
+    client.patch(f"/users/{username}", json={"is_active": False}, headers=auth_headers)
+    assert _refresh(client, token).status_code == 401
+
+
+def test_expired_tokens_are_refused_and_pruned(client, make_user):
+    username, password, _ = make_user()
+    tokens = [_login(client, username, password)["refresh_token"] for _ in range(3)]
+    hashes = [token_hash(token) for token in tokens]
+    with engine.begin() as connection:
+        connection.execute(
+            update(tokens_table).where(tokens_table.c.token_hash.in_(hashes))
+            .values(expires_at=datetime.utcnow() - timedelta(minutes=1))
+        )
+    assert _refresh(client, tokens[0]).status_code == 401
+
+    # A worker that lost the scheduler lease stops before the next batch
+    answers = iter([True, False])
+    assert refresh_tokens.prune_expired(engine, batch_size=2, proceed=lambda: next(answers)) == 2
+    assert refresh_tokens.prune_expired(engine, batch_size=2) >= 1
+    with engine.connect() as connection:
+        assert connection.execute(select(tokens_table.c.id).where(tokens_table.c.token_hash.in_(hashes))).all() == []
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+import escalations
+import models
+from database import SessionLocal, engine
+from scheduler import LEASE, Cron, Scheduler, leases_table
+from versioning import MACHINES
+
+machines_table = models.Machine.__table__
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    ("*/15 * * * *", datetime(2026, 3, 1, 10, 7, 30), datetime(2026, 3, 1, 10, 15)),
+    ("*/15 * * * *", datetime(2026, 3, 1, 10, 45), datetime(2026, 3, 1, 11, 0)),
+    ("30 2 * * *", datetime(2026, 3, 1, 2, 30), datetime(2026, 3, 2, 2, 30)),
+    ("0 9 * * 1-5", datetime(2026, 10, 16, 9, 0), datetime(2026, 10, 19, 9, 0)),  # Friday to Monday
+    ("0 0 * * 7", datetime(2026, 10, 18, 12, 0), datetime(2026, 10, 25, 0, 0)),  # 7 is Sunday
+    ("0 0 29 2 *", datetime(2026, 3, 1), datetime(2028, 2, 29, 0, 0)),
+    ("0 0 13 * 5", datetime(2026, 10, 14), datetime(2026, 10, 16, 0, 0)),  # either day field fires
+    ("0 12 31 12 *", datetime(2026, 12, 31, 11, 59), datetime(2026, 12, 31, 12, 0)),
+])
+def test_cron_next_after(expression, moment, expected):
+    assert Cron(expression).next_after(moment) == expected
+
+
+@pytest.mark.parametrize("expression", ["* * * *", "60 * * * *", "* * 0 * *", "*/0 * * * *", "0 0 31 2 *"])
+def test_cron_rejects_bad_expressions(expression):
+    with pytest.raises(ValueError):
+        Cron(expression)
+
+
+@pytest.fixture
+def lease():
+    yield
+    with engine.begin() as connection:
+        connection.execute(delete(leases_table).where(leases_table.c.name == LEASE))
+
+
+def test_one_worker_leads_until_its_lease_expires(lease):
+    async def scenario():
+        first, second = Scheduler(lease_seconds=0.5), Scheduler(lease_seconds=0.5)
+        await first._acquire()
+        await second._acquire()
+        elected = [first.is_leader, second.is_leader]
+        await asyncio.sleep(0.6)
+        await second._acquire()
+        await first._acquire()
+        return elected, [first.is_leader, second.is_leader]
+
+    assert asyncio.run(scenario()) == ([True, False], [False, True])
+
+
+def test_released_lease_is_taken_at_once(lease):
+    async def scenario():
+        first, second = Scheduler(lease_seconds=60), Scheduler(lease_seconds=60)
+        await first._acquire()
+        await first._release()
+        await second._acquire()
+        return first.is_leader, second.is_leader
+
+    assert asyncio.run(scenario()) == (False, True)
+
+
+def test_deposed_leader_gives_up_its_runs(lease):
+    started, stopped = threading.Event(), threading.Event()
+
+    async def scenario():
+        scheduler = Scheduler(lease_seconds=0.6, concurrency=2)
+
+        def batches():
+            started.set()
+            while scheduler.still_leading():
+                threading.Event().wait(0.01)
+            stopped.set()
+
+        async def waiting():
+            await asyncio.sleep(60)
+
+        threaded = scheduler.add("batches", batches, every=0.05, jitter=0)
+        coroutine = scheduler.add("waiting", waiting, every=0.05, jitter=0)
+        await scheduler.start()
+        for _ in range(100):
+            if started.is_set() and coroutine.run is not None:
+                break
+            await asyncio.sleep(0.02)
+        # Another worker takes the lease over
+        with engine.begin() as connection:
+            connection.execute(update(leases_table).where(leases_table.c.name == LEASE)
+                               .values(holder="elsewhere", expires_at=datetime.utcnow() + timedelta(minutes=5)))
+        await asyncio.to_thread(stopped.wait, 2)
+        await asyncio.sleep(0.05)
+        # The thread finished its batch; the coroutine was cancelled mid-run
+        state = scheduler.is_leader, threaded.runs, coroutine.runs, coroutine.run
+        await scheduler.stop()
+        return state
+
+    is_leader, threaded_runs, coroutine_runs, coroutine_run = asyncio.run(scenario())
+    assert stopped.is_set() and not is_leader
+    assert threaded_runs == 1 and coroutine_runs == 0 and coroutine_run is None
+
+
+def _make_machine(number: str, down_for: timedelta, status=models.MachineStatus.DOWN) -> int:
+    # Through the ORM, so the floor summary stays in step
+    with SessionLocal() as db:
+        machine = models.Machine(machine_number=number, serial_number=f"SN-{number}", vendor="Acme",
+                                 location="Escalation Floor, Bank A, 1", status=status,
+                                 date_down=datetime.now() - down_for)
+        db.add(machine)
+        db.commit()
+        return machine.id
+
+
+def _row(machine_id: int):
+    with engine.connect() as connection:
+        return connection.execute(select(machines_table).where(machines_table.c.id == machine_id)).one()
+
+
+def _version() -> int:
+    with engine.connect() as connection:
+        return connection.execute(
+            select(models.SyncVersion.version).where(models.SyncVersion.name == MACHINES)
+        ).scalar()
+
+
+def test_overdue_machines_are_escalated_once():
+    overdue = _make_machine("ESC-1", timedelta(hours=3))
+    recent = _make_machine("ESC-2", timedelta(minutes=5))
+
+    escalated = asyncio.run(escalations.escalate_overdue_down(sla_minutes=60))
+    assert "ESC-1" in escalated and "ESC-2" not in escalated
+    row = _row(overdue)
+    assert row.escalation == escalations.DOWN_SLA and row.escalated_at is not None
+    assert row.row_version == _version()
+    assert _row(recent).escalation is None
+
+    # Nothing new to escalate: no version is taken
+    before = _version()
+    assert asyncio.run(escalations.escalate_overdue_down(sla_minutes=60)) == []
+    assert _version() == before
+
+
+def test_status_change_clears_the_escalation(client, auth_headers):
+    machine_id = _make_machine("ESC-3", timedelta(hours=3))
+    asyncio.run(escalations.escalate_overdue_down(sla_minutes=60))
+    assert _row(machine_id).escalation == escalations.DOWN_SLA
+
+    response = client.patch("/machines/ESC-3", json={"notes": "parts ordered"}, headers=auth_headers)
+    assert response.status_code == 200 and response.json()["escalation"] == escalations.DOWN_SLA
+    response = client.patch("/machines/ESC-3", json={"status": "in_progress"}, headers=auth_headers)
+    assert response.json()["escalation"] is None and response.json()["escalated_at"] is None
+
+
+def test_bulk_update_clears_escalations_only_where_status_changes(client, auth_headers):
+    changed = _make_machine("ESC-4", timedelta(hours=3))
+    kept = _make_machine("ESC-5", timedelta(hours=3), status=models.MachineStatus.FIXED)
+    asyncio.run(escalations.escalate_overdue_down(sla_minutes=60))
+    with engine.begin() as connection:
+        connection.execute(update(machines_table).where(machines_table.c.id == kept)
+                           .values(escalation=escalations.DOWN_SLA))
+
+    body = {"machine_numbers": ["ESC-4", "ESC-5"], "updates": {"status": "fixed"}}
+    response = client.patch("/machines/bulk", json=body, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert _row(changed).escalation is None
+    assert _row(kept).escalation == escalations.DOWN_SLA
@@ -0,0 +1,65 @@
+import uuid
+
+from search import HIGHLIGHT_CLOSE, HIGHLIGHT_OPEN, highlight, match_expression
+
+
+def _word() -> str:
+    return "zq" + uuid.uuid4().hex[:10]
+
+
+def _search(client, auth_headers, q, **params):
+    response = client.get("/search", params={"q": q, **params}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_match_expression_quotes_terms():
+    assert match_expression('coin OR "hopper') == '"coin" "OR" "hopper"*'
+    assert match_expression("!!") is None
+
+
+def test_highlight():
+    assert highlight("the bill validator jams", ["valid"]) == f"the bill {HIGHLIGHT_OPEN}validator{HIGHLIGHT_CLOSE} jams"
+    assert highlight("nothing here", ["valid"]) is None
+
+
+def test_notes_issues_and_repairs_are_searchable(client, auth_headers, make_machine, technician):
+    word = _word()
+    machine = make_machine(notes=f"door sensor {word} flaky")
+    record = client.post(
+        f"/machines/{machine['machine_number']}/maintenance",
+        json={"technician_id": technician["id"], "issue_description": f"{word} tripped"},
+        headers=auth_headers,
+    ).json()
+
+    hits = _search(client, auth_headers, word).json()
+    assert {(hit["kind"], hit["id"]) for hit in hits} == {("machine", machine["id"]), ("maintenance", record["id"])}
+    assert all(hit["machine_number"] == machine["machine_number"] for hit in hits)
+    notes = next(hit for hit in hits if hit["kind"] == "machine")["highlights"]["notes"]
+    assert f"{HIGHLIGHT_OPEN}{word}{HIGHLIGHT_CLOSE}" in notes
+
+    only = _search(client, auth_headers, word, kind="maintenance").json()
+    assert [hit["id"] for hit in only] == [record["id"]]
+    # The last term matches as a prefix, for search-as-you-type
+    assert len(_search(client, auth_headers, word[:-3]).json()) == 2
+
+
+def test_index_follows_updates(client, auth_headers, make_machine):
+    old, new = _word(), _word()
+    machine = make_machine(notes=old)
+    client.patch(f"/machines/{machine['machine_number']}", json={"notes": new}, headers=auth_headers)
+    assert _search(client, auth_headers, old).json() == []
+    assert [hit["id"] for hit in _search(client, auth_headers, new).json()] == [machine["id"]]
+
+
+def test_results_page_by_cursor(client, auth_headers, make_machine):
+    word = _word()
+    ids = {make_machine(notes=f"{word} {index}")["id"] for index in range(5)}
+    seen, cursor = [], None
+    while True:
+        response = _search(client, auth_headers, word, limit=2, **({"cursor": cursor} if cursor else {}))
+        seen += [hit["id"] for hit in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(ids)
@@ -0,0 +1,29 @@
+import json
+from datetime import datetime
+
+import models
+import serialization
+
+
+def test_dumps_handles_datetimes_and_enums():
+    value = {"at": datetime(2026, 1, 2, 3, 4, 5), "status": models.MachineStatus.IN_PROGRESS}
+    assert json.loads(serialization.dumps(value)) == {"at": "2026-01-02T03:04:05", "status": "in_progress"}
+
+
+def test_fast_list_matches_the_model_path(client, auth_headers, make_machine, vendor, monkeypatch):
+    for _ in range(3):
+        make_machine(notes="n")
+    params = {"vendor": vendor}
+    expected = client.get("/machines/", params=params, headers=auth_headers).json()
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", True)
+    fast = client.get("/machines/", params=params, headers=auth_headers)
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == expected
+
+
+def test_fast_export_matches_the_default_export(client, auth_headers, make_machine, monkeypatch):
+    make_machine()
+    expected = client.get("/export/machines", params={"format": "ndjson"}, headers=auth_headers).text
+    monkeypatch.setattr(serialization, "FAST_SERIALIZATION", True)
+    fast = client.get("/export/machines", params={"format": "ndjson"}, headers=auth_headers).text
+    assert [json.loads(line) for line in fast.splitlines()] == [json.loads(line) for line in expected.splitlines()]
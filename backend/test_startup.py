@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import init_db
+import startup
+
+
+def _alembic_head() -> str:
+    return ScriptDirectory.from_config(init_db.alembic_config()).get_current_head()
+
+
+def test_head_revision_reads_the_migration_files(tmp_path):
+    assert startup.head_revision() == _alembic_head()
+    (tmp_path / "a.py").write_text("revision = 'a'\ndown_revision = None\n")
+    (tmp_path / "b.py").write_text("revision = 'b'\ndown_revision = 'a'\n")
+    (tmp_path / "c.py").write_text("revision = 'c'\ndown_revision = 'a'\n")
+    with pytest.raises(RuntimeError, match="one alembic head"):
+        startup.head_revision(tmp_path)
+
+
+def test_verify_schema(tmp_path, monkeypatch, caplog):
+    async def verify(url):
+        engine = create_async_engine(url)
+        try:
+            await startup.verify_schema(engine)
+        finally:
+            await engine.dispose()
+
+    empty = f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}"
+    with pytest.raises(RuntimeError, match="no alembic revision"):
+        asyncio.run(verify(empty))
+    monkeypatch.setattr(startup, "SCHEMA_CHECK", "warn")
+    asyncio.run(verify(empty))
+    assert f"expected {_alembic_head()}" in caplog.text
+
+    stamped = tmp_path / "stamped.db"
+    with create_engine(f"sqlite:///{stamped}").begin() as connection:
+        startup.stamp_head(connection)
+    monkeypatch.setattr(startup, "SCHEMA_CHECK", "strict")
+    asyncio.run(verify(f"sqlite+aiosqlite:///{stamped}"))
+
+
+def test_migrations_reach_the_models(tmp_path, monkeypatch):
+    from alembic import command
+
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    command.upgrade(init_db.alembic_config(), "head")
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        assert init_db.schema_differences(connection) == []
+    engine.dispose()
+
+
+def test_location_backfill_versions_every_row(tmp_path, monkeypatch):
+    from alembic import command
+
+    url = f"sqlite:///{tmp_path / 'backfill.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    command.upgrade(init_db.alembic_config(), "0009")
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO machines (machine_number, serial_number, vendor, status, date_down, location) "
+            "VALUES ('M1', 'S1', 'Acme', 'DOWN', '2026-01-01 00:00:00', 'High Limit, Bank C, 7')"
+        ))
+        # A counter row lost to a hand edit must not leave the backfilled rows unversioned
+        connection.execute(text("DELETE FROM sync_versions"))
+    command.upgrade(init_db.alembic_config(), "0010")
+    with engine.connect() as connection:
+        row = connection.execute(text("SELECT zone, bank, position, row_version FROM machines")).one()
+        version = connection.execute(text("SELECT version FROM sync_versions WHERE name = 'machines'")).scalar()
+    engine.dispose()
+    assert tuple(row) == ("High Limit", "C", "7", 1)
+    assert version == 1
+
+
+def test_init_db_keeps_existing_data(client, auth_headers, make_machine):
+    machine = make_machine()
+    init_db.init_db()
+    assert client.get(f"/machines/{machine['machine_number']}", headers=auth_headers).status_code == 200
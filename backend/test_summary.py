@@ -0,0 +1,43 @@
+from sqlalchemy import update
+
+import analytics
+from database import engine
+
+
+def _counts(client, auth_headers, vendor):
+    summary = client.get("/machines/summary", headers=auth_headers).json()
+    return summary["by_vendor"].get(vendor)
+
+
+def _reconcile() -> int:
+    with engine.begin() as connection:
+        return analytics.reconcile_status_counts(connection)
+
+
+def test_summary_follows_every_kind_of_write(client, auth_headers, make_machine, vendor):
+    first, second = make_machine(), make_machine()
+    make_machine(status="fixed")
+    assert _counts(client, auth_headers, vendor) == {"down": 2, "in_progress": 0, "fixed": 1, "total": 3}
+
+    client.patch(f"/machines/{first['machine_number']}", json={"status": "in_progress"}, headers=auth_headers)
+    assert _counts(client, auth_headers, vendor) == {"down": 1, "in_progress": 1, "fixed": 1, "total": 3}
+
+    client.patch("/machines/bulk", json={"filter": {"vendor": vendor}, "updates": {"status": "fixed"}}, headers=auth_headers)
+    assert _counts(client, auth_headers, vendor) == {"down": 0, "in_progress": 0, "fixed": 3, "total": 3}
+
+    client.delete(f"/machines/{second['machine_number']}", headers=auth_headers)
+    assert _counts(client, auth_headers, vendor)["total"] == 2
+    assert _reconcile() == 0
+
+
+def test_reconcile_repairs_drift(client, auth_headers, make_machine, vendor):
+    make_machine()
+    with engine.begin() as connection:
+        connection.execute(
+            update(analytics.status_table)
+            .where(analytics.status_table.c.vendor == vendor)
+            .values(machines=analytics.status_table.c.machines + 5)
+        )
+    assert _reconcile() == 1
+    analytics.floor_summary.invalidate()
+    assert _counts(client, auth_headers, vendor) == {"down": 1, "in_progress": 0, "fixed": 0, "total": 1}
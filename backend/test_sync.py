@@ -0,0 +1,56 @@
+def _changes(client, auth_headers, since, limit=1000):
+    response = client.get("/machines/changes", params={"since": since, "limit": limit}, headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_changes_carry_writes_and_deletes(client, auth_headers, make_machine):
+    since = _changes(client, auth_headers, 0)["version"]
+    kept, dropped = make_machine(), make_machine()
+    client.patch(f"/machines/{kept['machine_number']}", json={"notes": "seen"}, headers=auth_headers)
+    assert client.delete(f"/machines/{dropped['machine_number']}", headers=auth_headers).status_code == 204
+
+    delta = _changes(client, auth_headers, since)
+    assert delta["version"] > since
+    changed = {machine["machine_number"]: machine for machine in delta["machines"]}
+    assert changed[kept["machine_number"]]["notes"] == "seen"
+    assert dropped["machine_number"] not in changed
+    assert dropped["machine_number"] in {tombstone["machine_number"] for tombstone in delta["deleted"]}
+
+    # Caught up: nothing new until the next write
+    assert _changes(client, auth_headers, delta["version"]) == {
+        "version": delta["version"], "machines": [], "deleted": [], "has_more": False,
+    }
+
+
+def test_pages_never_split_a_version(client, auth_headers, make_machine):
+    machines = [make_machine() for _ in range(3)]
+    since = _changes(client, auth_headers, 0)["version"]
+    client.patch("/machines/bulk", json={
+        "machine_numbers": [machine["machine_number"] for machine in machines], "updates": {"notes": "bulk"},
+    }, headers=auth_headers)
+    page = _changes(client, auth_headers, since, limit=1)
+    assert len(page["machines"]) == 3
+    assert _changes(client, auth_headers, page["version"])["machines"] == []
+
+
+def test_machine_list_revalidates_with_304(client, auth_headers, make_machine):
+    machine = make_machine()
+    first = client.get("/machines/", headers=auth_headers)
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+    assert client.get("/machines/", headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+
+    client.patch(f"/machines/{machine['machine_number']}", json={"notes": "changed"}, headers=auth_headers)
+    changed = client.get("/machines/", headers={**auth_headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_machine_detail_revalidates_with_304(client, auth_headers, make_machine):
+    number = make_machine()["machine_number"]
+    etag = client.get(f"/machines/{number}", headers=auth_headers).headers["etag"]
+    assert client.get(f"/machines/{number}", headers={**auth_headers, "If-None-Match": f"W/{etag}"}).status_code == 304
+
+    client.patch(f"/machines/{number}", json={"notes": "changed"}, headers=auth_headers)
+    assert client.get(f"/machines/{number}", headers={**auth_headers, "If-None-Match": etag}).status_code == 200
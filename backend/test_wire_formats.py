@@ -0,0 +1,84 @@
+import pytest
+from starlette.requests import Request
+
+import compression
+import serialization
+from compression import accepted_encoding, decoded_etag, encoded_etag
+
+COLUMNAR = serialization.COLUMNAR_JSON
+needs_brotli = pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+
+
+def _request(accept):
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())] if accept else []})
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, serialization.JSON),
+    ("*/*", serialization.JSON),
+    (f"{COLUMNAR}", COLUMNAR),
+    (f"application/json;q=0.5, {serialization.MSGPACK}", serialization.MSGPACK),
+    (f"{COLUMNAR};q=0.2, application/json", serialization.JSON),
+    ("application/*", serialization.JSON),
+    ("text/html", serialization.JSON),
+])
+def test_negotiate(accept, expected):
+    assert serialization.negotiate(_request(accept)) == expected
+
+
+@pytest.mark.parametrize("header, expected", [
+    pytest.param("gzip, br", "br", marks=needs_brotli),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip;q=0.5", "gzip"),
+    ("identity", None),
+    pytest.param("*", "br", marks=needs_brotli),
+])
+def test_accepted_encoding(header, expected):
+    assert accepted_encoding(header) == expected
+
+
+def test_etag_encoding_suffix_round_trip():
+    assert encoded_etag(b'"abc"', "gzip") == b'"abc-gzip"'
+    assert decoded_etag('"abc-br"') == '"abc"'
+    assert decoded_etag('"1-5-0a1b2c3d"') == '"1-5-0a1b2c3d"'
+
+
+def test_columnar_and_msgpack_lists(client, auth_headers, make_machine, vendor):
+    msgpack = pytest.importorskip("msgpack")
+    machine = make_machine()
+    params = {"vendor": vendor, "fields": "machine_number,status"}
+    columnar = client.get("/machines/", params=params, headers={**auth_headers, "Accept": COLUMNAR})
+    assert columnar.headers["content-type"] == COLUMNAR
+    assert columnar.json() == {"fields": ["machine_number", "status"], "rows": [[machine["machine_number"], "down"]]}
+
+    packed = client.get("/machines/", params=params, headers={**auth_headers, "Accept": serialization.MSGPACK})
+    assert msgpack.unpackb(packed.content) == columnar.json()
+    assert packed.headers["etag"] != columnar.headers["etag"]
+
+
+def test_large_bodies_are_compressed_and_tagged(client, auth_headers, make_machine, vendor):
+    for _ in range(10):
+        make_machine(notes="x" * 200)
+    params = {"vendor": vendor}
+    plain = client.get("/machines/", params=params, headers={**auth_headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    for encoding in ("gzip", "br") if compression.brotli is not None else ("gzip",):
+        response = client.get("/machines/", params=params, headers={**auth_headers, "Accept-Encoding": encoding})
+        assert response.headers["content-encoding"] == encoding
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.json() == plain.json()
+        etag = response.headers["etag"]
+        assert etag == plain.headers["etag"][:-1] + f'-{encoding}"'
+
+        revalidated = client.get("/machines/", params=params,
+                                 headers={**auth_headers, "Accept-Encoding": encoding, "If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == etag
+
+
+def test_small_bodies_are_not_compressed(client, auth_headers, make_machine):
+    machine = make_machine()
+    response = client.get(f"/machines/{machine['machine_number']}", params={"fields": "status"},
+                          headers={**auth_headers, "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert not response.headers["etag"].endswith('-gzip"')
@@ -0,0 +1,68 @@
+import asyncio
+import itertools
+
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+
+import models
+import schemas
+from writes import WritePipeline
+
+_numbers = itertools.count(1)
+
+
+def _insert(machine_number: str):
+    async def operation(session):
+        machine = models.Machine(machine_number=machine_number, serial_number=f"W{next(_numbers)}", vendor="Acme")
+        session.add(machine)
+        return machine
+    return operation
+
+
+async def _not_found(session):
+    raise HTTPException(status_code=404, detail="Machine not found")
+
+
+def _run(operations):
+    async def scenario():
+        pipeline = WritePipeline(max_batch=16, window_ms=0)
+        await pipeline.start()
+        results = await asyncio.gather(
+            *(pipeline.submit(operation, schemas.Machine) for operation in operations), return_exceptions=True
+        )
+        await pipeline.stop()
+        return pipeline, results
+    return asyncio.run(scenario())
+
+
+def test_concurrent_writes_share_a_commit():
+    numbers = [f"W-{next(_numbers)}" for _ in range(8)]
+    pipeline, results = _run([_insert(number) for number in numbers])
+    assert [result.machine_number for result in results] == numbers
+    assert all(result.id is not None and result.row_version for result in results)
+    assert pipeline.writes == 8
+    assert pipeline.batches < 8
+
+
+def test_a_failing_write_does_not_fail_the_batch():
+    number = f"W-{next(_numbers)}"
+    # The second insert reuses the number: the batch fails on flush and is retried write by write
+    pipeline, results = _run([_insert(number), _not_found, _insert(number), _insert(f"W-{next(_numbers)}")])
+    assert results[0].machine_number == number
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 404
+    assert isinstance(results[2], IntegrityError)
+    assert isinstance(results[3], schemas.Machine)
+    assert pipeline.retried_batches == 1
+
+
+def test_stop_drains_queued_writes():
+    async def scenario():
+        pipeline = WritePipeline(window_ms=0)
+        await pipeline.start()
+        pending = [asyncio.ensure_future(pipeline.submit(_insert(f"W-{next(_numbers)}"), schemas.Machine)) for _ in range(3)]
+        await asyncio.sleep(0)
+        await pipeline.stop()
+        return [future.result() for future in pending], pipeline.running
+
+    results, running = asyncio.run(scenario())
+    assert len(results) == 3 and not running
@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+from compression import decoded_etag
+
+MACHINES = "machines"
+
+sync_versions = models.SyncVersion.__table__
+
+
+def next_version(connection, name: str = MACHINES) -> Tuple[int, datetime]:
+    """Bump and return the change counter for ``name`` inside the caller's transaction."""
+    now = datetime.utcnow()
+    version = connection.execute(
+        update(sync_versions)
+        .where(sync_versions.c.name == name)
+        .values(version=sync_versions.c.version + 1, updated_at=now)
+        .returning(sync_versions.c.version)
+    ).scalar()
+    if version is None:
+        version = 1
+        connection.execute(insert(sync_versions).values(name=name, version=version, updated_at=now))
+    return version, now
+
+
+async def next_version_async(db: AsyncSession, name: str = MACHINES) -> Tuple[int, datetime]:
+    return await db.run_sync(lambda session: next_version(session.connection(), name))
+
+
+async def current_version(db: AsyncSession, name: str = MACHINES) -> Tuple[int, Optional[datetime]]:
+    result = await db.execute(
+        select(sync_versions.c.version, sync_versions.c.updated_at).where(sync_versions.c.name == name)
+    )
+    row = result.first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+# Every ORM write to a machine gets a fresh row_version, and deletes leave a
+# tombstone, so /machines/changes can serve deltas. Core statements that bypass
+# the ORM (bulk import/update) call next_version themselves.
+@event.listens_for(Session, "before_flush")
+def _stamp_machine_versions(session, flush_context, instances):
+    changed = [obj for obj in session.new if isinstance(obj, models.Machine)]
+    changed += [
+        obj for obj in session.dirty
+        if isinstance(obj, models.Machine) and session.is_modified(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, models.Machine)]
+    if not changed and not deleted:
+        return
+
+    version, now = next_version(session.connection())
+    for machine in changed:
+        machine.row_version = version
+        machine.updated_at = now
+    for machine in deleted:
+        session.add(models.MachineTombstone(
+            machine_number=machine.machine_number, row_version=version, deleted_at=now
+        ))
+
+
+def http_date(value: datetime) -> str:
+    # Timestamps are stored as naive UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def list_etag(version: int, request: Request, variant: str = "") -> str:
+    # Same table version + same query (+ same negotiated format) = byte-identical list response
+    query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{version}?{query}{variant}".encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def machine_etag(machine, variant: str = "") -> str:
+    # A sparse fieldset or another wire format is a different representation of the same version
+    suffix = f"-{hashlib.sha1(variant.encode()).hexdigest()[:8]}" if variant else ""
+    return f'"{machine.id}-{machine.row_version or 0}{suffix}"'
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    # no-cache lets browsers keep the body but revalidate it on every poll
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, ignoring the encoding suffix CompressionMiddleware adds
+    candidates = [decoded_etag(tag.strip().removeprefix("W/")) for tag in header.split(",")]
+    return etag in candidates
+
+
+async def machine_changes(db: AsyncSession, since: int, limit: int) -> dict:
+    """Machines and tombstones with row_version > since, cut at a version boundary."""
+    Machine = models.Machine
+    Tombstone = models.MachineTombstone
+    # Read the counter first so rows committed afterwards wait for the next poll
+    upto, _ = await current_version(db)
+    result = await db.execute(
+        select(Machine)
+        .where(Machine.row_version > since, Machine.row_version <= upto)
+        .order_by(Machine.row_version, Machine.id)
+        .limit(limit + 1)
+    )
+    machines = result.scalars().all()
+    has_more = len(machines) > limit
+    if has_more:
+        # Never split one version across pages, or the client would skip its tail
+        cutoff = machines[limit].row_version
+        machines = [machine for machine in machines[:limit] if machine.row_version < cutoff]
+        if not machines:
+            result = await db.execute(
+                select(Machine).where(Machine.row_version == cutoff).order_by(Machine.id)
+            )
+            machines = result.scalars().all()
+        upto = machines[-1].row_version
+
+    result = await db.execute(
+        select(Tombstone.machine_number, Tombstone.row_version)
+        .where(Tombstone.row_version > since, Tombstone.row_version <= upto)
+        .order_by(Tombstone.row_version)
+    )
+    return {
+        "version": max(upto, since),
+        "machines": machines,
+        "deleted": result.all(),
+        "has_more": has_more,
+    }
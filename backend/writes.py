@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+import metrics
+
+# Off by default: writes commit in the request's own transaction
+WRITE_PIPELINE = os.getenv("WRITE_PIPELINE", "false").lower() in ("1", "true", "yes", "on")
+WRITE_BATCH_MAX = int(os.getenv("WRITE_BATCH_MAX", "64"))
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WRITE_BATCH_WINDOW_MS", "2"))
+
+logger = logging.getLogger("casino.writes")
+
+# Loads and changes rows in the session it is given, and returns the row to answer
+# with. It must raise (e.g. a 404) before changing anything, and may run twice.
+Operation = Callable[[AsyncSession], Awaitable[object]]
+
+
+class PendingWrite:
+    __slots__ = ("operation", "schema", "future")
+
+    def __init__(self, operation: Operation, schema: Type[BaseModel], future: asyncio.Future):
+        self.operation = operation
+        self.schema = schema
+        self.future = future
+
+    def resolve(self, result=None, error: Optional[BaseException] = None):
+        # The caller may have given up (client disconnect) in the meantime
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+
+class WritePipeline:
+    """Group commit for small writes: one task applies queued operations and commits them together.
+
+    Every operation is flushed on its own, so row versions, rollups and events stay
+    per write, but a batch shares one transaction and one commit, and writers no
+    longer queue on SQLite's lock. Callers are answered only after the commit.
+    A batch that fails is rolled back and each operation retried in its own
+    transaction, so one bad write cannot take the others down with it.
+    """
+
+    def __init__(self, max_batch: int = WRITE_BATCH_MAX, window_ms: float = WRITE_BATCH_WINDOW_MS):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.writes = 0
+        self.retried_batches = 0
+        self.last_batch_size = 0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish everything already queued, then stop."""
+        if self.task is None:
+            return
+        self.queue.put_nowait(None)
+        await self.task
+        self.task = None
+
+    async def submit(self, operation: Operation, schema: Type[BaseModel]) -> BaseModel:
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait(PendingWrite(operation, schema, future))
+        return await future
+
+    async def _collect(self) -> Tuple[List[PendingWrite], bool]:
+        """Wait for a write and gather what has queued behind it; returns (batch, stopping)."""
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        # Only hold the batch open while writes are actually arriving together, so a
+        # lone writer pays no extra latency
+        if self.window > 0 and self.last_batch_size > 1 and self.queue.qsize() < self.max_batch - 1:
+            await asyncio.sleep(self.window)
+        while len(batch) < self.max_batch and not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if not batch:
+                continue
+            try:
+                await self._apply(batch)
+            except Exception:
+                logger.exception("write pipeline batch failed")
+                for item in batch:
+                    item.resolve(error=RuntimeError("write failed"))
+
+    async def _apply(self, batch: List[PendingWrite]):
+        batch = [item for item in batch if not item.future.done()]
+        if not batch:
+            return
+        self.last_batch_size = len(batch)
+        metrics.WRITE_BATCH_SIZE.observe(len(batch))
+        outcomes = []
+        try:
+            async with AsyncSessionLocal() as session:
+                for item in batch:
+                    try:
+                        row = await item.operation(session)
+                    except Exception as exc:
+                        if session.new or session.dirty or session.deleted:
+                            raise
+                        outcomes.append((item, None, exc))
+                        continue
+                    await session.flush()
+                    outcomes.append((item, item.schema.model_validate(row), None))
+                await session.commit()
+        except Exception as exc:
+            logger.warning("write batch of %d failed (%s); retrying each write alone", len(batch), exc)
+            self.retried_batches += 1
+            for item in batch:
+                await self._apply_one(item)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for item, result, error in outcomes:
+            item.resolve(result, error)
+
+    async def _apply_one(self, item: PendingWrite):
+        try:
+            async with AsyncSessionLocal() as session:
+                row = await item.operation(session)
+                await session.commit()
+                result = item.schema.model_validate(row)
+        except Exception as exc:
+            item.resolve(error=exc)
+            return
+        self.writes += 1
+        item.resolve(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.running,
+            "batches": self.batches,
+            "writes": self.writes,
+            "retried_batches": self.retried_batches,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+        }
+
+
+async def commit(db: AsyncSession, operation: Operation, schema: Type[BaseModel]) -> BaseModel:
+    """Apply ``operation`` and commit it, through the pipeline when it is running.
+
+    The answer is built from the flushed row; INSERTs fetch generated values with
+    RETURNING and sessions keep attributes on commit, so no refresh query is needed.
+    """
+    if pipeline.running:
+        # Hand the request's connection back first: the writer draws from the same
+        # pool, and requests parked on it must not hold every connection
+        await db.close()
+        return await pipeline.submit(operation, schema)
+    row = await operation(db)
+    await db.commit()
+    return schema.model_validate(row)
+
+
+pipeline = WritePipeline()
@@ -4,7 +4,7 @@ import { LoginForm } from './components/LoginForm';
 import { CreateAccountForm } from './components/CreateAccountForm';
 import { MachineList } from './components/MachineList';
 import { MachineForm } from './components/MachineForm';
-import { login, getMachines, addMachine, updateMachine, createAccount } from './api/client';
+import { login, logout, storeTokens, getMachines, addMachine, updateMachine, createAccount } from './api/client';
 import { LoginCredentials, MachineFormData, MachineStatus, CreateAccountData } from './types';
 
 const queryClient = new QueryClient();
@@ -24,7 +24,7 @@ function AppContent() {
 
   const { data: machines = [], isLoading: machinesLoading } = useQuery(
     'machines',
-    getMachines,
+    () => getMachines(),
     {
       enabled: isAuthenticated,
     }
@@ -32,7 +32,7 @@ function AppContent() {
 
   const loginMutation = useMutation(login, {
     onSuccess: (data) => {
-      localStorage.setItem('token', data.access_token);
+      storeTokens(data);
       setIsAuthenticated(true);
     },
   });
@@ -108,7 +108,7 @@ function AppContent() {
             <div className="flex items-center">
               <button
                 onClick={() => {
-                  localStorage.removeItem('token');
+                  logout();
                   setIsAuthenticated(false);
                 }}
                 className="btn-secondary"
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { AuthResponse, LoginCredentials, Machine, MachineFormData, CreateAccountData, UserResponse } from '../types';
+import { AuthResponse, FloorSummary, LoginCredentials, Machine, MachineChanges, MachineFormData, CreateAccountData, NearbyMachine, UserResponse, ZoneCounts } from '../types';
 
 const API_URL = 'http://localhost:8001';
 
@@ -19,6 +19,61 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
+export const storeTokens = (data: AuthResponse) => {
+  localStorage.setItem('token', data.access_token);
+  if (data.refresh_token) {
+    localStorage.setItem('refreshToken', data.refresh_token);
+  }
+};
+
+// One refresh at a time: concurrent 401s share it, since a refresh token is single-use
+let refreshing: Promise<string | null> | null = null;
+
+const refreshAccessToken = (): Promise<string | null> => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) {
+    return Promise.resolve(null);
+  }
+  refreshing ??= axios
+    .post<AuthResponse>(`${API_URL}/token/refresh`, { refresh_token: refreshToken })
+    .then((response) => {
+      storeTokens(response.data);
+      return response.data.access_token;
+    })
+    .catch(() => {
+      localStorage.removeItem('refreshToken');
+      return null;
+    })
+    .finally(() => {
+      refreshing = null;
+    });
+  return refreshing;
+};
+
+// An expired access token is renewed without the password, then the request is retried once
+api.interceptors.response.use(undefined, async (error) => {
+  const config = error.config;
+  if (error.response?.status !== 401 || !config || config._retried) {
+    return Promise.reject(error);
+  }
+  const token = await refreshAccessToken();
+  if (!token) {
+    return Promise.reject(error);
+  }
+  config._retried = true;
+  config.headers.Authorization = `Bearer ${token}`;
+  return api(config);
+});
+
+export const logout = async (): Promise<void> => {
+  const refreshToken = localStorage.getItem('refreshToken');
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+  if (refreshToken) {
+    await axios.post(`${API_URL}/token/revoke`, { refresh_token: refreshToken }).catch(() => undefined);
+  }
+};
+
 export const login = async (credentials: LoginCredentials): Promise<AuthResponse> => {
   // Create URLSearchParams for proper form data encoding
   const formData = new URLSearchParams();
@@ -33,11 +88,104 @@ export const login = async (credentials: LoginCredentials): Promise<AuthResponse
   return response.data;
 };
 
-export const getMachines = async (): Promise<Machine[]> => {
-  const response = await api.get<Machine[]>('/machines/');
+export interface MachineFilters {
+  status?: string;
+  vendor?: string;
+  location?: string;
+  zone?: string;
+  bank?: string;
+  machine_type?: string;
+  is_out_of_service?: boolean;
+}
+
+// Machine reads ask for the columnar form: field names once, then one array per row.
+// The browser negotiates gzip/br on top, so no binary decoder is needed here.
+const COLUMNAR = 'application/vnd.casino.columnar+json';
+
+interface Columnar {
+  fields: string[];
+  rows: unknown[][];
+}
+
+export const decodeColumnar = <T>(data: Columnar | T[]): T[] => {
+  if (Array.isArray(data)) {
+    return data;
+  }
+  return data.rows.map((row) => Object.fromEntries(data.fields.map((field, i) => [field, row[i]])) as T);
+};
+
+// The list endpoint is keyset-paginated; follow X-Next-Cursor until the last page
+export const getMachines = async (filters: MachineFilters = {}): Promise<Machine[]> => {
+  const machines: Machine[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await api.get<Columnar | Machine[]>('/machines/', {
+      params: { ...filters, limit: 1000, cursor },
+      headers: { Accept: `${COLUMNAR}, application/json;q=0.5` },
+    });
+    machines.push(...decodeColumnar<Machine>(response.data));
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return machines;
+};
+
+// Rows changed since a previous response's version; pass the returned version on the next poll
+export const getMachineChanges = async (since: number): Promise<MachineChanges> => {
+  const response = await api.get<MachineChanges>('/machines/changes', { params: { since } });
+  return response.data;
+};
+
+// Counts per status for the floor screen, without downloading the machine list
+export const getMachineSummary = async (): Promise<FloorSummary> => {
+  const response = await api.get<FloorSummary>('/machines/summary');
+  return response.data;
+};
+
+// Status counts per zone and bank; list a bank's machines with getMachines({ zone, bank })
+export const getFloorZones = async (): Promise<ZoneCounts[]> => {
+  const response = await api.get<ZoneCounts[]>('/floor/zones');
   return response.data;
 };
 
+// Machines in a status (down by default) closest to a point on the floor plan, nearest first
+export const getNearestMachines = async (
+  x: number,
+  y: number,
+  options: { status?: string; limit?: number; max_distance?: number } = {}
+): Promise<NearbyMachine[]> => {
+  const response = await api.get<NearbyMachine[]>('/floor/nearest', { params: { x, y, ...options } });
+  return response.data;
+};
+
+export interface MachineEvent {
+  type: string;
+  machine_number?: string;
+  status?: string;
+  row_version?: number;
+  count?: number;
+  // machines.escalated: the escalation raised and the machines it was raised on
+  escalation?: 'down_sla' | 'stale_in_progress';
+  machine_numbers?: string[];
+}
+
+// Live status changes over Server-Sent Events; returns a function that closes the stream
+export const subscribeMachineEvents = (onEvent: (event: MachineEvent) => void): (() => void) => {
+  const token = localStorage.getItem('token') ?? '';
+  const source = new EventSource(`${API_URL}/machines/stream?token=${encodeURIComponent(token)}`);
+  const handler = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+  [
+    'machine.created',
+    'machine.updated',
+    'machine.deleted',
+    'machines.bulk_created',
+    'machines.bulk_updated',
+    'machines.escalated',
+  ].forEach((type) => source.addEventListener(type, handler as EventListener));
+  // The server drops consumers that fall behind; start over from /machines/changes
+  source.addEventListener('evicted', () => source.close());
+  return () => source.close();
+};
+
 export const addMachine = async (machine: MachineFormData): Promise<Machine> => {
   const response = await api.post<Machine>('/machines/', machine);
   return response.data;
@@ -49,8 +197,11 @@ export const updateMachine = async (machineNumber: string, updates: Partial<Mach
 };
 
 export const getMachine = async (machineNumber: string): Promise<Machine> => {
-  const response = await api.get<Machine>(`/machines/${machineNumber}`);
-  return response.data;
+  const response = await api.get<Columnar | Machine>(`/machines/${machineNumber}`, {
+    headers: { Accept: `${COLUMNAR}, application/json;q=0.5` },
+  });
+  const data = response.data;
+  return 'rows' in data ? decodeColumnar<Machine>(data)[0] : data;
 };
 
 export const createAccount = async (data: CreateAccountData): Promise<UserResponse> => {
@@ -12,6 +12,66 @@ export interface Machine {
     notes?: string;
     status: MachineStatus;
     date_down: string;
+    location?: string;
+    zone?: string;
+    bank?: string;
+    position?: string;
+    floor_x?: number;
+    floor_y?: number;
+    escalation?: "down_sla" | "stale_in_progress" | null;
+    escalated_at?: string | null;
+    updated_at?: string;
+    row_version?: number;
+}
+
+export interface MachineTombstone {
+    machine_number: string;
+    row_version: number;
+}
+
+export interface MachineChanges {
+    version: number;
+    machines: Machine[];
+    deleted: MachineTombstone[];
+    has_more: boolean;
+}
+
+export interface StatusCounts {
+    down: number;
+    in_progress: number;
+    fixed: number;
+    total: number;
+}
+
+export interface FloorSummary {
+    total: StatusCounts;
+    by_location: Record<string, StatusCounts>;
+    by_vendor: Record<string, StatusCounts>;
+    by_machine_type: Record<string, StatusCounts>;
+    version: number;
+}
+
+export interface BankCounts {
+    bank: string | null;
+    counts: StatusCounts;
+}
+
+export interface ZoneCounts {
+    zone: string | null;
+    counts: StatusCounts;
+    banks: BankCounts[];
+}
+
+export interface NearbyMachine {
+    machine_number: string;
+    status: MachineStatus;
+    zone?: string;
+    bank?: string;
+    position?: string;
+    floor_x: number;
+    floor_y: number;
+    distance: number;
+    date_down?: string;
 }
 
 export interface MachineFormData {
@@ -19,6 +79,9 @@ export interface MachineFormData {
     serial_number: string;
     vendor: string;
     notes?: string;
+    location?: string;
+    floor_x?: number;
+    floor_y?: number;
 }
 
 export interface LoginCredentials {
@@ -29,6 +92,8 @@ export interface LoginCredentials {
 export interface AuthResponse {
     access_token: string;
     token_type: string;
+    refresh_token?: string;
+    expires_in?: number;
 }
 
 export interface CreateAccountData {